@@ -0,0 +1,93 @@
+"""
+Benchmark cutting thousands of marker locked epochs out of a long memory mapped recording with
+spike_recorder.epochs.extract_epochs, against slicing one window per trial in a loop.
+
+    python benchmarks/bench_epochs.py --minutes 30 --epochs 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+import wave
+
+import numpy as np
+
+from spike_recorder.recording import Recording
+
+SAMPLE_RATE = 10000
+
+
+def make_recording(path, minutes, channels, num_epochs):
+    block = np.random.default_rng(0).normal(0, 200, size=(SAMPLE_RATE * 10, channels)).astype('<i2').tobytes()
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for i in range(minutes * 6):
+            wav.writeframes(block)
+
+    with open(os.path.splitext(path)[0] + "-events.txt", 'w') as f:
+        f.write("# Marker IDs can be arbitrary strings.\n")
+        f.write("# Marker ID,\tTime (in s)\n")
+        for i, t in enumerate(np.sort(np.random.default_rng(1).uniform(0, minutes * 60, num_epochs))):
+            f.write(f"Trial {i + 1}: Stop,\t{t:.4f}\n")
+            f.write(f"Trial {i + 1}: Next,\t{t + 0.5:.4f}\n")
+
+
+def loop_epochs(recording, pattern, before, after, baseline):
+    markers = recording.markers.match(pattern)
+    num_before = int(before * SAMPLE_RATE)
+    length = num_before + int(after * SAMPLE_RATE)
+    first = num_before + int(baseline[0] * SAMPLE_RATE)
+    last = num_before + int(baseline[1] * SAMPLE_RATE)
+
+    trials = []
+    for index in markers.sample_indices:
+        window = np.full((length, recording.num_channels), np.nan, dtype=np.float32)
+        start = index - num_before
+        lo, hi = max(start, 0), min(start + length, recording.num_samples)
+        window[lo - start:hi - start] = recording.samples[lo:hi]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            window -= np.nanmean(window[first:last], axis=0)
+        trials.append(window.T)
+    return np.stack(trials)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=int, default=30, help="Length of the recording. Default is 30.")
+    parser.add_argument('--channels', type=int, default=2, help="Number of channels. Default is 2.")
+    parser.add_argument('--epochs', type=int, default=2000, help="Number of epochs. Default is 2000.")
+    parser.add_argument('--before', type=float, default=0.5, help="Seconds before each marker. Default is 0.5.")
+    parser.add_argument('--after', type=float, default=0.5, help="Seconds after each marker. Default is 0.5.")
+    args = parser.parse_args()
+
+    pattern = r"Trial \d+: Stop"
+    baseline = (-args.before, -args.before / 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "long.wav")
+        make_recording(path, args.minutes, args.channels, args.epochs)
+
+        with Recording(path) as recording:
+            print(f"{args.minutes} minutes, {args.channels} channels, {args.epochs} epochs of "
+                  f"{args.before + args.after} s")
+            print(f"{'method':<14}{'ms':>10}{'epochs/s':>12}")
+
+            results = {}
+            for name, func in [("vectorized", lambda: recording.epochs(pattern, before=args.before, after=args.after,
+                                                                       baseline=baseline).data),
+                               ("loop", lambda: loop_epochs(recording, pattern, args.before, args.after, baseline))]:
+                func()
+                start = time.perf_counter()
+                results[name] = func()
+                elapsed = time.perf_counter() - start
+                print(f"{name:<14}{elapsed * 1e3:>10.1f}{args.epochs / elapsed:>12.0f}")
+
+            np.testing.assert_allclose(results["vectorized"], results["loop"], rtol=1e-4, atol=1e-2)
+
+
+if __name__ == "__main__":
+    main()
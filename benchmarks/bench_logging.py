@@ -0,0 +1,95 @@
+"""
+Per marker cost of client logging. Markers are pushed to the reference server with logging off,
+with DEBUG records written to a file from the calling thread, and with the same file handler run
+from a background thread, see spike_recorder.logs.start_background_logging. The log column is
+the cost of the logging calls alone, without the round trip.
+
+A handler that stalls on I/O, a network share or a busy disk, holds up every command in the sync
+mode, --handler-delay-ms simulates one.
+
+    python benchmarks/bench_logging.py --messages 5000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.logs import log_received, log_sent, start_background_logging, stop_background_logging
+from spike_recorder.protocol import CommandMsg, CommandType
+from spike_recorder.server.reference import ReferenceServer
+
+
+class SlowFileHandler(logging.FileHandler):
+    def __init__(self, filename, delay_s):
+        super().__init__(filename)
+        self.delay_s = delay_s
+
+    def emit(self, record):
+        if self.delay_s > 0:
+            time.sleep(self.delay_s)
+        super().emit(record)
+
+
+def per_marker_us(recorder, messages):
+    for i in range(100):
+        recorder.push_event_marker("warmup")
+
+    start = time.perf_counter()
+    for i in range(messages):
+        recorder.push_event_marker(f"Trial {i}: Stop")
+    return (time.perf_counter() - start) / messages * 1e6
+
+
+def log_call_us(log, messages):
+    command = CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={'name': "Trial 1: Stop", 'client_timestamp': 0})
+    reply = CommandMsg(type=CommandType.REPLY_OK)
+
+    start = time.perf_counter()
+    for i in range(messages):
+        log_sent(log, command)
+        log_received(log, command, reply, 100000)
+    return (time.perf_counter() - start) / messages * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=5000, help="Markers to push per mode. Default is 5000.")
+    parser.add_argument('--handler-delay-ms', type=float, default=0.0,
+                        help="Time the file handler stalls on each record, in milliseconds. Default is 0.")
+    args = parser.parse_args()
+
+    log = logging.getLogger("spike_recorder")
+    client_log = logging.getLogger("spike_recorder.client")
+    log_file = os.path.join(tempfile.mkdtemp(), "bench.log")
+    handler = SlowFileHandler(log_file, args.handler_delay_ms / 1000.0)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(name)s %(levelname)s %(message)s"))
+    log.addHandler(handler)
+    log.propagate = False
+
+    server = ReferenceServer(endpoint="tcp://127.0.0.1:*", recordings_dir=tempfile.mkdtemp())
+    server.start()
+    recorder = SpikeRecorder(endpoint=server.endpoint)
+    recorder.connect()
+
+    print(f"{'mode':<12}{'marker us':>12}{'log us':>10}")
+    try:
+        for mode in ("off", "sync", "background"):
+            log.setLevel(logging.WARNING if mode == "off" else logging.DEBUG)
+            if mode == "background":
+                start_background_logging()
+            try:
+                marker = per_marker_us(recorder, args.messages)
+                calls = log_call_us(client_log, args.messages)
+            finally:
+                stop_background_logging()
+            print(f"{mode:<12}{marker:>12.1f}{calls:>10.2f}")
+    finally:
+        recorder.close()
+        server.stop()
+        handler.close()
+
+
+if __name__ == "__main__":
+    main()
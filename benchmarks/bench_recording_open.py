@@ -0,0 +1,103 @@
+"""
+Benchmark opening a long recording and pulling a window around each marker out of it, with
+spike_recorder.recording.Recording against reading the whole file with the wave module. Memory is
+the growth of this process's private, anonymous, resident memory while the data is in use. Pages of
+a mapped file are resident too while they're used, but they're the page cache's, shared and
+dropped under pressure, so they aren't counted. Each reader runs in its own process.
+
+    python benchmarks/bench_recording_open.py --minutes 60 --channels 2
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from spike_recorder.recording import Recording
+
+SAMPLE_RATE = 10000
+
+
+def make_recording(path, minutes, channels, num_markers):
+    block = np.random.default_rng(0).normal(0, 200, size=(SAMPLE_RATE * 10, channels)).astype('<i2').tobytes()
+    num_samples = minutes * 60 * SAMPLE_RATE
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for i in range(num_samples // (SAMPLE_RATE * 10)):
+            wav.writeframes(block)
+
+    with open(os.path.splitext(path)[0] + "-events.txt", 'w') as f:
+        f.write("# Marker IDs can be arbitrary strings.\n")
+        f.write("# Marker ID,\tTime (in s)\n")
+        for t in np.linspace(1.0, minutes * 60 - 1.0, num_markers):
+            f.write(f"Trial: Stop,\t{t:.4f}\n")
+
+
+def anon_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Without /proc, the peak resident set size, mapped pages included.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def run_reader(reader, path):
+    before = anon_rss_mb()
+    start = time.perf_counter()
+
+    if reader == "memmap":
+        recording = Recording(path)
+        opened = time.perf_counter()
+        stops = recording.markers["Trial: Stop"]
+        total = sum(float(recording.channel(0, stop - 5000, stop + 5000).mean()) for stop in stops)
+    else:
+        with wave.open(path, 'rb') as wav:
+            channels = wav.getnchannels()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2').reshape(-1, channels)
+        opened = time.perf_counter()
+        with open(os.path.splitext(path)[0] + "-events.txt") as f:
+            stops = [int(round(float(line.split(",\t")[1]) * SAMPLE_RATE)) for line in f if not line.startswith("#")]
+        total = sum(float(samples[stop - 5000:stop + 5000, 0].mean()) for stop in stops)
+
+    done = time.perf_counter()
+    print(f"{reader:<10}{(opened - start) * 1e3:>12.2f}{(done - start) * 1e3:>12.2f}{anon_rss_mb() - before:>14.1f}")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=int, default=30, help="Length of the recording. Default is 30.")
+    parser.add_argument('--channels', type=int, default=2, help="Number of channels. Default is 2.")
+    parser.add_argument('--markers', type=int, default=1000, help="Number of markers. Default is 1000.")
+    parser.add_argument('--reader', choices=["memmap", "wave"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--path', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.reader is not None:
+        run_reader(args.reader, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "long.wav")
+        make_recording(path, args.minutes, args.channels, args.markers)
+        print(f"{args.minutes} minutes, {args.channels} channels, {os.path.getsize(path) / 2**20:.0f} MB, "
+              f"{args.markers} markers")
+        print(f"{'reader':<10}{'open ms':>12}{'total ms':>12}{'memory +MB':>14}")
+        for reader in ("memmap", "wave"):
+            subprocess.run([sys.executable, __file__, '--reader', reader, '--path', path], check=True)
+
+
+if __name__ == "__main__":
+    main()
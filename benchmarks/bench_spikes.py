@@ -0,0 +1,81 @@
+"""
+Benchmark spike detection throughput, in samples per second counting every channel's, over a long
+memory mapped recording of synthetic spikes in Gaussian noise, for a few block sizes. Also reports
+how many spikes were found, against how many there are, and, from a second traced run, the peak
+memory allocated while detecting. Besides the spikes found, that is bounded by the block size, not
+the recording's length.
+
+    python benchmarks/bench_spikes.py --minutes 10 --channels 2
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+from spike_recorder.recording import Recording
+from spike_recorder.spikes import detect_spikes
+
+SAMPLE_RATE = 10000
+WAVEFORM = np.array([-300, -900, -1500, -900, -300, 200, 300, 200, 100])
+
+
+def make_recording(path, minutes, channels, rate_hz):
+    rng = np.random.default_rng(0)
+    block_size = SAMPLE_RATE * 10
+    truth = []
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for first in range(0, minutes * 60 * SAMPLE_RATE, block_size):
+            block = rng.normal(0, 50, size=(block_size, channels))
+            for channel in range(channels):
+                # Poisson spikes, at least 5 ms apart.
+                times = np.cumsum(rng.exponential(SAMPLE_RATE / rate_hz, size=int(rate_hz * 20)).astype(int) + 50)
+                times = times[times < block_size - len(WAVEFORM)]
+                for t in times:
+                    block[t:t + len(WAVEFORM), channel] += WAVEFORM
+                truth.extend(first + times)
+            wav.writeframes(block.astype('<i2').tobytes())
+    return len(truth)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=int, default=10, help="Length of the recording. Default is 10.")
+    parser.add_argument('--channels', type=int, default=2, help="Number of channels. Default is 2.")
+    parser.add_argument('--rate', type=float, default=20.0, help="Spikes per second per channel. Default is 20.")
+    parser.add_argument('--blocks', type=float, nargs='+', default=[0.1, 1.0, 10.0],
+                        help="Block durations to try, in seconds. Default is 0.1 1 10.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "long.wav")
+        num_true = make_recording(path, args.minutes, args.channels, args.rate)
+
+        with Recording(path) as recording:
+            print(f"{args.minutes} minutes, {args.channels} channels, {num_true} spikes, "
+                  f"{os.path.getsize(path) / 2**20:.0f} MB")
+            print(f"{'block s':>8}{'seconds':>10}{'Msamples/s':>12}{'found':>10}{'peak MB':>10}")
+            for block_duration in args.blocks:
+                start = time.perf_counter()
+                spikes = detect_spikes(recording, block_duration=block_duration)
+                elapsed = time.perf_counter() - start
+
+                # Tracing slows allocation down, so it gets a run of its own.
+                tracemalloc.start()
+                detect_spikes(recording, block_duration=block_duration)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                throughput = recording.num_samples * recording.num_channels / elapsed
+                print(f"{block_duration:>8}{elapsed:>10.2f}{throughput / 1e6:>12.1f}{len(spikes):>10}"
+                      f"{peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
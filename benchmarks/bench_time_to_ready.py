@@ -0,0 +1,114 @@
+"""
+Time from deciding a session should begin to the recorder answering its first command, launching
+a recorder cold with each multiprocessing start method, against acquiring one already warmed up
+by a RecorderPool.
+
+    python benchmarks/bench_time_to_ready.py --repeats 5
+    python benchmarks/bench_time_to_ready.py --reference
+
+--reference runs the pure Python reference server rather than the native application, which
+leaves out the application's own start up but shows the cost of the start methods themselves.
+The native application always listens on its default endpoint, so it is launched cold there
+each time and can't be pooled, the warm pool is only measured with --reference.
+"""
+import argparse
+import logging
+import multiprocessing
+import statistics
+import time
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.protocol import DEFAULT_ENDPOINT, make_endpoint
+from spike_recorder.server import run_application
+from spike_recorder.server.pool import RecorderPool
+from spike_recorder.server.reference import run_server
+
+
+def cold(target, start_method, endpoint):
+    """
+    Start a recorder process and wait until it answers, the way SpikeRecorder.launch does.
+    """
+    start = time.perf_counter()
+    process = multiprocessing.get_context(start_method).Process(target=target, kwargs={'endpoint': endpoint})
+    process.start()
+
+    client = SpikeRecorder(endpoint=endpoint, timeout_ms=250)
+    client.connect()
+    try:
+        if not client.wait_ready(timeout=60.0):
+            raise RuntimeError(f"Recorder at {endpoint} didn't come up.")
+        elapsed = time.perf_counter() - start
+        client.shutdown(block=True)
+    finally:
+        client.close()
+
+    process.join(10)
+    return elapsed
+
+
+def warm(pool):
+    """
+    Take a recorder from the pool and wait for it to answer its first command.
+    """
+    start = time.perf_counter()
+    recorder = pool.acquire(timeout=60.0)
+
+    client = recorder.client(timeout_ms=250)
+    try:
+        if not client.heartbeat():
+            raise RuntimeError(f"Recorder at {recorder.endpoint} didn't answer.")
+        elapsed = time.perf_counter() - start
+        client.shutdown(block=True)
+    finally:
+        client.close()
+
+    recorder.process.join(10)
+    return elapsed
+
+
+def report(name, times):
+    print(f"{name:<22}{statistics.median(times) * 1000:>12.1f}{max(times) * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5, help="Recorders to start per method. Default is 5.")
+    parser.add_argument('--port', type=int, default=5700, help="The first tcp port to use. Default is 5700.")
+    parser.add_argument('--reference', action='store_true', help="Run the reference server, not the native application.")
+    args = parser.parse_args()
+
+    # Polling a recorder that is still starting logs a failure per attempt.
+    logging.getLogger("spike_recorder").setLevel(logging.CRITICAL)
+
+    target = run_server if args.reference else run_application
+    port = args.port
+
+    print(f"{'method':<22}{'median ms':>12}{'max ms':>12}")
+    for start_method in multiprocessing.get_all_start_methods():
+        times = []
+        for i in range(args.repeats):
+            endpoint = make_endpoint("tcp", port=port) if args.reference else DEFAULT_ENDPOINT
+            times.append(cold(target, start_method, endpoint))
+            port = port + 1
+        report(f"cold {start_method}", times)
+
+    if not args.reference:
+        return
+
+    pool = RecorderPool(size=1, base_port=port, target=target)
+    pool.start()
+    try:
+        # Let the pool warm up, as it would between sessions.
+        pool.acquire(timeout=60.0).shutdown()
+        times = []
+        for i in range(args.repeats):
+            while pool.idle == 0:
+                time.sleep(0.01)
+            times.append(warm(pool))
+        report("warm pool", times)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
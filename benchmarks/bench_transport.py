@@ -0,0 +1,57 @@
+"""
+Compare command round trip latency over tcp loopback and ipc (Unix domain socket) transports.
+The reference server answers commands in a background thread, latencies are from the client's
+own statistics, see SpikeRecorder.stats.
+
+    python benchmarks/bench_transport.py --messages 5000
+"""
+import argparse
+import os
+import tempfile
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.protocol import make_endpoint
+from spike_recorder.server.reference import ReferenceServer
+
+
+def run(endpoint, messages):
+    server = ReferenceServer(endpoint=endpoint, recordings_dir=tempfile.mkdtemp())
+    server.start()
+
+    recorder = SpikeRecorder(endpoint=endpoint)
+    try:
+        recorder.connect()
+
+        # Warm up the connection before measuring
+        for i in range(100):
+            recorder.push_event_marker("warmup")
+        recorder.reset_stats()
+
+        for i in range(messages):
+            recorder.push_event_marker(f"Trial {i}: Stop")
+
+        return recorder.stats()['PUSH_EVENT_MARKER']
+    finally:
+        recorder.close()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=5000, help="Markers to push per transport. Default is 5000.")
+    parser.add_argument('--port', type=int, default=5599, help="The tcp port to use. Default is 5599.")
+    args = parser.parse_args()
+
+    endpoints = {'tcp': make_endpoint("tcp", port=args.port)}
+    if not os.name == 'nt':
+        endpoints['ipc'] = make_endpoint("ipc", path=os.path.join(tempfile.mkdtemp(), "bench.ipc"))
+
+    print(f"{'transport':<10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for transport, endpoint in endpoints.items():
+        stats = run(endpoint, args.messages)
+        print(f"{transport:<10}{stats['p50_ms']:>10.4f}{stats['p90_ms']:>10.4f}"
+              f"{stats['p99_ms']:>10.4f}{stats['max_ms']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
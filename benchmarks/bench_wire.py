@@ -0,0 +1,67 @@
+"""
+Benchmark the per-message encode and decode cost of the wire encodings against plain json
+(CommandMsg.to_json / CommandMsg.from_json) and, if cattrs is installed, the original cattr + json
+path, which the package no longer depends on.
+
+    python benchmarks/bench_wire.py
+"""
+import argparse
+import json
+import timeit
+
+try:
+    import cattr
+except ImportError:
+    cattr = None
+
+from spike_recorder.protocol import CommandMsg, CommandType
+from spike_recorder import wire
+
+MESSAGES = {
+    "START_RECORD": CommandMsg(type=CommandType.START_RECORD,
+                               args={'filename': "/home/user/data/participant_042/iowa_output1.wav"}),
+    "PUSH_EVENT_MARKER": CommandMsg(type=CommandType.PUSH_EVENT_MARKER,
+                                    args={'name': "Deck Pull #17: Deck #2", 'client_timestamp': 91283712983}),
+    "PUSH_EVENT_MARKERS x16": CommandMsg(type=CommandType.PUSH_EVENT_MARKERS,
+                                         args={'markers': [{'name': f"Trial {i}: Stop", 'client_timestamp': 9128371 + i}
+                                                           for i in range(16)]}),
+    "REPLY_OK": CommandMsg(type=CommandType.REPLY_OK),
+}
+
+
+def time_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000, help="Calls per timing repeat. Default is 20000.")
+    args = parser.parse_args()
+
+    if cattr is None:
+        print("cattrs isn't installed, leaving out the original cattr path.")
+
+    print(f"{'message':<24}{'path':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for label, msg in MESSAGES.items():
+        json_str = msg.to_json()
+        json_bytes = json_str.encode() + b'\0'
+        paths = [
+            ("to_json", len(json_bytes),
+             lambda: msg.to_json().encode(),
+             lambda: CommandMsg.from_json(json_bytes[:-1])),
+        ]
+        if cattr is not None:
+            paths.append(("cattr", len(json_bytes),
+                          lambda: json.dumps(cattr.unstructure(msg)).encode(),
+                          lambda: cattr.structure(json.loads(json_bytes[:-1]), CommandMsg)))
+        for codec in (wire.JSON, wire.BINARY):
+            data = codec.encode(msg)
+            paths.append((codec.name, len(data), lambda c=codec: c.encode(msg), lambda c=codec, d=data: c.decode(d)))
+
+        for name, size, encode, decode in paths:
+            print(f"{label:<24}{name:<10}{size:>8}"
+                  f"{time_per_call(encode, args.number):>12.2f}{time_per_call(decode, args.number):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import asyncio
+import itertools
+import os
+import time
+
+import zmq
+import zmq.asyncio
+
+from typing import Dict, Optional, Sequence, TYPE_CHECKING
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.client import SpikeRecorder, shared_context
+from spike_recorder.protocol import SpikeRecorderUnavailable, CommandMsg, CommandType
+from spike_recorder.protocol import DEFAULT_ENDPOINT, DEFAULT_TIMEOUT_MS
+from spike_recorder import wire
+from spike_recorder.stats import ClientStats
+from spike_recorder.logs import log_sent, log_received
+from spike_recorder.ledger import MarkerLedger
+
+# Only needed to annotate launch, keep it out of the import.
+if TYPE_CHECKING:
+    import multiprocessing
+
+
+class AsyncSpikeRecorder:
+    """
+    An asyncio version of the SpikeRecorder client. Commands are sent over a DEALER socket so
+    that any number of them can be in flight at once. Each request is prefixed with an envelope
+    frame holding a request ID, the application's REP socket echoes the envelope back with the
+    reply which lets us route replies to the right awaiting coroutine.
+
+        >>> recorder = AsyncSpikeRecorder()
+        >>> recorder.connect()
+        >>> await recorder.start_record("test.wav")
+        >>> await asyncio.gather(recorder.push_event_marker("A"), recorder.push_event_marker("B"))
+        >>> await recorder.stop_record()
+        >>> await recorder.close()
+
+    Args:
+        endpoint: The ZeroMQ endpoint of the application's command socket.
+        timeout_ms: How long to wait, in milliseconds, for a reply before deciding the application
+            is unavailable.
+    """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, timeout_ms: int = DEFAULT_TIMEOUT_MS):
+        # An asyncio view of the process wide context, see spike_recorder.client.shared_context
+        self.context = zmq.asyncio.Context.shadow(shared_context().underlying)
+        self.socket = None
+        self.codec = wire.JSON
+
+        self.endpoint = endpoint
+
+        # Time to wait for a reply before giving up, in seconds.
+        self.timeout = timeout_ms / 1000.0
+
+        self._stats = ClientStats()
+
+        # Every marker delivered, and where it landed in the recording.
+        self.ledger = MarkerLedger()
+
+        self._request_ids = itertools.count()
+        self._pending: Dict[bytes, asyncio.Future] = {}
+        self._recv_task: Optional[asyncio.Task] = None
+
+        # The encoding asked for in connect, negotiated ahead of the first command sent.
+        self._encoding = "json"
+        self._negotiation: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def launch(endpoint: str = None, cpus: Sequence[int] = None, nice: int = None) -> 'multiprocessing.Process':
+        """
+        Launch the BackyardBrains SpikeRecorder app. See SpikeRecorder.launch
+
+        Args:
+            endpoint: The endpoint the application should listen for commands on.
+            cpus: The CPUs to pin the application to.
+            nice: The application's niceness.
+
+        Returns:
+            The multiprocessing.Process running that the application is running inside.
+        """
+        return SpikeRecorder.launch(endpoint=endpoint, cpus=cpus, nice=nice)
+
+    def connect(self, encoding: str = "json"):
+        """
+        Connect to an already running BackyardBrains SpikeRecorder GUI application.
+
+        Args:
+            encoding: The wire encoding to ask the application for, see SpikeRecorder.connect. As
+                connecting doesn't need an event loop, anything but JSON is negotiated when the
+                first command is sent.
+
+        Returns:
+            None
+        """
+        wire.get_codec(encoding)
+
+        logger.info(f"Connecting to SpikeRecorder server at {self.endpoint} ...")
+        self.socket = self.context.socket(zmq.DEALER)
+
+        # Don't hang around on close trying to deliver messages to a server that isn't there.
+        self.socket.setsockopt(zmq.LINGER, 0)
+
+        self.socket.connect(self.endpoint)
+
+        self.codec = wire.JSON
+        self._encoding = encoding
+        self._negotiation = None
+
+    async def negotiate_encoding(self, encoding: str = "binary") -> str:
+        """
+        Ask the SpikeRecorder application to switch to a different wire encoding. See
+        SpikeRecorder.negotiate_encoding
+
+        Args:
+            encoding: The preferred encoding.
+
+        Returns:
+            The name of the encoding in use.
+        """
+        self._check_server()
+        wire.get_codec(encoding)
+
+        # Negotiation always happens in JSON.
+        self.codec = wire.JSON
+        try:
+            reply = await self._send(CommandMsg(type=CommandType.NEGOTIATE, args={'encodings': [encoding, "json"]}))
+            self.codec = wire.get_codec(reply.args.get('encoding', "json"))
+        except SpikeRecorderUnavailable:
+            pass
+        except Exception as ex:
+            logger.info(f"SpikeRecorder did not accept encoding negotiation, using JSON: {ex}")
+
+        logger.info(f"Using {self.codec.name} wire encoding.")
+        return self.codec.name
+
+    async def close(self):
+        """
+        Close the connection to the SpikeRecorder application. Any commands still waiting on a
+        reply will raise SpikeRecorderUnavailable.
+
+        Returns:
+            None
+        """
+        if self._recv_task is not None:
+            self._recv_task.cancel()
+            try:
+                await self._recv_task
+            except asyncio.CancelledError:
+                pass
+            self._recv_task = None
+
+        if self._negotiation is not None:
+            self._negotiation.cancel()
+            self._negotiation = None
+
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(SpikeRecorderUnavailable())
+        self._pending.clear()
+
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    async def shutdown(self, block: bool = False):
+        """
+        Close the SpikeRecorder GUI application completely.
+
+        Args:
+            block: Whether to wait for a reply from the server. True means wait, False means don't
+
+        Returns:
+            None
+        """
+        self._check_server()
+
+        logger.info("Shutting down SpikeRecorder ...")
+
+        await self._send(CommandMsg(type=CommandType.SHUTDOWN), block=block)
+
+    async def start_record(self, filename: str = None, block: bool = True):
+        """
+        Begin a recording session. See SpikeRecorder.start_record
+
+        Args:
+            filename: Either a filename or directory, or None for the SpikeRecorder default.
+            block: Whether to wait for a reply from the server. True means wait, False means don't
+
+        Returns:
+            None
+        """
+        if filename == "":
+            filename = None
+
+        # If we are dealing with a relative path, make it absolute.
+        if filename is not None:
+            filename = os.path.abspath(filename)
+
+        self._check_server()
+        if filename is None:
+            await self._send(CommandMsg(type=CommandType.START_RECORD), block=block)
+        else:
+            await self._send(CommandMsg(type=CommandType.START_RECORD, args={'filename': filename}), block=block)
+
+        logger.info("Recording Started")
+
+    async def stop_record(self, block: bool = True):
+        """
+        Stop a recording session. See SpikeRecorder.stop_record
+
+        Args:
+            block: Whether to wait for a reply from the server. True means wait, False means don't
+
+        Returns:
+            None
+        """
+        self._check_server()
+        await self._send(CommandMsg(type=CommandType.STOP_RECORD), block=block)
+        logger.info("Recording Stopped")
+
+    async def push_event_marker(self, marker: str, block: bool = True):
+        """
+        Push an event marker into the recording. See SpikeRecorder.push_event_marker
+
+        Args:
+            marker: An arbitrary string label to identify this marker.
+            block: Whether to wait for a reply from the server. True means wait, False means don't
+
+        Returns:
+            None
+        """
+        client_timestamp = time.perf_counter_ns()
+        self._check_server()
+        reply = await self._send(CommandMsg(type=CommandType.PUSH_EVENT_MARKER,
+                                            args={'name': marker, 'client_timestamp': client_timestamp}), block=block)
+
+        args = reply.args if reply is not None else {}
+        self.ledger.append(marker, client_timestamp, args.get('sample_index'), args.get('sample_time'))
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Round trip statistics for each command type, see SpikeRecorder.stats
+
+        Returns:
+            A dictionary from command type name to its statistics.
+        """
+        return self._stats.summary()
+
+    def reset_stats(self):
+        """
+        Clear the round trip statistics.
+
+        Returns:
+            None
+        """
+        self._stats.reset()
+
+    def _check_server(self):
+        """
+        Check if the socket has been setup with a connection to the server.
+
+        Returns:
+            None
+        """
+        if not self.socket:
+            raise ValueError("SpikeRecorder server connection not setup!")
+
+    async def _receive_replies(self):
+        """
+        Receive replies from the server for as long as we are connected and hand each one to
+        the coroutine waiting on its request ID. Replies nobody is waiting for, non-blocking
+        sends or requests that timed out, are dropped.
+        """
+        while True:
+            frames = await self.socket.recv_multipart()
+
+            # Replies come back as [request_id, empty delimiter, message]
+            if len(frames) != 3:
+                logger.warning(f"Dropping malformed reply from SpikeRecorder: {frames}")
+                continue
+
+            request_id, _, reply_bytes = frames
+            future = self._pending.pop(request_id, None)
+            if future is None or future.done():
+                continue
+
+            try:
+                future.set_result(self.codec.decode(reply_bytes))
+            except Exception as ex:
+                future.set_exception(ex)
+
+    async def _send(self, command: CommandMsg, block: bool = True) -> Optional[CommandMsg]:
+        """
+        Send a command message to SpikeRecorder GUI application server.
+
+        Args:
+            command: A command message to send to the server
+            block: Whether to wait for the reply.
+
+        Returns:
+            The CommandMsg we received back as a reply, None if block is False.
+        """
+        if self._recv_task is None or self._recv_task.done():
+            self._recv_task = asyncio.ensure_future(self._receive_replies())
+
+        # Commands sent at once all wait on the one negotiation, which is shielded so that
+        # cancelling one of them doesn't cancel it for the rest.
+        if self._encoding != "json" and command.type != CommandType.NEGOTIATE:
+            if self._negotiation is None:
+                self._negotiation = asyncio.ensure_future(self.negotiate_encoding(self._encoding))
+            await asyncio.shield(self._negotiation)
+
+        request_id = str(next(self._request_ids)).encode()
+
+        future = None
+        if block:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+
+        try:
+            log_sent(logger, command)
+            self._stats.record_sent(command.type)
+            start = time.perf_counter_ns()
+            await self.socket.send_multipart([request_id, b'', self.codec.encode(command)])
+
+            if not block:
+                return None
+
+            reply = await asyncio.wait_for(future, self.timeout)
+            latency_ns = time.perf_counter_ns() - start
+            self._stats.record_reply(command.type, latency_ns, error=reply.type == CommandType.REPLY_ERROR)
+            log_received(logger, command, reply, latency_ns)
+
+        except (asyncio.TimeoutError, zmq.error.ZMQError) as ex:
+            self._pending.pop(request_id, None)
+            self._stats.record_timeout(command.type)
+            logger.error("Warning: Failed to communicate with Spike-Recorder application. No spike recording is occurring.")
+            raise SpikeRecorderUnavailable() from ex
+
+        if reply.type == CommandType.REPLY_ERROR:
+            raise Exception(f"Spike-Recorder Application Command Error: \n{reply}")
+
+        return reply
@@ -1,89 +1,259 @@
 import zmq
-import attr
-import cattr
-import json
-import multiprocessing
+import threading
+import time
+import collections
+import contextlib
 
-from typing import Dict
-from enum import unique, Enum
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
 
 import logging
 logger = logging.getLogger(__name__)
 
-import spike_recorder.server
 import os
 
+from spike_recorder.protocol import SpikeRecorderUnavailable, CommandType, CommandMsg, RecordingFiles
+from spike_recorder.protocol import DEFAULT_ENDPOINT, DEFAULT_TIMEOUT_MS
+from spike_recorder import wire
+from spike_recorder.clocksync import ClockEstimate, ClockSynchronizer
+from spike_recorder.stats import ClientStats
+from spike_recorder.logs import log_sent, log_received
+from spike_recorder.ledger import MarkerLedger
 
-class SpikeRecorderUnavailable(Exception):
-    """This exception is raised whenever we cannot reach the SpikeRecorder"""
-    pass
+# Keep importing the client cheap, these are only needed by launch and sample_stream.
+if TYPE_CHECKING:
+    import multiprocessing
+    from spike_recorder.stream import SampleStream
 
 
-@unique
-class CommandType(Enum):
+def shared_context() -> zmq.Context:
     """
-    The type of command we want to execute on the server side.
-
-        START_RECORD: Start a recording, this is equivalent to pressing the record button in GUI
-        STOP_RECORDING: Stop a recording, this is equivalent to pressing the record button in GUI
-        PUSH_EVENT_MARKER: Push an event to the recording.
-        SHUTDOWN: Shutdown the server.
-        REPLY_OK: Server sends this back if command is accepted.
-        REPLY_ERROR: Server sends this back if command failed.
+    The process wide ZeroMQ context all clients use by default. One context, and its I/O thread,
+    is enough for any number of sockets.
 
+    Returns:
+        The shared zmq.Context.
     """
-    START_RECORD = "START_RECORD"
-    STOP_RECORD = "STOP_RECORD"
-    PUSH_EVENT_MARKER = "PUSH_EVENT_MARKER"
-    SHUTDOWN = "SHUTDOWN"
-    REPLY_OK = "REPLY_OK"
-    REPLY_ERROR = "REPLY_ERROR"
+    return zmq.Context.instance()
 
 
-@attr.s(auto_attribs=True)
-class CommandMsg:
+class EventMarkerBuffer:
     """
-    A structure to represent command passed to the SpikeRecorder application server side. These
-    are serialized to JSON and sent over ZeroMQ.
+    Coalesces event markers on the client side so that many of them can be sent to the
+    SpikeRecorder in a single message. The buffer is flushed when it holds max_size markers,
+    when the oldest marker has waited max_delay seconds, or when flush is called explicitly.
+
+    Deadline flushes all happen on one long lived thread, started with the first buffered marker,
+    so a client's socket for that thread is opened once and reused rather than reconnected for
+    every flush.
+
+    Args:
+        flush_callback: Called with the list of buffered {'name', 'client_timestamp'} entries
+            whenever the buffer is flushed.
+        max_size: The number of markers that triggers a flush.
+        max_delay: The longest time, in seconds, a marker may sit in the buffer before it is
+            flushed. None means markers wait for a size triggered or explicit flush.
     """
-    type: CommandType
-    args: Dict = attr.ib(default=attr.Factory(dict))
 
-    def to_json(self) -> str:
+    def __init__(self, flush_callback: Callable[[List[Dict]], None], max_size: int = 64,
+                 max_delay: float = 0.1):
+
+        if max_size < 1:
+            raise ValueError("EventMarkerBuffer max_size must be at least 1.")
+
+        self.flush_callback = flush_callback
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+        self._markers = []
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._deadline: Optional[float] = None
+        self._flusher: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._markers)
+
+    def append(self, name: str, client_timestamp: int = None):
         """
-        Serialize this CommandMsg to JSON
+        Add a marker to the buffer, flushing if the buffer is now full.
+
+        Args:
+            name: The marker label.
+            client_timestamp: The time.perf_counter_ns() time the marker was captured, defaults to now.
 
         Returns:
-            A string containing the JSON for this message.
+            None
         """
-        return json.dumps(cattr.unstructure(self))
+        if client_timestamp is None:
+            client_timestamp = time.perf_counter_ns()
+
+        with self._lock:
+            self._markers.append({'name': name, 'client_timestamp': client_timestamp})
+
+            if len(self._markers) >= self.max_size:
+                self.flush()
+            elif len(self._markers) == 1 and self.max_delay is not None:
+                self._deadline = time.monotonic() + self.max_delay
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_on_deadline, daemon=True,
+                                                     name="EventMarkerBufferFlush")
+                    self._flusher.start()
+                self._wakeup.notify()
 
-    @classmethod
-    def from_json(cls, json_str) -> 'CommandMsg':
+    def flush(self):
         """
-        Convert a JSON string to CommandMsg
+        Send all buffered markers now.
 
-        Args:
-            json_str: The JSON string to parse
+        Returns:
+            None
+        """
+        with self._lock:
+            self._deadline = None
+
+            if not self._markers:
+                return
+
+            markers = self._markers
+            self._markers = []
+            self.flush_callback(markers)
+
+    def close(self):
+        """
+        Stop the deadline flush thread. Markers still buffered stay there, flush first to send them.
 
         Returns:
-            A CommandMsg instance for this JSON string.
+            None
+        """
+        with self._lock:
+            flusher = self._flusher
+            self._flusher = None
+            self._wakeup.notify_all()
+
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()
+
+    def _flush_on_deadline(self):
         """
-        return cattr.structure(json.loads(json_str), cls)
+        The deadline flush thread. Nobody is waiting on this thread to see errors, so log them
+        instead of raising.
+        """
+        with self._lock:
+            # A closed buffer's thread, or one replaced after close, finds it isn't the flusher.
+            while self._flusher is threading.current_thread():
+                if self._deadline is None:
+                    self._wakeup.wait()
+                    continue
+
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Failed to flush buffered event markers to SpikeRecorder.")
 
 
 class SpikeRecorder:
     """
     The main API for launching and controlling the Backyard Brains SpikeRecorder GUI
     applications.
+
+    Args:
+        endpoint: The ZeroMQ endpoint of the application's command socket, for example
+            "tcp://localhost:5555" or "ipc:///tmp/spike-recorder.ipc". See protocol.make_endpoint
+        timeout_ms: How long to wait, in milliseconds, for a reply before deciding the application
+            is unavailable.
+        marker_buffer_size: Event markers are coalesced on the client and sent in batches of up to
+            this many markers. The default of 1 sends each marker as soon as it is pushed.
+        marker_max_delay: The longest time, in seconds, a buffered marker waits before it is sent.
+        clock_sync_interval: Once the clock has been synchronized, see sync_clock, it is refreshed
+            after this many seconds, in the background, by the first marker pushed after that. A
+            refresh that fails is retried with backoff. None disables the periodic refresh.
+        retries: How many times to retry a command that got no reply. Each attempt that times out
+            tears down and reconnects the socket first, then backs off for retry_backoff seconds,
+            doubling on each attempt up to max_retry_backoff.
+        retry_backoff: The initial backoff between retries, in seconds.
+        max_retry_backoff: The longest backoff between retries, in seconds.
+        outbox_size: If greater than 0, event markers that can't be delivered are kept, up to this
+            many, and replayed in order once the application answers again instead of raising
+            SpikeRecorderUnavailable. When the outbox is full the oldest markers are dropped.
+        heartbeat_interval: If set, a background thread sends a HEARTBEAT every this many seconds
+            while connected, reconnecting when the application stops answering and replaying the
+            outbox when it comes back.
+        context: The ZeroMQ context to create sockets in, defaults to shared_context().
+
+    A single client can be used from any number of threads. ZeroMQ sockets can't be shared between
+    threads, so each thread that sends a command gets its own socket, connected on first use, and
+    commands from different threads are in flight at the same time. With the outbox enabled,
+    marker sends are serialized so that replayed markers stay in order.
     """
 
-    def __init__(self):
-        self.context = zmq.Context()
-        self.socket = None
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, timeout_ms: int = DEFAULT_TIMEOUT_MS,
+                 marker_buffer_size: int = 1, marker_max_delay: float = 0.1,
+                 clock_sync_interval: Optional[float] = 60.0,
+                 retries: int = 0, retry_backoff: float = 0.01, max_retry_backoff: float = 1.0,
+                 outbox_size: int = 0, heartbeat_interval: Optional[float] = None,
+                 context: zmq.Context = None):
+        self.context = context if context is not None else shared_context()
+        self.codec = wire.JSON
+
+        # Each thread's socket, kept on the thread that made it, and all of them so close can
+        # get at them.
+        self._local = threading.local()
+        self._sockets: Dict[threading.Thread, zmq.Socket] = {}
+        self._connected = False
+
+        self.endpoint = endpoint
+        self.timeout_ms = timeout_ms
+
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        self.outbox = collections.deque(maxlen=outbox_size if outbox_size > 0 else None)
+        self.outbox_size = outbox_size
+        self.dropped_markers = 0
+        self._replaying = False
+
+        self.heartbeat_interval = heartbeat_interval
+        self._heartbeat_thread = None
+        self._heartbeat_stop = threading.Event()
+
+        # Whether the last exchange with the application got a reply
+        self.alive = False
+
+        # Whether the application answers HEARTBEAT at all, None until it answers one or wait_ready
+        # gives up on it.
+        self.answers_heartbeat: Optional[bool] = None
+
+        self.clock_sync_interval = clock_sync_interval
+        self.clock = ClockSynchronizer(ping=self.ping)
+
+        # Periodic refreshes run on their own thread, pushing a marker only asks for one.
+        self._sync_thread = None
+        self._sync_wanted = threading.Event()
+        self._sync_stop = threading.Event()
+        self._sync_failures = 0
+        self._next_sync_attempt = 0.0
+
+        self._stats = ClientStats()
+
+        # Every marker delivered, and where it landed in the recording.
+        self.ledger = MarkerLedger()
+
+        self.marker_buffer = EventMarkerBuffer(flush_callback=self._send_markers,
+                                               max_size=marker_buffer_size,
+                                               max_delay=marker_max_delay)
+
+        # Guards the socket table and the outbox, markers may be flushed from the buffer's
+        # deadline timer thread and heartbeats are sent from their own thread.
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
 
     @staticmethod
-    def launch() -> multiprocessing.Process:
+    def launch(endpoint: str = None, cpus: Sequence[int] = None, nice: int = None) -> 'multiprocessing.Process':
         """
         Launch the BackyardBrains SpikeRecorder app. This launches the application
         asynchronously.
@@ -95,29 +265,557 @@ class SpikeRecorder:
             >>> spike_client.connect()
             >>> spike_client.shutdown()
 
+        Args:
+            endpoint: The endpoint the application should listen for commands on. Default is
+                the application's own default, tcp://*:5555
+            cpus: The CPUs to pin the application to, see spike_recorder.scheduling. Default is any.
+            nice: The application's niceness. Default is to inherit ours.
+
         Returns:
             The multiprocessing.Process running that the application is running inside.
         """
-        return spike_recorder.server.launch(is_async=True)
+        import spike_recorder.server
+        return spike_recorder.server.launch(is_async=True, endpoint=endpoint, cpus=cpus, nice=nice)
 
-    def connect(self):
+    def connect(self, encoding: str = "json", sync_clock: bool = False, endpoint: str = None):
         """
         Connect to an already running BackyardBrains SpikeRecorder GUI application.
 
+        Args:
+            encoding: The wire encoding to ask the application for, "json" or "binary". JSON is
+                understood by every version of the application and needs no round trip. For
+                anything else the encoding is negotiated, falling back to JSON if the application
+                doesn't support it. See spike_recorder.wire
+            sync_clock: Estimate the offset between our clock and the recorder's with a burst of
+                pings, see sync_clock.
+            endpoint: Connect to this endpoint instead of the one the client was created with.
+
         Returns:
             None
         """
+        if endpoint is not None:
+            self.endpoint = endpoint
+
+        # Connect to the command server, any sockets from an earlier connection are stale.
+        logger.info(f"Connecting to SpikeRecorder server at {self.endpoint} ...")
+        self._close_sockets()
+        self._connected = True
+        self.answers_heartbeat = None
+        self._open_socket()
+
+        self.codec = wire.JSON
+        if encoding != "json":
+            self.negotiate_encoding(encoding)
+
+        if sync_clock:
+            self.sync_clock()
+
+        if self.heartbeat_interval is not None:
+            self.start_heartbeat()
+
+    @property
+    def clock_estimate(self) -> Optional[ClockEstimate]:
+        """
+        The latest estimate of the recorder clock relative to time.perf_counter_ns(), None if the
+        clock has never been synchronized.
+        """
+        return self.clock.estimate
 
-        # Launch the SpikeRecorder process
+    def sync_clock(self) -> Optional[ClockEstimate]:
+        """
+        Estimate the offset, uncertainty and drift between the client's time.perf_counter_ns()
+        clock and the recorder's sample clock with a burst of PING exchanges. Markers carry the
+        client time they were pushed at, this estimate maps those times onto the recording, see
+        MarkerLedger.estimate_sample_indices
 
-        # Connect to the command server, wait until
-        logger.info("Connecting to SpikeRecorder server ...")
-        self.socket = self.context.socket(zmq.REQ)
+        Returns:
+            The new estimate, or None if the application doesn't answer pings.
+        """
+        self._check_server()
+        try:
+            with self._sync_lock:
+                estimate = self.clock.synchronize()
+        except SpikeRecorderUnavailable:
+            return None
+        except Exception as ex:
+            logger.warning(f"SpikeRecorder clock synchronization failed: {ex}")
+            return None
 
-        # Set the receive timeout to 500 milliseconds
-        self.socket.setsockopt(zmq.RCVTIMEO, 500)
+        logger.info(f"Recorder clock offset {estimate.offset_ns / 1e6:.3f} ms "
+                    f"+/- {estimate.uncertainty_ns / 1e6:.3f} ms, drift {estimate.drift * 1e6:.2f} ppm")
+        return estimate
 
-        self.socket.connect("tcp://localhost:5555")
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Round trip statistics for each command type sent since the client was created or
+        reset_stats was last called. For each command type there are counts of messages sent,
+        replies received, timeouts and error replies, and the min, mean, p50, p90, p99 and max
+        round trip latency in milliseconds, see spike_recorder.stats.LatencyHistogram.
+
+            >>> spike_client.stats()['PUSH_EVENT_MARKER']['p99_ms']
+
+        Returns:
+            A dictionary from command type name to its statistics.
+        """
+        return self._stats.summary()
+
+    def reset_stats(self):
+        """
+        Clear the round trip statistics, for example at the start of each participant's session.
+
+        Returns:
+            None
+        """
+        self._stats.reset()
+
+    def record_sent(self, command_type: CommandType):
+        """
+        Count a command sent, for clients that send on their own socket but share this client's
+        statistics, such as spike_recorder.qt_client.QtSpikeRecorder
+
+        Args:
+            command_type: The type of the command sent.
+
+        Returns:
+            None
+        """
+        self._stats.record_sent(command_type)
+
+    def record_reply(self, command_type: CommandType, latency_ns: int, error: bool = False):
+        """
+        Count a reply received, and note that the application is answering, see record_sent.
+
+        Args:
+            command_type: The type of the command replied to.
+            latency_ns: The round trip time, in nanoseconds.
+            error: Whether the reply was an error.
+
+        Returns:
+            None
+        """
+        self._stats.record_reply(command_type, latency_ns, error=error)
+        self.alive = True
+
+    def record_timeout(self, command_type: CommandType):
+        """
+        Count a command that got no reply, and note that the application isn't answering, see
+        record_sent.
+
+        Args:
+            command_type: The type of the command.
+
+        Returns:
+            None
+        """
+        self._stats.record_timeout(command_type)
+        self.alive = False
+
+    @contextlib.contextmanager
+    def try_lock(self, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold the lock that keeps the outbox in order, if it can be had. Replaying the outbox holds
+        it while it waits on the application, so callers that mustn't stall can pass blocking=False.
+
+            >>> with spike_client.try_lock(blocking=False) as locked:
+            ...     if locked:
+            ...         spike_client.queue_unsent(markers)
+
+        Args:
+            blocking: Wait for the lock, otherwise give up straight away if it is held.
+
+        Returns:
+            A context manager giving whether the lock was acquired.
+        """
+        acquired = self._lock.acquire(blocking=blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._lock.release()
+
+    def ping(self) -> Tuple[int, int, int]:
+        """
+        Perform a single PING exchange with the application.
+
+        Returns:
+            A tuple of the client send time, the recorder time in the reply and the client receive
+            time, all in nanoseconds.
+        """
+        t0 = time.perf_counter_ns()
+        reply = self._send(CommandMsg(type=CommandType.PING, args={'client_time_ns': t0}))
+        t3 = time.perf_counter_ns()
+        return t0, reply.args['recorder_time_ns'], t3
+
+    def _clock_sync_due(self) -> bool:
+        """
+        Whether the clock was synchronized before, the estimate is older than clock_sync_interval
+        and a failed refresh isn't backing off.
+        """
+        age = self.clock.seconds_since_sync()
+        return (age is not None and self.clock_sync_interval is not None and age > self.clock_sync_interval
+                and time.monotonic() >= self._next_sync_attempt)
+
+    def _refresh_clock(self):
+        """
+        Ask for the clock to be re-synchronized, if it is due, see _clock_sync_due. The burst of
+        pings runs on a background thread, so this never holds up the caller, a marker push.
+        """
+        if not self._clock_sync_due():
+            return
+
+        with self._lock:
+            if self._sync_thread is None:
+                self._sync_stop.clear()
+                self._sync_thread = threading.Thread(target=self._clock_sync_loop, daemon=True,
+                                                     name="SpikeRecorderClockSync")
+                self._sync_thread.start()
+        self._sync_wanted.set()
+
+    def _clock_sync_loop(self):
+        while True:
+            self._sync_wanted.wait()
+            if self._sync_stop.is_set():
+                return
+            self._sync_wanted.clear()
+
+            # Markers pushed during the last burst asked again, it may not be due any more.
+            if not self._clock_sync_due():
+                continue
+
+            if self.sync_clock() is not None:
+                self._sync_failures = 0
+                continue
+
+            # The recorder isn't answering, don't try again on every marker, back off up to
+            # the refresh interval.
+            self._sync_failures = self._sync_failures + 1
+            self._next_sync_attempt = (time.monotonic() +
+                                       min(2.0 ** (self._sync_failures - 1), self.clock_sync_interval))
+
+    def _stop_clock_sync(self):
+        """
+        Stop the clock refresh thread, if it is running.
+        """
+        thread = self._sync_thread
+        if thread is not None:
+            self._sync_stop.set()
+            self._sync_wanted.set()
+            thread.join()
+            self._sync_thread = None
+
+    def negotiate_encoding(self, encoding: str = "binary") -> str:
+        """
+        Ask the SpikeRecorder application to switch to a different wire encoding. If the application
+        doesn't understand the request, or doesn't answer, we stay with JSON.
+
+        Args:
+            encoding: The preferred encoding.
+
+        Returns:
+            The name of the encoding in use.
+        """
+        self._check_server()
+        wire.get_codec(encoding)
+
+        # Negotiation always happens in JSON.
+        self.codec = wire.JSON
+        try:
+            reply = self._send(CommandMsg(type=CommandType.NEGOTIATE, args={'encodings': [encoding, "json"]}))
+            self.codec = wire.get_codec(reply.args.get('encoding', "json"))
+        except SpikeRecorderUnavailable:
+            pass
+        except Exception as ex:
+            logger.info(f"SpikeRecorder did not accept encoding negotiation, using JSON: {ex}")
+
+        logger.info(f"Using {self.codec.name} wire encoding.")
+        return self.codec.name
+
+    def close(self):
+        """
+        Close the connection to the SpikeRecorder application, the sockets of every thread. Other
+        threads should be done sending commands first. This does not shutdown the application,
+        see shutdown.
+
+        Returns:
+            None
+        """
+        self.stop_heartbeat()
+        self._stop_clock_sync()
+        self.marker_buffer.close()
+        self._connected = False
+        self._close_sockets()
+
+    def heartbeat(self) -> bool:
+        """
+        Send a single HEARTBEAT to check the application is answering. Any reply counts, versions
+        of the application that don't know the command answer with an error. If the application
+        answers, undelivered markers in the outbox are replayed.
+
+        Returns:
+            True if the application answered.
+        """
+        self._check_server()
+        try:
+            self._send(CommandMsg(type=CommandType.HEARTBEAT), retries=0)
+        except SpikeRecorderUnavailable:
+            return False
+        except Exception:
+            pass
+
+        self.answers_heartbeat = True
+        self._replay_outbox()
+        return True
+
+    def wait_ready(self, timeout: float = 30.0, poll_interval: float = 0.01, heartbeat_grace: float = 5.0) -> bool:
+        """
+        Wait until the application answers commands, for example after launch. Returns as soon as
+        it answers a HEARTBEAT.
+
+        Versions of the application that ignore HEARTBEAT never answer one. If heartbeats still go
+        unanswered heartbeat_grace seconds in, but the application's command socket accepts
+        connections, it is taken to be one of those and ready, as it was before HEARTBEAT, the
+        heartbeat thread, which can't succeed either, is stopped and answers_heartbeat is False.
+
+        Args:
+            timeout: The longest time to wait, in seconds.
+            poll_interval: Time between attempts, in seconds, after one gets no reply.
+            heartbeat_grace: How long, in seconds, to wait for a HEARTBEAT reply before falling back
+                to checking the command socket accepts connections.
+
+        Returns:
+            True if the application is ready, False if it didn't answer within timeout.
+        """
+        self._check_server()
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            if self.heartbeat():
+                return True
+
+            now = time.monotonic()
+            if now - start >= heartbeat_grace and \
+                    self._accepts_connections(min(self.timeout_ms / 1000.0, max(deadline - now, 0.0))):
+                logger.warning("SpikeRecorder doesn't answer HEARTBEAT, assuming it is ready as it accepts connections.")
+                self.answers_heartbeat = False
+                self.stop_heartbeat()
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"SpikeRecorder not ready after {timeout} seconds.")
+                return False
+
+            time.sleep(min(poll_interval, remaining))
+
+    def _accepts_connections(self, timeout: float) -> bool:
+        """
+        Whether a ZeroMQ socket is listening on the endpoint, that is a connection to it completes
+        its handshake within timeout seconds.
+        """
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        monitor = socket.get_monitor_socket(zmq.EVENT_HANDSHAKE_SUCCEEDED)
+        try:
+            socket.connect(self.endpoint)
+            return bool(monitor.poll(int(timeout * 1000)))
+        finally:
+            socket.disable_monitor()
+            monitor.close()
+            socket.close()
+
+    def status(self) -> Dict:
+        """
+        Ask the application for its state, see CommandType.STATUS
+
+        Returns:
+            The args of the reply, empty if the application doesn't report its state.
+        """
+        self._check_server()
+        try:
+            return self._send(CommandMsg(type=CommandType.STATUS)).args
+        except SpikeRecorderUnavailable:
+            raise
+        except Exception as ex:
+            logger.info(f"SpikeRecorder did not answer STATUS: {ex}")
+            return {}
+
+    def _wait_status(self, done: Callable[[Dict], bool], timeout: float, poll_interval: float) -> Optional[Dict]:
+        """
+        Poll STATUS until done(args) is True.
+
+        Returns:
+            The args that satisfied done, None if the application doesn't report its state.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            args = self.status()
+            if 'recording' not in args:
+                return None
+            if done(args):
+                return args
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"SpikeRecorder status {args} not reached after {timeout} seconds.")
+
+            time.sleep(min(poll_interval, remaining))
+
+    def wait_recording_started(self, timeout: float = 10.0, poll_interval: float = 0.01) -> Optional[RecordingFiles]:
+        """
+        Wait until the application reports that it is recording.
+
+        Args:
+            timeout: The longest time to wait, in seconds.
+            poll_interval: Time between STATUS requests, in seconds.
+
+        Returns:
+            The files being recorded to. None if the application doesn't report its state, in which
+            case the START_RECORD reply is all there is to go on.
+
+        Raises:
+            TimeoutError: If recording hasn't started within timeout.
+        """
+        self._check_server()
+        args = self._wait_status(lambda a: a['recording'], timeout, poll_interval)
+        return None if args is None else RecordingFiles.from_args(args)
+
+    def sample_stream(self, seconds: float = 10.0, start: bool = True) -> 'SampleStream':
+        """
+        Subscribe to the samples the application publishes, see spike_recorder.stream
+
+        Args:
+            seconds: How many seconds of the latest samples to keep.
+            start: Start receiving from a background thread straight away, otherwise call the
+                stream's poll.
+
+        Returns:
+            The connected SampleStream.
+        """
+        from spike_recorder.stream import SampleStream
+
+        endpoint = self.status().get('data_endpoint')
+        if endpoint is None:
+            raise ValueError("SpikeRecorder application doesn't publish its samples.")
+
+        stream = SampleStream(endpoint, seconds=seconds, context=self.context)
+        stream.connect()
+        if start:
+            stream.start()
+        return stream
+
+    def start_heartbeat(self, interval: float = None):
+        """
+        Start sending heartbeats from a background thread. While the application doesn't answer,
+        heartbeats back off exponentially up to max_retry_backoff, or the interval if that is longer.
+
+        Args:
+            interval: Seconds between heartbeats, defaults to heartbeat_interval.
+
+        Returns:
+            None
+        """
+        if interval is not None:
+            self.heartbeat_interval = interval
+
+        if self.heartbeat_interval is None:
+            raise ValueError("No heartbeat interval set.")
+
+        self.stop_heartbeat()
+        self._heartbeat_stop.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True,
+                                                  name="SpikeRecorderHeartbeat")
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        """
+        Stop the heartbeat thread, if it is running.
+
+        Returns:
+            None
+        """
+        if self._heartbeat_thread is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def _heartbeat_loop(self):
+        failures = 0
+        while not self._heartbeat_stop.wait(self._backoff(failures - 1, floor=self.heartbeat_interval)):
+            if self.heartbeat():
+                failures = 0
+            else:
+                failures = failures + 1
+                logger.warning(f"SpikeRecorder missed {failures} heartbeat(s).")
+
+    def _backoff(self, attempt: int, floor: float = 0.0) -> float:
+        """
+        The exponential backoff before retry number attempt, negative attempts give floor.
+        """
+        if attempt < 0:
+            return floor
+        return max(floor, min(self.retry_backoff * 2 ** attempt, self.max_retry_backoff))
+
+    @property
+    def socket(self) -> Optional[zmq.Socket]:
+        """
+        The calling thread's command socket, opened on first use. None if not connected.
+        """
+        if not self._connected:
+            return None
+
+        socket = getattr(self._local, 'socket', None)
+        if socket is None:
+            socket = self._open_socket()
+        return socket
+
+    def _open_socket(self) -> zmq.Socket:
+        """
+        Create the calling thread's command socket and connect it to the application, replacing
+        any existing one.
+
+        Returns:
+            The new socket.
+        """
+        thread = threading.current_thread()
+
+        with self._lock:
+            old = self._sockets.pop(thread, None)
+            if old is not None:
+                old.close(linger=0)
+
+            # Sockets of threads that have finished won't be used again.
+            for dead in [t for t in self._sockets if not t.is_alive()]:
+                self._sockets.pop(dead).close(linger=0)
+
+            socket = self.context.socket(zmq.REQ)
+
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+            socket.setsockopt(zmq.SNDTIMEO, self.timeout_ms)
+
+            # A command sent without blocking leaves its reply unread. Relaxed, the socket can send
+            # the next command anyway, correlated, the late reply is told apart and dropped.
+            socket.setsockopt(zmq.REQ_RELAXED, 1)
+            socket.setsockopt(zmq.REQ_CORRELATE, 1)
+
+            socket.connect(self.endpoint)
+
+            self._sockets[thread] = socket
+            self._local.socket = socket
+
+        return socket
+
+    def _close_sockets(self):
+        """
+        Close every thread's socket. Threads open a new one on their next command if connected.
+        """
+        with self._lock:
+            for socket in self._sockets.values():
+                socket.close()
+            self._sockets.clear()
+
+            # Other threads notice their socket was closed and replace it, see _send_once
+            self._local = threading.local()
 
     def shutdown(self, block: bool = False):
         """
@@ -131,8 +829,16 @@ class SpikeRecorder:
         """
         self._check_server()
 
+        self.flush()
+        self.stop_heartbeat()
+        self._stop_clock_sync()
+
         logger.info("Shutting down SpikeRecorder ...")
 
+        # Nobody waits for the reply, don't let closing the client straight after drop the command.
+        if not block:
+            self.socket.setsockopt(zmq.LINGER, self.timeout_ms)
+
         # Send the shutdown command
         self._send(CommandMsg(type=CommandType.SHUTDOWN), block=block)
 
@@ -148,7 +854,8 @@ class SpikeRecorder:
             block: Whether to block and wait for a reply from the server. True means wait, False means don't
 
         Returns:
-            None
+            The files the recording goes to, if the application says, otherwise None. See
+            wait_recording_started to wait for the recording to actually begin.
         """
 
         if filename == "":
@@ -160,13 +867,16 @@ class SpikeRecorder:
 
         self._check_server()
         if filename is None:
-            self._send(CommandMsg(type=CommandType.START_RECORD), block=block)
+            reply = self._send(CommandMsg(type=CommandType.START_RECORD), block=block)
         else:
-            self._send(CommandMsg(type=CommandType.START_RECORD, args={'filename': filename}), block=block)
+            reply = self._send(CommandMsg(type=CommandType.START_RECORD, args={'filename': filename}), block=block)
 
         logger.info("Recording Started")
 
-    def stop_record(self, block: bool = True):
+        return None if reply is None else RecordingFiles.from_args(reply.args)
+
+    def stop_record(self, block: bool = True, wait_finalized: bool = False, timeout: float = 10.0,
+                    poll_interval: float = 0.01, unreported_delay: float = 1.0) -> Optional[RecordingFiles]:
         """
         Stop a recording session. This results in the saving of two files, a WAV file with the
         recorded spike data and a txt file annotating event markers that were generated while
@@ -176,30 +886,200 @@ class SpikeRecorder:
 
         Args:
             block: Whether to block and wait for a reply from the server. True means wait, False means don't
+            wait_finalized: Wait until the application reports both files are flushed and closed.
+                Needs block.
+            timeout: The longest time to wait for the files, in seconds.
+            poll_interval: Time between STATUS requests while waiting for the files, in seconds.
+            unreported_delay: If wait_finalized but the application doesn't report its state, how
+                long to give it to finish the files anyway, in seconds.
 
         Returns:
-            None
+            The finished recording's files, if the application says, otherwise None.
+
+        Raises:
+            TimeoutError: If wait_finalized and the files weren't finalized within timeout.
         """
+        if wait_finalized and not block:
+            raise ValueError("stop_record can only wait for the files to be finalized if it blocks.")
+
         self._check_server()
-        self._send(CommandMsg(type=CommandType.STOP_RECORD), block=block)
+        self.flush()
+        reply = self._send(CommandMsg(type=CommandType.STOP_RECORD), block=block)
         logger.info("Recording Stopped")
 
-    def push_event_marker(self, marker: str, block: bool = True):
+        if reply is None:
+            return None
+
+        args = reply.args
+        if wait_finalized and not args.get('finalized', False):
+            args = self._wait_status(lambda a: not a['recording'] and a.get('finalized', False),
+                                     timeout, poll_interval)
+            if args is None:
+                time.sleep(unreported_delay)
+                return None
+
+        files = RecordingFiles.from_args(args)
+        if files is not None and args.get('finalized', False):
+            logger.info(f"Recording saved to {files.wav_path}")
+        return files
+
+    def push_event_marker(self, marker: str, block: bool = True, client_timestamp: int = None):
         """
         Immediately push an event marker into the recordring. The SpikeRecorder GUI application
         only supports adding markers name 0-9 by pressing the numeric keys on the keyboard. This
         function allows adding markes with arbitrary string literals.
 
+        The marker carries the time.perf_counter_ns() time of this call as its client_timestamp,
+        see sync_clock for mapping it onto the recording.
+
+        If the client was created with a marker_buffer_size greater than 1 the marker is buffered
+        and sent along with others, see EventMarkerBuffer.
+
+        Once the recorder acknowledges the marker it is added to the ledger, with the sample of the
+        recording it landed on if the recorder says, see MarkerLedger.
+
         Args:
             marker: An arbitrary string label to identify this marker.
             block: Whether to block and wait for a reply from the server. True means wait, False means don't
+            client_timestamp: The time.perf_counter_ns() time of the event, defaults to now.
 
         Returns:
             None
         """
 
+        if client_timestamp is None:
+            client_timestamp = time.perf_counter_ns()
+
         self._check_server()
-        self._send(CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={'name': marker}), block=block)
+
+        if self.marker_buffer.max_size > 1:
+            self.marker_buffer.append(marker, client_timestamp)
+        else:
+            self._send_markers([{'name': marker, 'client_timestamp': client_timestamp}], block=block)
+
+        self._refresh_clock()
+
+    def flush(self):
+        """
+        Send any event markers waiting in the client side buffer.
+
+        Returns:
+            None
+        """
+        self.marker_buffer.flush()
+
+    def _send_markers(self, markers: List[Dict], block: bool = True):
+        """
+        Send a batch of event markers to the server. A single marker goes out as a plain
+        PUSH_EVENT_MARKER. Markers still in the outbox are sent first so the order is kept.
+        If the outbox is enabled, markers that can't be delivered are put in it.
+
+        Args:
+            markers: A list of {'name', 'client_timestamp'} entries.
+            block: Whether to wait for a reply from the server.
+
+        Returns:
+            None
+        """
+        self._check_server()
+
+        # Without an outbox there is no ordering to keep, threads send independently.
+        if self.outbox_size <= 0:
+            self.record_markers(markers, self._send(self._markers_command(markers), block=block))
+            return
+
+        with self._lock:
+            if self.outbox:
+                self._replay_outbox()
+
+            # Still no way through, keep the markers in order behind the others.
+            if self.outbox:
+                self.queue_unsent(markers)
+                return
+
+            try:
+                reply = self._send(self._markers_command(markers), block=block)
+            except SpikeRecorderUnavailable:
+                self.queue_unsent(markers)
+                return
+
+            self.record_markers(markers, reply)
+
+    def record_markers(self, markers: List[Dict], reply: Optional[CommandMsg]):
+        """
+        Add delivered markers to the ledger, with the sample index and time from the reply, see
+        CommandType.PUSH_EVENT_MARKER
+
+        Args:
+            markers: The {'name', 'client_timestamp'} entries sent.
+            reply: The application's reply, None if it wasn't waited for.
+
+        Returns:
+            None
+        """
+        args = reply.args if reply is not None else {}
+        if len(markers) == 1:
+            indices = [args.get('sample_index')]
+            times = [args.get('sample_time')]
+        else:
+            indices = args.get('sample_indices') or [None] * len(markers)
+            times = args.get('sample_times') or [None] * len(markers)
+
+        for marker, sample_index, sample_time in zip(markers, indices, times):
+            self.ledger.append(marker['name'], marker['client_timestamp'], sample_index, sample_time)
+
+    @staticmethod
+    def _markers_command(markers: List[Dict]) -> CommandMsg:
+        if len(markers) == 1:
+            return CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args=markers[0])
+        return CommandMsg(type=CommandType.PUSH_EVENT_MARKERS, args={'markers': markers})
+
+    def queue_unsent(self, markers: List[Dict]):
+        """
+        Put markers that couldn't be delivered in the outbox, dropping the oldest if it is full.
+        They are replayed with the next marker or heartbeat that gets through.
+
+        Args:
+            markers: The {'name', 'client_timestamp'} entries that weren't delivered.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            overflow = len(self.outbox) + len(markers) - self.outbox_size
+            if overflow > 0:
+                self.dropped_markers = self.dropped_markers + overflow
+                logger.error(f"SpikeRecorder outbox full, dropping {overflow} event marker(s).")
+
+            self.outbox.extend(markers)
+            logger.warning(f"SpikeRecorder unavailable, {len(self.outbox)} event marker(s) waiting in outbox.")
+
+    def _replay_outbox(self):
+        """
+        Try to deliver the markers in the outbox, in order, in batches no larger than the marker
+        buffer. Stops at the first batch that can't be delivered.
+        """
+        with self._lock:
+            if self._replaying or not self.outbox:
+                return
+
+            self._replaying = True
+            try:
+                while self.outbox:
+                    batch = [self.outbox[i] for i in range(min(len(self.outbox), self.marker_buffer.max_size))]
+                    try:
+                        self.record_markers(batch, self._send(self._markers_command(batch)))
+                    except SpikeRecorderUnavailable:
+                        return
+                    except Exception:
+                        logger.exception(f"SpikeRecorder rejected replayed event markers, dropping them: {batch}")
+
+                    for i in range(len(batch)):
+                        self.outbox.popleft()
+
+                logger.info("SpikeRecorder outbox replayed.")
+            finally:
+                self._replaying = False
 
     def _check_server(self):
         """
@@ -208,41 +1088,76 @@ class SpikeRecorder:
         Returns:
 
         """
-        if not self.socket:
+        if not self._connected:
             raise ValueError("SpikeRecorder server connection not setup!")
 
-    def _send(self, command: CommandMsg, block: bool = True) -> CommandMsg:
+    def _send(self, command: CommandMsg, block: bool = True, retries: int = None) -> CommandMsg:
         """
         Send a command message to SpikeRecorder GUI application server. This is just a string message
         send to a ZeroMQ socket.
 
+        If no reply comes the socket is torn down and reconnected, a REQ socket that missed a reply
+        can't be used again, and the command is retried with backoff.
+
         Args:
             command: A command message to send to the server
-            no_block: Fire the message and don't wait for a response
+            block: Whether to wait for the reply.
+            retries: How many times to retry if there is no reply, defaults to the client's retries.
 
         Returns:
-            The CommandMsg we received back as a reply
+            The CommandMsg we received back as a reply, None if block is False.
         """
+        if retries is None:
+            retries = self.retries
 
-        try:
+        attempt = 0
+        while True:
+            try:
+                reply = self._send_once(command, block=block)
+                break
+            except SpikeRecorderUnavailable:
+                if attempt >= retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt = attempt + 1
+                logger.warning(f"Retrying {command.type.value}, attempt {attempt} of {retries}.")
 
-            logger.info(f"Sending: {command}")
-            self.socket.send(command.to_json().encode())
+        if reply is not None and reply.type == CommandType.REPLY_ERROR:
+            raise Exception(f"Spike-Recorder Application Command Error: \n{reply}")
 
-            if block:
+        return reply
 
-                # Get the reply.
-                reply_str = self.socket.recv()
+    def _send_once(self, command: CommandMsg, block: bool = True) -> Optional[CommandMsg]:
+        """
+        A single attempt at sending a command, see _send.
+        """
+        socket = self.socket
+        if socket is None:
+            raise ValueError("SpikeRecorder server connection not setup!")
 
-                # Remove the null terminator
-                reply_str = reply_str[0:len(reply_str)-1]
+        try:
+            log_sent(logger, command)
+            self.record_sent(command.type)
+            start = time.perf_counter_ns()
+            socket.send(self.codec.encode(command))
+
+            if not block:
+                return None
 
-                reply = CommandMsg.from_json(reply_str)
-                logger.info(f"Received: {reply}")
+            # Get the reply.
+            reply = self.codec.decode(socket.recv())
+            latency_ns = time.perf_counter_ns() - start
+            self.record_reply(command.type, latency_ns, error=reply.type == CommandType.REPLY_ERROR)
+            log_received(logger, command, reply, latency_ns)
 
-                if reply.type == CommandType.REPLY_ERROR:
-                    raise Exception(f"Spike-Recorder Application Command Error: \n{reply}")
+            return reply
 
         except (zmq.error.Again, zmq.error.ZMQError) as ex:
+            self.record_timeout(command.type)
             logger.error("Warning: Failed to communicate with Spike-Recorder application. No spike recording is occurring.")
+
+            # Lazy pirate, the REQ socket is stuck waiting on a reply that never came, start over.
+            if self._connected:
+                self._open_socket()
+
             raise SpikeRecorderUnavailable() from ex
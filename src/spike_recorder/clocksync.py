@@ -0,0 +1,150 @@
+"""
+NTP style estimation of the offset and drift between the client's time.perf_counter_ns() clock
+and the SpikeRecorder application's clock. The recorder's clock is its sample clock, the samples
+it has acquired over the sample rate, so an estimate places client times on the recording.
+
+Each ping records the client send time t0, the recorder's time when it handled the ping and the
+client receive time t3. Assuming the request and reply legs take equally long, the offset is
+recorder_time - (t0 + t3) / 2 and its error is bounded by half the round trip. Of a burst of
+pings we keep the one with the shortest round trip, and drift is fit over the history of bursts.
+"""
+import time
+
+import attr
+
+from typing import Callable, List, Optional, Tuple
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ClockEstimate:
+    """
+    An estimate of how the recorder clock relates to the client clock.
+
+    Args:
+        offset_ns: Recorder time minus client time, in nanoseconds, at reference_ns.
+        uncertainty_ns: Bound on the error of offset_ns, half the round trip of the best ping.
+        drift: Rate at which the offset changes, in nanoseconds per nanosecond of client time.
+        reference_ns: The client time, time.perf_counter_ns(), at which offset_ns was measured.
+        round_trip_ns: Round trip time of the best ping.
+    """
+    offset_ns: float
+    uncertainty_ns: float
+    drift: float
+    reference_ns: int
+    round_trip_ns: int
+
+    def to_recorder_time(self, client_ns: int) -> float:
+        """
+        Map a client time.perf_counter_ns() time to recorder time.
+
+        Args:
+            client_ns: The client time in nanoseconds.
+
+        Returns:
+            The corresponding recorder time in nanoseconds.
+        """
+        return client_ns + self.offset_ns + self.drift * (client_ns - self.reference_ns)
+
+    def to_client_time(self, recorder_ns: int) -> float:
+        """
+        Map a recorder time to client time.perf_counter_ns() time.
+
+        Args:
+            recorder_ns: The recorder time in nanoseconds.
+
+        Returns:
+            The corresponding client time in nanoseconds.
+        """
+        return (recorder_ns - self.offset_ns + self.drift * self.reference_ns) / (1.0 + self.drift)
+
+    def to_sample_index(self, client_ns: int, sample_rate: int) -> float:
+        """
+        Map a client time.perf_counter_ns() time to a sample of the recorder's clock, counted from
+        when it started acquiring. Subtract a recording's start_sample_index to get the sample of
+        that recording.
+
+        Args:
+            client_ns: The client time in nanoseconds.
+            sample_rate: The recorder's sample rate.
+
+        Returns:
+            The corresponding sample, fractional.
+        """
+        return self.to_recorder_time(client_ns) * sample_rate / 1e9
+
+
+class ClockSynchronizer:
+    """
+    Keeps a running estimate of the recorder clock from bursts of pings.
+
+    Args:
+        ping: Performs one ping exchange and returns (t0, recorder_time, t3), all in nanoseconds.
+        num_pings: How many pings make up each burst.
+        history: How many bursts to keep for the drift fit.
+    """
+
+    def __init__(self, ping: Callable[[], Tuple[int, int, int]], num_pings: int = 8, history: int = 16):
+        self.ping = ping
+        self.num_pings = num_pings
+        self.history = history
+
+        self.estimate: Optional[ClockEstimate] = None
+
+        # (client midpoint, offset) of the best ping of each burst
+        self._samples: List[Tuple[float, float]] = []
+        self._last_sync = None
+
+    def seconds_since_sync(self) -> Optional[float]:
+        """
+        Returns:
+            Seconds since the last successful synchronization, None if there hasn't been one.
+        """
+        if self._last_sync is None:
+            return None
+        return time.monotonic() - self._last_sync
+
+    def synchronize(self) -> ClockEstimate:
+        """
+        Run a burst of pings and update the estimate.
+
+        Returns:
+            The new estimate.
+        """
+        best = None
+        for i in range(self.num_pings):
+            t0, recorder_time, t3 = self.ping()
+            if best is None or (t3 - t0) < (best[2] - best[0]):
+                best = (t0, recorder_time, t3)
+
+        t0, recorder_time, t3 = best
+        midpoint = (t0 + t3) / 2.0
+        offset = recorder_time - midpoint
+
+        self._samples.append((midpoint, offset))
+        self._samples = self._samples[-self.history:]
+
+        self.estimate = ClockEstimate(offset_ns=offset,
+                                      uncertainty_ns=(t3 - t0) / 2.0,
+                                      drift=self._fit_drift(),
+                                      reference_ns=int(midpoint),
+                                      round_trip_ns=t3 - t0)
+        self._last_sync = time.monotonic()
+
+        return self.estimate
+
+    def _fit_drift(self) -> float:
+        """
+        Least squares slope of offset against client time over the burst history.
+        """
+        if len(self._samples) < 2:
+            return 0.0
+
+        n = len(self._samples)
+        mean_t = sum(t for t, o in self._samples) / n
+        mean_o = sum(o for t, o in self._samples) / n
+        var_t = sum((t - mean_t) ** 2 for t, o in self._samples)
+
+        if var_t == 0:
+            return 0.0
+
+        return sum((t - mean_t) * (o - mean_o) for t, o in self._samples) / var_t
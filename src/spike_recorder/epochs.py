@@ -0,0 +1,168 @@
+"""
+Cut a recording into windows locked to its markers, the Libet task's "Trial N: Stop" or the Iowa
+task's "Deck Pull #k: Deck #d" for example, as one (trials, channels, samples) array.
+
+    >>> with Recording("participant-07.wav") as recording:
+    ...     epochs = extract_epochs(recording, r"Trial \\d+: Stop", before=2.0, after=0.5, baseline=(-2.0, -1.5))
+    >>> epochs.data.mean(axis=0)   # the average over trials, per channel
+
+The windows are gathered from a strided view of the memory mapped samples with one fancy index per
+batch of trials, so only the pages under the windows are read, and the whole file is never copied.
+"""
+import warnings
+
+import attr
+import numpy as np
+
+from typing import Optional, Sequence, Tuple, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.recording import Markers
+
+# What to do with epochs that run off either end of the recording.
+TRUNCATED = ("pad", "drop")
+
+
+@attr.s(auto_attribs=True)
+class Epochs:
+    """
+    Windows of a recording, one per marker.
+
+    Args:
+        data: The samples, of shape (trials, channels, samples).
+        labels: Each trial's marker label.
+        sample_indices: Each trial's marker, as a sample index into the recording.
+        truncated: Whether each trial's window ran off either end of the recording. Samples outside
+            the recording are NaN.
+        channels: The recording's channel of each channel in data.
+        sample_rate: The recording's sample rate.
+        before: How many samples of each window come before its marker.
+    """
+    data: np.ndarray
+    labels: np.ndarray
+    sample_indices: np.ndarray
+    truncated: np.ndarray
+    channels: np.ndarray
+    sample_rate: int
+    before: int
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def times(self) -> np.ndarray:
+        """
+        The time of each sample of a window relative to its marker, in seconds.
+        """
+        return (np.arange(self.data.shape[-1]) - self.before) / self.sample_rate
+
+    def select(self, mask: np.ndarray) -> 'Epochs':
+        """
+        The trials where mask is True, or at the given positions.
+
+        Args:
+            mask: A boolean mask, or integer positions, of trials.
+
+        Returns:
+            The selected trials.
+        """
+        return attr.evolve(self, data=self.data[mask], labels=self.labels[mask],
+                           sample_indices=self.sample_indices[mask], truncated=self.truncated[mask])
+
+
+def _windows(samples: np.ndarray, length: int) -> np.ndarray:
+    """
+    A read only view of every window of length samples, of shape (starts, channels, length).
+    """
+    count = max(samples.shape[0] - length + 1, 0)
+    return np.lib.stride_tricks.as_strided(samples, shape=(count, samples.shape[1], length),
+                                           strides=(samples.strides[0], samples.strides[1], samples.strides[0]),
+                                           writeable=False)
+
+
+def extract_epochs(recording, events: Union[str, Markers, None] = None, before: float = 1.0, after: float = 1.0,
+                   baseline: Optional[Tuple[float, float]] = None, channels: Sequence[int] = None,
+                   truncated: str = "pad", dtype=np.float32, batch_size: int = 256) -> Epochs:
+    """
+    Cut a window around each marker of a recording.
+
+    Args:
+        recording: The spike_recorder.recording.Recording.
+        events: The markers to lock to. A regular expression selects the recording's markers whose
+            label matches it, see Markers.match, or pass Markers. None is every marker.
+        before: How long each window starts before its marker, in seconds.
+        after: How long each window ends after its marker, in seconds.
+        baseline: Subtract each trial's and channel's mean over this interval, in seconds relative
+            to the marker, for example (-0.2, 0.0). None doesn't correct.
+        channels: The channels to keep, defaults to all of them.
+        truncated: What to do with windows that run off either end of the recording, "pad" keeps
+            them with NaN outside the recording, "drop" leaves them out.
+        dtype: The type of the returned samples. With "pad" it must be a floating point type.
+        batch_size: How many trials to gather at a time, which bounds the temporary memory on top
+            of the result.
+
+    Returns:
+        The epochs.
+    """
+    if truncated not in TRUNCATED:
+        raise ValueError(f"truncated must be one of {TRUNCATED}, not '{truncated}'")
+    dtype = np.dtype(dtype)
+    if truncated == "pad" and not np.issubdtype(dtype, np.floating):
+        raise ValueError(f"Padding truncated epochs needs a floating point dtype, not {dtype}")
+
+    if events is None:
+        markers = recording.markers
+    elif isinstance(events, Markers):
+        markers = events
+    else:
+        markers = recording.markers.match(events)
+
+    sample_rate = recording.sample_rate
+    num_before = int(round(before * sample_rate))
+    length = num_before + int(round(after * sample_rate))
+    if length <= 0:
+        raise ValueError(f"Empty epochs, from {-before} s to {after} s around each marker.")
+
+    samples = recording.samples
+    channels = np.arange(recording.num_channels) if channels is None else np.asarray(channels, dtype=np.intp)
+
+    starts = np.asarray(markers.sample_indices, dtype=np.int64) - num_before
+    is_truncated = (starts < 0) | (starts + length > len(samples))
+
+    keep = ~is_truncated if truncated == "drop" else slice(None)
+    if truncated == "drop" and is_truncated.any():
+        logger.info(f"Dropping {int(is_truncated.sum())} epochs that run off the end of the recording.")
+    starts = starts[keep]
+    is_truncated = is_truncated[keep]
+
+    data = np.empty((len(starts), len(channels), length), dtype=dtype)
+
+    # Whole windows, a batch of trials per fancy index.
+    windows = _windows(samples, length)
+    whole = np.flatnonzero(~is_truncated)
+    for first in range(0, len(whole), batch_size):
+        trials = whole[first:first + batch_size]
+        data[trials] = windows[starts[trials][:, None], channels[None, :]]
+
+    # Windows off the ends, only ever a few, copy what there is.
+    for trial in np.flatnonzero(is_truncated):
+        data[trial] = np.nan
+        first = max(starts[trial], 0)
+        last = min(starts[trial] + length, len(samples))
+        if first < last:
+            data[trial, :, first - starts[trial]:last - starts[trial]] = samples[first:last][:, channels].T
+
+    if baseline is not None:
+        first = int(round(baseline[0] * sample_rate)) + num_before
+        last = int(round(baseline[1] * sample_rate)) + num_before
+        if not 0 <= first < last <= length:
+            raise ValueError(f"Baseline {baseline} isn't inside the epochs, from {-before} s to {after} s.")
+        with warnings.catch_warnings():
+            # Trials with no baseline samples inside the recording are left NaN.
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            data -= np.nanmean(data[:, :, first:last], axis=2, keepdims=True).astype(dtype)
+
+    return Epochs(data=data, labels=markers.labels[keep], sample_indices=markers.sample_indices[keep],
+                  truncated=is_truncated, channels=channels, sample_rate=sample_rate, before=num_before)
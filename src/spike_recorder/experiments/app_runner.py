@@ -1,24 +1,81 @@
 import sys
 import os
+import itertools
 import logging
 logger = logging.getLogger(__name__)
 
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from spike_recorder.qt_client import QtSpikeRecorder
+from spike_recorder.protocol import DEFAULT_PORT
+from spike_recorder.server import check_launch_endpoint, endpoint_from_args
 
-def run_app(app, ui, intro_d):
-    ui.showNormal()
 
-    # Show the instructions and ask for an output file name. Do some error
-    # checking if the file isn't valid.
-    fileNoGood = True
-    while fileNoGood:
+def launch_recorder(endpoint: str, timeout_ms: int, cpus: Sequence[int] = None, nice: int = None,
+                    parent: QtCore.QObject = None, attach: bool = False) -> QtSpikeRecorder:
+    """
+    Launch the SpikeRecorder and connect to it, the way the experiments use it. Or, with attach,
+    connect to one that is already running, such as the reference server.
+
+    Markers are sent without blocking the GUI, replies come back through the event loop. Markers
+    that can't be delivered during a stall are kept and replayed once the recorder answers
+    heartbeats again.
+
+    Args:
+        endpoint: The recorder's command endpoint.
+        timeout_ms: How long to wait for a reply, in milliseconds.
+        cpus: The CPUs to pin the recorder to.
+        nice: The recorder's niceness.
+        parent: The QObject that owns the client.
+        attach: Don't launch the recorder, it is already running on endpoint. The SpikeRecorder
+            application can only be launched on tcp port 5555, any other endpoint needs this.
+
+    Returns:
+        The connected client.
+
+    Raises:
+        ValueError: If the recorder is to be launched and endpoint isn't tcp port 5555.
+    """
+    if not attach:
+        check_launch_endpoint(endpoint)
+
+    record_client = QtSpikeRecorder(endpoint=endpoint, timeout_ms=timeout_ms, parent=parent,
+                                    outbox_size=1000, heartbeat_interval=1.0)
+    if not attach:
+        record_client.launch(endpoint=endpoint, cpus=cpus, nice=nice)
+    record_client.connect()
+    record_client.wait_ready()
+    return record_client
+
+
+def choose_output_file(ui, intro_d, filename: str = None) -> Optional[str]:
+    """
+    Show the instructions and ask for an output file name. Do some error checking if the file isn't
+    valid.
+
+    Args:
+        ui: The experiment's main window, its output_filename is set.
+        intro_d: The instructions dialog.
+        filename: Prefill the dialog with this file name.
+
+    Returns:
+        The output file name, None if the dialog was cancelled.
+    """
+    if filename is not None:
+        intro_d.textbox_file.setText(filename)
+
+    while True:
         # Try to open the output file for writing
         try:
             intro_d.show()
             intro_d.textbox_file.setFocus()
             intro_d.exec_()
 
+            if intro_d.result() != QtWidgets.QDialog.Accepted:
+                return None
+
             # Grab the filename from the textbox
             filename = intro_d.textbox_file.text()
 
@@ -35,8 +92,8 @@ def run_app(app, ui, intro_d):
             # Check if we can open the file. If so, set the output file on the main app
             # and we are ready to go!
             with open(filename, 'w') as f:
-                fileNoGood = False
-                ui.output_filename = intro_d.textbox_file.text()
+                ui.output_filename = filename
+                return filename
 
         except Exception as ex:
             msg = QtWidgets.QMessageBox(parent=ui)
@@ -47,12 +104,42 @@ def run_app(app, ui, intro_d):
             msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
             msg.exec_()
 
-    # Start a spike recorder recording for this session
-    if ui.spike_record:
-        # Generate the recording filename from the output filename
-        record_filename = os.path.splitext(filename)[0] + ".wav"
-        ui.record_client.start_record(record_filename)
-        logger.info(f"Generating recording: {record_filename}")
+
+def start_recording(ui, filename: str):
+    """
+    Start a spike recorder recording for this session, next to the output file.
+
+    Args:
+        ui: The experiment's main window.
+        filename: The output file name.
+
+    Returns:
+        None
+    """
+    if not ui.spike_record:
+        return
+
+    # Generate the recording filename from the output filename
+    record_filename = os.path.splitext(filename)[0] + ".wav"
+    ui.record_client.start_record(record_filename)
+
+    # Don't start the first trial before the recorder is capturing it.
+    try:
+        ui.record_client.wait_recording_started()
+    except TimeoutError as ex:
+        logger.error(f"{ex}")
+
+    logger.info(f"Generating recording: {record_filename}")
+
+
+def run_app(app, ui, intro_d):
+    ui.showNormal()
+
+    filename = choose_output_file(ui, intro_d)
+    if filename is None:
+        sys.exit(0)
+
+    start_recording(ui, filename)
 
     # Run the main app
     ret = app.exec_()
@@ -60,4 +147,146 @@ def run_app(app, ui, intro_d):
     if ui.spike_record:
         ui.record_client.shutdown()
 
-    sys.exit(ret)
\ No newline at end of file
+    sys.exit(ret)
+
+
+def run_session(ui, intro_d, filename: str = None) -> Optional[str]:
+    """
+    Run one participant and return once their window has closed, leaving the application and the
+    recorder running. The window must not exit the process when it closes.
+
+    Args:
+        ui: The experiment's main window, deleted when it closes.
+        intro_d: Its instructions dialog.
+        filename: Prefill the output file name with this.
+
+    Returns:
+        The participant's output file, None if the instructions dialog was cancelled.
+    """
+    ui.showNormal()
+    filename = choose_output_file(ui, intro_d, filename)
+    if filename is None:
+        if ui.isVisible():
+            ui.close()
+        ui.deleteLater()
+        return None
+
+    start_recording(ui, filename)
+
+    # Nothing can close the window before the loop runs, events aren't processed until then.
+    done = QtCore.QEventLoop()
+    ui.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+    ui.destroyed.connect(done.quit)
+    done.exec_()
+
+    return filename
+
+
+def run_kiosk(app, make_session: Callable[[Optional[QtSpikeRecorder]], Tuple[QtWidgets.QWidget, QtWidgets.QDialog]],
+              record_client: QtSpikeRecorder = None, filenames: Iterable[str] = None) -> int:
+    """
+    Run participants one after another in this process. Each gets a fresh window and data, but the
+    application, Qt and the recorder, and the connection to it, are started once and reused, with a
+    new recording per participant. The client's marker ledger and statistics are cleared at the
+    start of each session, so they only ever cover the current participant.
+
+    Args:
+        app: The QApplication.
+        make_session: Called with record_client to make each participant's window, which must not
+            exit the process when it closes, and instructions dialog.
+        record_client: The connected recorder client shared by every session, None to not record.
+            It is shut down when the kiosk finishes.
+        filenames: The output file of each participant, in order, they prefill the instructions
+            dialog. None keeps going until the dialog is cancelled.
+
+    Returns:
+        The number of sessions run.
+    """
+    app.setQuitOnLastWindowClosed(False)
+
+    sessions = 0
+    try:
+        for filename in (filenames if filenames is not None else itertools.repeat(None)):
+            if record_client is not None:
+                record_client.ledger.clear()
+                record_client.reset_stats()
+
+            ui, intro_d = make_session(record_client)
+            if run_session(ui, intro_d, filename) is None:
+                break
+            sessions = sessions + 1
+            logger.info(f"Kiosk session {sessions} finished.")
+    finally:
+        if record_client is not None:
+            record_client.shutdown()
+
+    return sessions
+
+
+def add_kiosk_args(parser):
+    """
+    Add the kiosk mode options shared by the iowa and libet command lines.
+
+    Args:
+        parser: The argparse.ArgumentParser to add the options to.
+
+    Returns:
+        None
+    """
+    parser.add_argument('--kiosk', action='store_true', default=False,
+                        help='Run participants one after another without restarting the experiment or '
+                             'the SpikeRecorder. Cancel the instructions dialog to finish.')
+    parser.add_argument('--participants', nargs='+', default=None,
+                        help='In kiosk mode, the participant IDs to run in order, each gets the output file '
+                             '<experiment>_<id>.csv. Default is to keep going until cancelled.')
+    parser.add_argument('--output-dir', default=".",
+                        help='In kiosk mode, where the participants\' output files go. Default is the current '
+                             'directory.')
+
+
+def add_attach_args(parser):
+    """
+    Add the option to use a recorder that is already running to an experiment's command line.
+
+    Args:
+        parser: The argparse.ArgumentParser to add the option to.
+
+    Returns:
+        None
+    """
+    parser.add_argument('--attach', action='store_true', default=False,
+                        help='With --spike-record, connect to a SpikeRecorder that is already running, such as '
+                             'spike-recorder-reference, instead of launching one. The SpikeRecorder application '
+                             f'can only be launched on tcp port {DEFAULT_PORT}, any other --endpoint, --transport '
+                             'or --port needs this. It is still shut down when the experiment finishes.')
+
+
+def check_recorder_args(parser, args):
+    """
+    Exit with a usage error if the options added with add_endpoint_args and add_attach_args ask to
+    launch the recorder somewhere it can't be launched.
+
+    Args:
+        parser: The argparse.ArgumentParser the options were parsed with.
+        args: The parsed options.
+
+    Returns:
+        None
+    """
+    if args.spike_record and not args.attach:
+        try:
+            check_launch_endpoint(endpoint_from_args(args))
+        except ValueError as ex:
+            parser.error(f"{ex} Use --attach to connect to a recorder that is already running there.")
+
+
+def kiosk_filenames(args, experiment: str) -> Optional[Sequence[str]]:
+    """
+    The participants' output files from options added with add_kiosk_args.
+
+    Returns:
+        The file names, None if no participants were given.
+    """
+    if args.participants is None:
+        return None
+    return [os.path.join(args.output_dir, f"{experiment}_{participant}.csv") for participant in args.participants]
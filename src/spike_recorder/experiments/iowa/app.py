@@ -1,23 +1,26 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
-import time
 
 import logging
 logger = logging.getLogger(__name__)
 
-from typing import Optional
+from typing import Optional, Sequence
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import Qt
 
-from spike_recorder.experiments.app_runner import run_app
+from spike_recorder.experiments.app_runner import run_app, run_kiosk, launch_recorder, add_kiosk_args, kiosk_filenames
+from spike_recorder.experiments.app_runner import add_attach_args, check_recorder_args
 from spike_recorder.experiments.iowa.instructions_ui import Ui_dialog_instructions
 from spike_recorder.experiments.iowa.iowa_ui import Ui_main_window
 from spike_recorder.experiments.iowa.win_message_ui import Ui_Dialog as Ui_win_message
 from spike_recorder.experiments.iowa.deck import Deck
 from spike_recorder.experiments.iowa.data import IowaData
-from spike_recorder.client import SpikeRecorder
+from spike_recorder.qt_client import QtSpikeRecorder
+from spike_recorder.protocol import DEFAULT_ENDPOINT, DEFAULT_TIMEOUT_MS
+from spike_recorder.server import add_endpoint_args, endpoint_from_args
+from spike_recorder.scheduling import add_scheduling_args, set_scheduling
 
 
 # It seems I need to add this to get trace backs to show up on
@@ -56,6 +59,8 @@ class IntroDialog(QtWidgets.QDialog, Ui_dialog_instructions):
         Returns:
             None
         """
+        # Finish the dialog first, in kiosk mode closing the window doesn't end the process.
+        QtWidgets.QDialog.reject(self)
         self.parent().close()
 
     def get_directory(self):
@@ -111,7 +116,10 @@ class IowaMainWindow(QtWidgets.QMainWindow, Ui_main_window):
     # How long to pause between deck pulls
     DELAY_SECS = 3
 
-    def __init__(self, total_deck_pulls: int = 100, spike_record: bool = False, seed: Optional[int] = None):
+    def __init__(self, total_deck_pulls: int = 100, spike_record: bool = False, seed: Optional[int] = None,
+                 endpoint: str = DEFAULT_ENDPOINT, timeout_ms: int = DEFAULT_TIMEOUT_MS,
+                 recorder_cpus: Sequence[int] = None, recorder_nice: int = None, attach_recorder: bool = False,
+                 record_client: QtSpikeRecorder = None, exit_on_close: bool = True):
 
         self.spike_record = spike_record
         self.total_deck_pulls = total_deck_pulls
@@ -189,11 +197,14 @@ class IowaMainWindow(QtWidgets.QMainWindow, Ui_main_window):
         # Setup the data recording
         self.data = IowaData()
 
-        # Launch the spike recorder if needed
-        if self.spike_record:
-            self.record_client = SpikeRecorder()
-            self.record_client.launch()
-            self.record_client.connect()
+        # Launch the spike recorder if needed, unless we were given one that is already running, in
+        # which case it outlives this window.
+        self.exit_on_close = exit_on_close
+        self.owns_recorder = record_client is None
+        self.record_client = record_client
+        if self.spike_record and self.record_client is None:
+            self.record_client = launch_recorder(endpoint, timeout_ms, cpus=recorder_cpus, nice=recorder_nice,
+                                                 parent=self, attach=attach_recorder)
 
         # Move the window over a bit to make room for the SpikeRecorder app
         self.move(10, 10)
@@ -312,15 +323,19 @@ class IowaMainWindow(QtWidgets.QMainWindow, Ui_main_window):
 
     def closeEvent(self, event):
         if self.spike_record:
-            self.record_client.stop_record()
+            # Don't shutdown until the recording is safely on disk.
+            try:
+                self.record_client.stop_record(wait_finalized=True)
+            except Exception as ex:
+                logger.error(f"Failed to finish SpikeRecorder recording: {ex}")
 
-            # Add a bit of sleep to let things shutdown on the server side
-            import time
-            time.sleep(1.0)
+            if self.owns_recorder:
+                self.record_client.shutdown()
 
-            self.record_client.shutdown()
+        if self.exit_on_close:
+            sys.exit(0)
 
-        sys.exit(0)
+        event.accept()
 
     def keyPressEvent(self, event):
         """
@@ -355,11 +370,40 @@ def main():
     parser.add_argument('--seed', type=int, default=0,
                         help='Seed for the random number generators that control deck randomness. '
                              'Default is 0 so behaviour between runs will be random but fixed')
+    parser.add_argument('--timeout-ms', type=int, default=DEFAULT_TIMEOUT_MS,
+                        help='How long to wait for the SpikeRecorder to reply to a command, in milliseconds. '
+                             f'Default is {DEFAULT_TIMEOUT_MS}.')
+    add_endpoint_args(parser)
+    add_attach_args(parser)
+    add_scheduling_args(parser)
+    add_kiosk_args(parser)
 
     args = parser.parse_args()
+    check_recorder_args(parser, args)
+
+    # Before Qt starts its threads, so they are covered too.
+    set_scheduling(cpus=args.ui_cpus, nice=args.ui_nice)
 
     app = QtWidgets.QApplication(sys.argv)
-    ui = IowaMainWindow(**vars(args))
+
+    if args.kiosk:
+        record_client = None
+        if args.spike_record:
+            record_client = launch_recorder(endpoint_from_args(args), args.timeout_ms,
+                                            cpus=args.recorder_cpus, nice=args.recorder_nice, attach=args.attach)
+
+        def make_session(record_client):
+            ui = IowaMainWindow(total_deck_pulls=args.total_deck_pulls, spike_record=args.spike_record,
+                                seed=args.seed, record_client=record_client, exit_on_close=False)
+            return ui, IntroDialog(parent=ui)
+
+        run_kiosk(app, make_session, record_client=record_client, filenames=kiosk_filenames(args, "iowa"))
+        sys.exit(0)
+
+    ui = IowaMainWindow(total_deck_pulls=args.total_deck_pulls, spike_record=args.spike_record, seed=args.seed,
+                        endpoint=endpoint_from_args(args), timeout_ms=args.timeout_ms,
+                        recorder_cpus=args.recorder_cpus, recorder_nice=args.recorder_nice,
+                        attach_recorder=args.attach)
     intro_d = IntroDialog(parent=ui)
     run_app(app, ui, intro_d)
 
@@ -7,13 +7,19 @@ import sys
 import logging
 logger = logging.getLogger(__name__)
 
+from typing import Sequence
+
 from PyQt5 import QtWidgets, QtCore
 
-from spike_recorder.experiments.app_runner import run_app
+from spike_recorder.experiments.app_runner import run_app, run_kiosk, launch_recorder, add_kiosk_args, kiosk_filenames
+from spike_recorder.experiments.app_runner import add_attach_args, check_recorder_args
 from spike_recorder.experiments.libet.libet_ui import Ui_Libet
 from spike_recorder.experiments.libet.instructions_ui import Ui_dialog_instructions
 from spike_recorder.experiments.libet.data import LibetData
-from spike_recorder.client import SpikeRecorder
+from spike_recorder.qt_client import QtSpikeRecorder
+from spike_recorder.protocol import DEFAULT_ENDPOINT, DEFAULT_TIMEOUT_MS
+from spike_recorder.server import add_endpoint_args, endpoint_from_args
+from spike_recorder.scheduling import add_scheduling_args, set_scheduling
 
 
 # It seems I need to add this to get trace backs to show up on
@@ -53,6 +59,8 @@ class IntroDialog(QtWidgets.QDialog, Ui_dialog_instructions):
         Returns:
             None
         """
+        # Finish the dialog first, in kiosk mode closing the window doesn't end the process.
+        QtWidgets.QDialog.reject(self)
         self.parent().close()
 
     def get_directory(self):
@@ -72,7 +80,10 @@ class LibetMainWindow(QtWidgets.QMainWindow, Ui_Libet):
 
     def __init__(self, spike_record: bool = False,
                  clock_hz_paradigm1: float = 1.0, clock_hz_paradigm2: float = 1.0,
-                 num_trials_paradigm1: int = 20, num_trials_paradigm2: int = 20):
+                 num_trials_paradigm1: int = 20, num_trials_paradigm2: int = 20,
+                 endpoint: str = DEFAULT_ENDPOINT, timeout_ms: int = DEFAULT_TIMEOUT_MS,
+                 recorder_cpus: Sequence[int] = None, recorder_nice: int = None, attach_recorder: bool = False,
+                 record_client: QtSpikeRecorder = None, exit_on_close: bool = True):
 
         self.spike_record = spike_record
         self.clock_hz_paradigm1 = clock_hz_paradigm1
@@ -105,11 +116,14 @@ class LibetMainWindow(QtWidgets.QMainWindow, Ui_Libet):
         # Set the clock speed for paradigm1
         self.clock_widget.rotations_per_minute = self.clock_hz_paradigm1 * 60.0
 
-        # Launch the spike recorder if needed
-        if self.spike_record:
-            self.record_client = SpikeRecorder()
-            self.record_client.launch()
-            self.record_client.connect()
+        # Launch the spike recorder if needed, unless we were given one that is already running, in
+        # which case it outlives this window.
+        self.exit_on_close = exit_on_close
+        self.owns_recorder = record_client is None
+        self.record_client = record_client
+        if self.spike_record and self.record_client is None:
+            self.record_client = launch_recorder(endpoint, timeout_ms, cpus=recorder_cpus, nice=recorder_nice,
+                                                 parent=self, attach=attach_recorder)
 
         # Move the window over a bit to make room for the SpikeRecorder app
         self.move(10, 10)
@@ -248,15 +262,19 @@ class LibetMainWindow(QtWidgets.QMainWindow, Ui_Libet):
     def closeEvent(self, event):
         if self.spike_record:
 
-            self.record_client.stop_record()
+            # Don't shutdown until the recording is safely on disk.
+            try:
+                self.record_client.stop_record(wait_finalized=True)
+            except Exception as ex:
+                logger.error(f"Failed to finish SpikeRecorder recording: {ex}")
 
-            # Add a bit of sleep to let things shutdown on the server side
-            import time
-            time.sleep(1.0)
+            if self.owns_recorder:
+                self.record_client.shutdown()
 
-            self.record_client.shutdown()
+        if self.exit_on_close:
+            sys.exit(0)
 
-        sys.exit(0)
+        event.accept()
 
     def record_event_marker(self, marker: str):
         """
@@ -311,11 +329,47 @@ def main():
     parser.add_argument('--clock-hz-paradigm2', type=float, default=1.0,
                         help='The number of full rotations the clock makes per second in paradigm two. Default is 1 '
                              'but can be set lower than 1.')
+    parser.add_argument('--timeout-ms', type=int, default=DEFAULT_TIMEOUT_MS,
+                        help='How long to wait for the SpikeRecorder to reply to a command, in milliseconds. '
+                             f'Default is {DEFAULT_TIMEOUT_MS}.')
+    add_endpoint_args(parser)
+    add_attach_args(parser)
+    add_scheduling_args(parser)
+    add_kiosk_args(parser)
 
     args = parser.parse_args()
+    check_recorder_args(parser, args)
+
+    # Before Qt starts its threads, so they are covered too.
+    set_scheduling(cpus=args.ui_cpus, nice=args.ui_nice)
 
     app = QtWidgets.QApplication(sys.argv)
-    ui = LibetMainWindow(**vars(args))
+
+    if args.kiosk:
+        record_client = None
+        if args.spike_record:
+            record_client = launch_recorder(endpoint_from_args(args), args.timeout_ms,
+                                            cpus=args.recorder_cpus, nice=args.recorder_nice, attach=args.attach)
+
+        def make_session(record_client):
+            ui = LibetMainWindow(spike_record=args.spike_record,
+                                 clock_hz_paradigm1=args.clock_hz_paradigm1,
+                                 clock_hz_paradigm2=args.clock_hz_paradigm2,
+                                 num_trials_paradigm1=args.num_trials_paradigm1,
+                                 num_trials_paradigm2=args.num_trials_paradigm2,
+                                 record_client=record_client, exit_on_close=False)
+            return ui, IntroDialog(parent=ui)
+
+        run_kiosk(app, make_session, record_client=record_client, filenames=kiosk_filenames(args, "libet"))
+        sys.exit(0)
+
+    ui = LibetMainWindow(spike_record=args.spike_record,
+                         clock_hz_paradigm1=args.clock_hz_paradigm1, clock_hz_paradigm2=args.clock_hz_paradigm2,
+                         num_trials_paradigm1=args.num_trials_paradigm1,
+                         num_trials_paradigm2=args.num_trials_paradigm2,
+                         endpoint=endpoint_from_args(args), timeout_ms=args.timeout_ms,
+                         recorder_cpus=args.recorder_cpus, recorder_nice=args.recorder_nice,
+                         attach_recorder=args.attach)
     intro_d = IntroDialog(parent=ui)
     run_app(app=app, ui=ui, intro_d=intro_d)
 
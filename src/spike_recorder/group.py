@@ -0,0 +1,210 @@
+"""
+Drive several SpikeRecorder instances, one per rig, from one control machine.
+"""
+import concurrent.futures
+import multiprocessing
+import time
+
+import attr
+
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.client import SpikeRecorder
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class RecorderResult:
+    """
+    How one recorder of a group answered a command.
+
+    Args:
+        endpoint: The recorder's endpoint.
+        ok: Whether the recorder acknowledged the command.
+        latency_ms: Time from sending the command to the acknowledgement, or to the failure, in
+            milliseconds.
+        error: The exception the command raised, None if ok.
+    """
+    endpoint: str
+    ok: bool
+    latency_ms: float
+    error: Optional[Exception] = None
+
+
+class RecorderGroup:
+    """
+    Sends each command to a group of recorders in parallel and reports, for every recorder, whether
+    it acknowledged and how long it took. A recorder that fails doesn't stop the command reaching
+    the others. Each rig runs its own recorder, the application always listens on tcp port 5555.
+
+        >>> group = RecorderGroup([make_endpoint(host="rig1"), make_endpoint(host="rig2")])
+        >>> group.connect()
+        >>> group.start_record("rig{index}.wav")
+        >>> results = group.push_event_marker("Stimulus")
+        >>> [r.latency_ms for r in results.values()]
+        >>> group.stop_record()
+        >>> group.shutdown()
+
+    Args:
+        endpoints: The command endpoint of each recorder, see protocol.make_endpoint
+        **client_args: Passed on to the SpikeRecorder client of each recorder.
+    """
+
+    def __init__(self, endpoints: Sequence[str], **client_args):
+        if len(set(endpoints)) != len(endpoints):
+            raise ValueError("RecorderGroup endpoints must be distinct.")
+
+        self.endpoints = list(endpoints)
+        self.recorders: Dict[str, SpikeRecorder] = {endpoint: SpikeRecorder(endpoint=endpoint, **client_args)
+                                                    for endpoint in self.endpoints}
+        self.processes: Dict[str, multiprocessing.Process] = {}
+
+        # One worker per recorder so every command goes out to all of them at once.
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(len(self.endpoints), 1),
+                                                               thread_name_prefix="RecorderGroup")
+
+    def __len__(self):
+        return len(self.recorders)
+
+    def launch(self) -> Dict[str, multiprocessing.Process]:
+        """
+        Launch the SpikeRecorder application on this machine for a group of one recorder. See
+        SpikeRecorder.launch, the application can only be launched on tcp port 5555, so only one
+        per machine. Several recorders on one machine, for testing, are reference servers, see
+        spike_recorder.server.reference
+
+        Returns:
+            A dictionary from endpoint to the process running that recorder.
+
+        Raises:
+            ValueError: If the group has more than one recorder, or its endpoint isn't tcp port 5555.
+                Nothing is launched.
+        """
+        from spike_recorder.server import check_launch_endpoint
+
+        if len(self.endpoints) > 1:
+            raise ValueError("Only one SpikeRecorder application can be launched per machine, each rig of a "
+                             "RecorderGroup runs its own.")
+        for endpoint in self.endpoints:
+            check_launch_endpoint(endpoint)
+
+        for endpoint in self.endpoints:
+            self.processes[endpoint] = SpikeRecorder.launch(endpoint=endpoint)
+        return self.processes
+
+    def connect(self, **connect_args) -> Dict[str, RecorderResult]:
+        """
+        Connect to each recorder. See SpikeRecorder.connect
+
+        Args:
+            **connect_args: Passed on to SpikeRecorder.connect
+
+        Returns:
+            A dictionary from endpoint to how that recorder answered.
+        """
+        return self._broadcast(lambda recorder: recorder.connect(**connect_args))
+
+    def close(self):
+        """
+        Close the connections to all the recorders. This does not shutdown the applications, see
+        shutdown.
+
+        Returns:
+            None
+        """
+        for recorder in self.recorders.values():
+            recorder.close()
+        self._executor.shutdown()
+
+    def shutdown(self, block: bool = False) -> Dict[str, RecorderResult]:
+        """
+        Close all the SpikeRecorder applications. See SpikeRecorder.shutdown
+
+        Args:
+            block: Whether to wait for a reply from each recorder.
+
+        Returns:
+            A dictionary from endpoint to how that recorder answered.
+        """
+        return self._broadcast(lambda recorder: recorder.shutdown(block=block))
+
+    def start_record(self, filename: Union[str, List[str], None] = None, block: bool = True) -> Dict[str, RecorderResult]:
+        """
+        Begin recording on every recorder. See SpikeRecorder.start_record
+
+        Args:
+            filename: A filename or directory for each recorder, in the order of the endpoints, or a
+                single one for all of them. A single filename can contain {index}, which is
+                replaced by the recorder's position in the group, so that rigs writing to the same
+                disk don't overwrite each other.
+            block: Whether to wait for a reply from each recorder.
+
+        Returns:
+            A dictionary from endpoint to how that recorder answered.
+        """
+        if filename is None or isinstance(filename, str):
+            filenames = [None if filename is None else filename.format(index=i) for i in range(len(self))]
+        else:
+            filenames = list(filename)
+            if len(filenames) != len(self):
+                raise ValueError(f"Got {len(filenames)} filenames for {len(self)} recorders.")
+
+        names = dict(zip(self.endpoints, filenames))
+        return self._broadcast(lambda recorder: recorder.start_record(names[recorder.endpoint], block=block))
+
+    def stop_record(self, block: bool = True) -> Dict[str, RecorderResult]:
+        """
+        Stop recording on every recorder. See SpikeRecorder.stop_record
+
+        Args:
+            block: Whether to wait for a reply from each recorder.
+
+        Returns:
+            A dictionary from endpoint to how that recorder answered.
+        """
+        return self._broadcast(lambda recorder: recorder.stop_record(block=block))
+
+    def push_event_marker(self, marker: str, block: bool = True) -> Dict[str, RecorderResult]:
+        """
+        Push an event marker into every recording. All the recorders get the same client_timestamp,
+        the time of this call. See SpikeRecorder.push_event_marker
+
+        Args:
+            marker: An arbitrary string label to identify this marker.
+            block: Whether to wait for a reply from each recorder.
+
+        Returns:
+            A dictionary from endpoint to how that recorder answered.
+        """
+        client_timestamp = time.perf_counter_ns()
+        return self._broadcast(lambda recorder: recorder.push_event_marker(marker, block=block,
+                                                                           client_timestamp=client_timestamp))
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        """
+        Round trip statistics of each recorder, see SpikeRecorder.stats
+
+        Returns:
+            A dictionary from endpoint to that recorder's statistics.
+        """
+        return {endpoint: recorder.stats() for endpoint, recorder in self.recorders.items()}
+
+    def _broadcast(self, command: Callable[[SpikeRecorder], None]) -> Dict[str, RecorderResult]:
+        """
+        Run command against every recorder in parallel and wait for them all.
+        """
+        def run(recorder: SpikeRecorder) -> RecorderResult:
+            start = time.perf_counter_ns()
+            try:
+                command(recorder)
+            except Exception as ex:
+                logger.error(f"SpikeRecorder at {recorder.endpoint} failed: {ex!r}")
+                return RecorderResult(endpoint=recorder.endpoint, ok=False,
+                                      latency_ms=(time.perf_counter_ns() - start) / 1e6, error=ex)
+            return RecorderResult(endpoint=recorder.endpoint, ok=True,
+                                  latency_ms=(time.perf_counter_ns() - start) / 1e6)
+
+        futures = {endpoint: self._executor.submit(run, recorder) for endpoint, recorder in self.recorders.items()}
+        return {endpoint: future.result() for endpoint, future in futures.items()}
@@ -0,0 +1,153 @@
+"""
+A client side record of every event marker the recorder acknowledged.
+"""
+import csv
+import threading
+
+import attr
+
+from typing import Iterator, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    from spike_recorder.clocksync import ClockEstimate
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class MarkerEntry:
+    """
+    One acknowledged event marker.
+
+    Args:
+        label: The marker's name.
+        client_time_ns: The client's time.perf_counter_ns() when the marker was pushed.
+        sample_index: The sample of the recording the marker landed on, None if the recorder didn't
+            say, for example because it wasn't recording.
+        sample_time: The marker's time in the recording, in seconds, None if the recorder didn't say.
+    """
+    label: str
+    client_time_ns: int
+    sample_index: Optional[int] = None
+    sample_time: Optional[float] = None
+
+
+class MarkerLedger:
+    """
+    An append only, in memory, list of the event markers pushed during a session and where each
+    one landed in the recording, as reported in the recorder's acknowledgement. At the end of a
+    session it can be exported straight to a NumPy structured array or a CSV file, so analysis
+    doesn't have to wait on parsing the recording's events file. Safe to append to from multiple
+    threads.
+
+        >>> spike_client.ledger.to_numpy()['sample_index']
+    """
+
+    # Columns of to_numpy and to_csv. A missing sample_index is -1 and a missing sample_time NaN.
+    FIELDS = ('label', 'client_time_ns', 'sample_index', 'sample_time')
+
+    def __init__(self):
+        self._entries: List[MarkerEntry] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[MarkerEntry]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __getitem__(self, index) -> MarkerEntry:
+        return self._entries[index]
+
+    def append(self, label: str, client_time_ns: int, sample_index: Optional[int] = None,
+               sample_time: Optional[float] = None):
+        """
+        Record a marker.
+
+        Args:
+            label: The marker's name.
+            client_time_ns: The client's time.perf_counter_ns() when the marker was pushed.
+            sample_index: The sample of the recording the marker landed on.
+            sample_time: The marker's time in the recording, in seconds.
+
+        Returns:
+            None
+        """
+        entry = MarkerEntry(label=label, client_time_ns=client_time_ns, sample_index=sample_index,
+                            sample_time=sample_time)
+        with self._lock:
+            self._entries.append(entry)
+
+    def clear(self):
+        """
+        Forget every marker, for example at the start of each participant's session.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries = []
+
+    def to_numpy(self) -> 'np.ndarray':
+        """
+        Export the ledger as a NumPy structured array with the columns in FIELDS.
+
+        Returns:
+            The structured array, one row per marker.
+        """
+        import numpy as np
+
+        entries = list(self)
+        label_length = max([len(entry.label) for entry in entries] + [1])
+        dtype = np.dtype([('label', f'U{label_length}'), ('client_time_ns', 'i8'),
+                          ('sample_index', 'i8'), ('sample_time', 'f8')])
+
+        return np.array([(entry.label, entry.client_time_ns,
+                          -1 if entry.sample_index is None else entry.sample_index,
+                          np.nan if entry.sample_time is None else entry.sample_time)
+                         for entry in entries], dtype=dtype)
+
+    def estimate_sample_indices(self, estimate: 'ClockEstimate', start_sample_index: int,
+                                sample_rate: int) -> 'np.ndarray':
+        """
+        Place every marker in a recording from its client_time_ns, with a clock estimate rather
+        than the recorder's acknowledgement. For markers the recorder didn't place, or to check
+        the ones it did against when they were pushed.
+
+            >>> files = spike_client.start_record()
+            >>> spike_client.sync_clock()
+            >>> ...
+            >>> recording = Recording(files.wav_path)
+            >>> spike_client.ledger.estimate_sample_indices(spike_client.clock_estimate,
+            ...                                             files.start_sample_index, recording.sample_rate)
+
+        Args:
+            estimate: The clock estimate, see SpikeRecorder.sync_clock
+            start_sample_index: The recording's start_sample_index, see RecordingFiles.
+            sample_rate: The recording's sample rate.
+
+        Returns:
+            The nearest sample of the recording to each marker, in ledger order. Markers from
+            before the recording started are negative.
+        """
+        import numpy as np
+
+        samples = [estimate.to_sample_index(entry.client_time_ns, sample_rate) - start_sample_index
+                   for entry in self]
+        return np.rint(np.array(samples, dtype=np.float64)).astype(np.int64)
+
+    def to_csv(self, filename: str):
+        """
+        Write the ledger to a CSV file with a header row of FIELDS.
+
+        Args:
+            filename: The file to write.
+
+        Returns:
+            None
+        """
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.FIELDS)
+            for entry in self:
+                writer.writerow(['' if value is None else value for value in attr.astuple(entry)])
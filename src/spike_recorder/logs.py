@@ -0,0 +1,137 @@
+"""
+Logging for the SpikeRecorder clients.
+
+Every command sent and reply received is logged at DEBUG as a structured record. The message is
+only formatted if a handler actually emits it, and the record carries the details as attributes,
+spike_command, spike_reply and spike_latency_ns, for handlers and filters that want them without
+parsing the message. When DEBUG is off, logging a command costs one isEnabledFor check.
+
+Handlers still do their formatting and I/O on the thread that logs, inside the command's timing.
+start_background_logging moves that to a background thread. The thread still needs the GIL, so
+with a fast local handler commands get no cheaper, it pays off when handlers can stall on I/O, a
+network share or a busy disk, see benchmarks/bench_logging.py:
+
+    >>> logging.basicConfig(filename="session.log", level=logging.DEBUG)
+    >>> start_background_logging()
+    >>> ...
+    >>> stop_background_logging()
+"""
+import logging
+import logging.handlers
+import queue
+
+from typing import List, Optional
+
+from spike_recorder.protocol import CommandMsg
+
+
+def log_sent(logger: logging.Logger, command: CommandMsg):
+    """
+    Log a command about to be sent.
+
+    Args:
+        logger: The client's logger.
+        command: The command.
+
+    Returns:
+        None
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sending: %s", command, extra={'spike_command': command.type.value})
+
+
+def log_received(logger: logging.Logger, command: CommandMsg, reply: CommandMsg, latency_ns: int):
+    """
+    Log the reply to a command.
+
+    Args:
+        logger: The client's logger.
+        command: The command.
+        reply: Its reply.
+        latency_ns: The round trip, in nanoseconds.
+
+    Returns:
+        None
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received: %s", reply, extra={'spike_command': command.type.value,
+                                                   'spike_reply': reply.type.value,
+                                                   'spike_latency_ns': latency_ns})
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that leaves formatting to the listener. The stock one formats the message on the
+    logging thread, which is the work we want off it. Records keep references to their args, which
+    is fine for the immutable or fresh objects the clients log.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# (logger, its handlers, its propagate flag, the queue handler, the listener) while running
+_background = None
+
+
+def start_background_logging(name: str = "spike_recorder") -> logging.handlers.QueueListener:
+    """
+    Send the records of a logger, and its children, through a queue to a background thread that
+    runs the handlers they would otherwise have reached on the logging thread: the logger's own
+    and, if it propagates, its ancestors'.
+
+    Args:
+        name: The logger to move off the calling threads.
+
+    Returns:
+        The running QueueListener.
+    """
+    global _background
+
+    if _background is not None:
+        raise RuntimeError("Background logging is already running.")
+
+    log = logging.getLogger(name)
+
+    handlers: List[logging.Handler] = list(log.handlers)
+    parent: Optional[logging.Logger] = log
+    while parent.propagate and parent.parent is not None:
+        parent = parent.parent
+        handlers.extend(parent.handlers)
+
+    records = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(records)
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+
+    _background = (log, list(log.handlers), log.propagate, queue_handler, listener)
+
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(queue_handler)
+    log.propagate = False
+
+    listener.start()
+    return listener
+
+
+def stop_background_logging():
+    """
+    Flush the queue and put the logger's handlers back the way they were.
+
+    Returns:
+        None
+    """
+    global _background
+
+    if _background is None:
+        return
+
+    log, handlers, propagate, queue_handler, listener = _background
+    _background = None
+
+    log.removeHandler(queue_handler)
+    for handler in handlers:
+        log.addHandler(handler)
+    log.propagate = propagate
+
+    listener.stop()
@@ -0,0 +1,200 @@
+import attr
+import json
+import os
+import tempfile
+
+from typing import Dict, Optional
+from enum import unique, Enum
+
+# Where the SpikeRecorder application listens for commands unless told otherwise.
+DEFAULT_PORT = 5555
+DEFAULT_ENDPOINT = f"tcp://localhost:{DEFAULT_PORT}"
+
+# How long clients wait for a reply before deciding the application is unavailable.
+DEFAULT_TIMEOUT_MS = 500
+
+# The environment variable a launched application reads its command endpoint from.
+ENDPOINT_ENV_VAR = "SPIKE_RECORDER_ENDPOINT"
+
+TRANSPORTS = ("tcp", "ipc")
+
+
+def make_endpoint(transport: str = "tcp", host: str = "localhost", port: int = DEFAULT_PORT,
+                  path: str = None) -> str:
+    """
+    Build a ZeroMQ endpoint for the command socket.
+
+    Args:
+        transport: "tcp" for a TCP socket, or "ipc" for a Unix domain socket. IPC avoids the TCP
+            loopback stack and port clashes when the client and application are on one machine.
+        host: The host to connect to for tcp.
+        port: The port for tcp.
+        path: The socket file for ipc, defaults to spike-recorder-<port>.ipc in the temp directory.
+
+    Returns:
+        The endpoint string, e.g. "tcp://localhost:5555" or "ipc:///tmp/spike-recorder-5555.ipc"
+    """
+    if transport == "tcp":
+        return f"tcp://{host}:{port}"
+    elif transport == "ipc":
+        if path is None:
+            path = os.path.join(tempfile.gettempdir(), f"spike-recorder-{port}.ipc")
+        return f"ipc://{path}"
+    else:
+        raise ValueError(f"Unknown transport '{transport}', must be one of {TRANSPORTS}.")
+
+
+def bind_endpoint(endpoint: str) -> str:
+    """
+    Convert an endpoint clients connect to into one a server can bind. TCP endpoints on
+    localhost bind the loopback interface, everything else is unchanged.
+
+    Args:
+        endpoint: The endpoint clients connect to.
+
+    Returns:
+        The endpoint to bind.
+    """
+    if endpoint.startswith("tcp://localhost:"):
+        return endpoint.replace("tcp://localhost:", "tcp://127.0.0.1:", 1)
+    return endpoint
+
+
+class SpikeRecorderUnavailable(Exception):
+    """This exception is raised whenever we cannot reach the SpikeRecorder"""
+    pass
+
+
+@unique
+class CommandType(Enum):
+    """
+    The type of command we want to execute on the server side.
+
+        START_RECORD: Start a recording, this is equivalent to pressing the record button in GUI.
+            The reply may carry args['wav_path'] and args['events_path'] of the new recording, and
+            args['start_sample_index'], the sample of the recorder's clock, see PING, that the
+            recording's first sample was acquired at.
+        STOP_RECORDING: Stop a recording, this is equivalent to pressing the record button in GUI.
+            Once the recording's files are flushed and closed the reply carries
+            args['finalized'] = True along with args['wav_path'], args['events_path'] and
+            args['start_sample_index'] as in START_RECORD.
+        PUSH_EVENT_MARKER: Push an event to the recording. args['name'] is the marker label and
+            args['client_timestamp'] the client's time.perf_counter_ns() when the event happened.
+            While recording, the reply carries args['sample_index'], the sample of the recording
+            the marker landed on, and args['sample_time'], that sample's time in seconds.
+        PUSH_EVENT_MARKERS: Push a batch of events to the recording. args['markers'] is a list
+            of {'name': str, 'client_timestamp': int} entries. While recording, the reply carries
+            args['sample_indices'] and args['sample_times'], one for each marker.
+        SHUTDOWN: Shutdown the server.
+        NEGOTIATE: Agree on a wire encoding. args['encodings'] lists the encodings the client
+            supports in order of preference, the server replies with args['encoding'] set to
+            the one it picked. Always sent as JSON.
+        PING: Clock synchronization ping. args['client_time_ns'] is the client's send time, the
+            server replies with args['sample_index'], the number of samples it had acquired when
+            it handled the ping, args['sample_rate'] and args['recorder_time_ns'], that sample
+            count in nanoseconds. The recorder's clock is its sample clock, so markers can be
+            placed in the recording from their client time, see ClockEstimate.to_sample_index.
+        HEARTBEAT: Check the server is alive, it replies with REPLY_OK.
+        STATUS: Ask for the recorder's state. The reply carries args['recording'], whether a
+            recording is in progress, args['wav_path'] and args['events_path'] of the current or
+            last recording and args['finalized'], whether that recording's files are closed,
+            along with args['start_sample_index'] as in START_RECORD. args['sample_index'] and
+            args['sample_rate'] are as in PING. If the recorder publishes its samples,
+            args['data_endpoint'] is where, see spike_recorder.stream.
+        REPLY_OK: Server sends this back if command is accepted.
+        REPLY_ERROR: Server sends this back if command failed.
+
+    """
+    START_RECORD = "START_RECORD"
+    STOP_RECORD = "STOP_RECORD"
+    PUSH_EVENT_MARKER = "PUSH_EVENT_MARKER"
+    PUSH_EVENT_MARKERS = "PUSH_EVENT_MARKERS"
+    SHUTDOWN = "SHUTDOWN"
+    NEGOTIATE = "NEGOTIATE"
+    PING = "PING"
+    HEARTBEAT = "HEARTBEAT"
+    STATUS = "STATUS"
+    REPLY_OK = "REPLY_OK"
+    REPLY_ERROR = "REPLY_ERROR"
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class RecordingFiles:
+    """
+    The files a recording is saved to.
+
+    Args:
+        wav_path: The WAV file of samples.
+        events_path: The text file of event markers.
+        start_sample_index: The sample of the recorder's clock the recording's first sample was
+            acquired at, None if the recorder doesn't say. See MarkerLedger.estimate_sample_indices
+    """
+    wav_path: str
+    events_path: str
+    start_sample_index: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, args: Dict) -> Optional['RecordingFiles']:
+        """
+        Pull the recording files out of a reply's args.
+
+        Args:
+            args: The args of a START_RECORD, STOP_RECORD or STATUS reply.
+
+        Returns:
+            The files, None if the reply doesn't say.
+        """
+        if 'wav_path' not in args:
+            return None
+        return cls(wav_path=args['wav_path'], events_path=args.get('events_path'),
+                   start_sample_index=args.get('start_sample_index'))
+
+
+@attr.s(auto_attribs=True)
+class CommandMsg:
+    """
+    A structure to represent command passed to the SpikeRecorder application server side. These
+    are serialized to JSON, or the binary encoding in spike_recorder.wire, and sent over ZeroMQ.
+    """
+    type: CommandType
+    args: Dict = attr.ib(default=attr.Factory(dict))
+
+    def to_json(self) -> str:
+        """
+        Serialize this CommandMsg to JSON
+
+        Returns:
+            A string containing the JSON for this message.
+        """
+        return json.dumps({'type': self.type.value, 'args': self.args})
+
+    @classmethod
+    def from_json(cls, json_str) -> 'CommandMsg':
+        """
+        Convert a JSON string to CommandMsg
+
+        Args:
+            json_str: The JSON string to parse
+
+        Returns:
+            A CommandMsg instance for this JSON string.
+        """
+        msg = json.loads(json_str)
+        return cls(type=CommandType(msg['type']), args=msg.get('args', {}))
+
+    @classmethod
+    def from_reply(cls, reply_bytes: bytes) -> 'CommandMsg':
+        """
+        Convert a raw reply received from the SpikeRecorder application to a CommandMsg. The
+        application null terminates its replies so we need to strip that first.
+
+        Args:
+            reply_bytes: The raw bytes of the reply frame.
+
+        Returns:
+            A CommandMsg instance for this reply.
+        """
+        if reply_bytes.endswith(b'\0'):
+            reply_bytes = reply_bytes[:-1]
+
+        return cls.from_json(reply_bytes)
@@ -0,0 +1,457 @@
+"""
+A SpikeRecorder client for Qt applications that never blocks the event loop on IPC.
+"""
+import collections
+import itertools
+import time
+
+import zmq
+
+from PyQt5 import QtCore
+
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.protocol import SpikeRecorderUnavailable, CommandMsg, CommandType, RecordingFiles
+from spike_recorder.protocol import DEFAULT_ENDPOINT, DEFAULT_TIMEOUT_MS
+from spike_recorder import wire
+from spike_recorder.logs import log_sent, log_received
+from spike_recorder.ledger import MarkerLedger
+
+# Only needed to annotate launch, keep it out of the import.
+if TYPE_CHECKING:
+    import multiprocessing
+
+
+class QtSpikeRecorder(QtCore.QObject):
+    """
+    Controls the SpikeRecorder from a Qt application. Commands issued while an experiment is
+    running, push_event_marker and send, return straight away and their replies arrive later as
+    the replied and failed signals, so a slow recorder can't freeze rendering or input handling.
+
+    Replies are read from a DEALER socket, like AsyncSpikeRecorder, that is watched with a
+    QSocketNotifier, so they are picked up by the Qt event loop without any polling.
+
+    Session setup and teardown, launch, connect, wait_ready, start_record, stop_record and shutdown,
+    block as they do on SpikeRecorder. They first wait for any commands still in flight, so the
+    recorder sees everything in the order it was issued.
+
+        >>> recorder = QtSpikeRecorder(parent=window)
+        >>> recorder.failed.connect(lambda request_id, error: print(error))
+        >>> recorder.connect()
+        >>> recorder.push_event_marker("Trial 1: Start")
+
+    Args:
+        endpoint: The ZeroMQ endpoint of the application's command socket.
+        timeout_ms: How long to wait, in milliseconds, for a reply before deciding the application
+            is unavailable.
+        parent: The QObject that owns this one.
+        **client_args: Passed on to the SpikeRecorder used for the blocking commands. If it is given
+            an outbox_size, markers that fail are put in its outbox and replayed by its heartbeat.
+            Markers pushed while the outbox has markers waiting go in behind them, and fail with
+            SpikeRecorderUnavailable too, so nothing overtakes the replay. Acknowledged markers go
+            in its ledger, see ledger.
+
+    When a command times out the DEALER socket is closed and a new one opened, and every command
+    still in flight on the old one fails. Otherwise the markers the old socket still holds would be
+    sent when the recorder comes back, as well as replayed from the outbox.
+    """
+
+    # A command got a reply, (request ID, reply CommandMsg). Error replies are emitted as failed.
+    replied = QtCore.pyqtSignal(int, object)
+
+    # A command failed, (request ID, exception). SpikeRecorderUnavailable if no reply came in time.
+    failed = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, timeout_ms: int = DEFAULT_TIMEOUT_MS,
+                 parent: QtCore.QObject = None, **client_args):
+        super().__init__(parent)
+
+        self.client = SpikeRecorder(endpoint=endpoint, timeout_ms=timeout_ms, **client_args)
+        self.socket = None
+        self._notifier = None
+
+        self._request_ids = itertools.count()
+
+        # request ID -> (command, send time)
+        self._pending: Dict[int, Tuple[CommandMsg, int]] = {}
+
+        # Markers on their way to the client's outbox, while its lock is held by a replay.
+        self._held = collections.deque()
+
+        self._timeout_timer = QtCore.QTimer(self)
+        self._timeout_timer.setInterval(max(timeout_ms // 4, 10))
+        self._timeout_timer.timeout.connect(self._expire)
+
+    @property
+    def endpoint(self) -> str:
+        return self.client.endpoint
+
+    @property
+    def timeout_ms(self) -> int:
+        return self.client.timeout_ms
+
+    @property
+    def ledger(self) -> MarkerLedger:
+        """
+        Every marker the recorder acknowledged, see SpikeRecorder.ledger
+        """
+        return self.client.ledger
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of commands still waiting on a reply.
+        """
+        return len(self._pending)
+
+    @staticmethod
+    def launch(endpoint: str = None, cpus: Sequence[int] = None, nice: int = None) -> 'multiprocessing.Process':
+        """
+        Launch the BackyardBrains SpikeRecorder app. See SpikeRecorder.launch
+
+        Args:
+            endpoint: The endpoint the application should listen for commands on.
+            cpus: The CPUs to pin the application to.
+            nice: The application's niceness.
+
+        Returns:
+            The multiprocessing.Process running that the application is running inside.
+        """
+        return SpikeRecorder.launch(endpoint=endpoint, cpus=cpus, nice=nice)
+
+    def connect(self, **connect_args):
+        """
+        Connect to an already running BackyardBrains SpikeRecorder GUI application. See
+        SpikeRecorder.connect
+
+        Args:
+            **connect_args: Passed on to SpikeRecorder.connect
+
+        Returns:
+            None
+        """
+        self.client.connect(**connect_args)
+        self._open_socket()
+
+    def _open_socket(self):
+        self._close_socket()
+        self.socket = self.client.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(self.client.endpoint)
+
+        self._notifier = QtCore.QSocketNotifier(self.socket.getsockopt(zmq.FD), QtCore.QSocketNotifier.Read, self)
+        self._notifier.activated.connect(self._on_readable)
+
+    def close(self):
+        """
+        Close the connection to the SpikeRecorder application. Commands still waiting on a reply
+        fail with SpikeRecorderUnavailable.
+
+        Returns:
+            None
+        """
+        self._close_socket()
+        self._timeout_timer.stop()
+
+        for request_id in list(self._pending):
+            self._fail(request_id, SpikeRecorderUnavailable())
+        self._release_held(block=True)
+
+        self.client.close()
+
+    def _close_socket(self):
+        if self._notifier is not None:
+            self._notifier.setEnabled(False)
+            self._notifier.deleteLater()
+            self._notifier = None
+
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def wait_ready(self, timeout: float = 30.0) -> bool:
+        """
+        Wait until the application answers commands. See SpikeRecorder.wait_ready
+
+        Args:
+            timeout: The longest time to wait, in seconds.
+
+        Returns:
+            True if the application is ready.
+        """
+        return self.client.wait_ready(timeout=timeout)
+
+    def start_record(self, filename: str = None) -> Optional[RecordingFiles]:
+        """
+        Begin a recording session, blocking. See SpikeRecorder.start_record
+
+        Args:
+            filename: Either a filename or directory, or None for the SpikeRecorder default.
+
+        Returns:
+            The files the recording goes to, if the application says.
+        """
+        self.wait_idle()
+        return self.client.start_record(filename)
+
+    def wait_recording_started(self, timeout: float = 10.0) -> Optional[RecordingFiles]:
+        """
+        Wait until the application reports that it is recording. See SpikeRecorder.wait_recording_started
+
+        Args:
+            timeout: The longest time to wait, in seconds.
+
+        Returns:
+            The files being recorded to, None if the application doesn't report its state.
+        """
+        return self.client.wait_recording_started(timeout=timeout)
+
+    def stop_record(self, wait_finalized: bool = False) -> Optional[RecordingFiles]:
+        """
+        Stop a recording session, blocking, after the markers in flight. See SpikeRecorder.stop_record
+
+        Args:
+            wait_finalized: Wait until the application reports both files are flushed and closed.
+
+        Returns:
+            The finished recording's files, if the application says.
+        """
+        self.wait_idle()
+        return self.client.stop_record(wait_finalized=wait_finalized)
+
+    def shutdown(self, block: bool = False):
+        """
+        Close the SpikeRecorder GUI application completely. See SpikeRecorder.shutdown
+
+        Args:
+            block: Whether to wait for a reply from the server.
+
+        Returns:
+            None
+        """
+        self.wait_idle()
+        self.client.shutdown(block=block)
+
+    def push_event_marker(self, marker: str) -> int:
+        """
+        Push an event marker into the recording without waiting for the reply, which comes as the
+        replied or failed signal. See SpikeRecorder.push_event_marker
+
+        Args:
+            marker: An arbitrary string label to identify this marker.
+
+        Returns:
+            The request ID the reply will carry.
+        """
+        client_timestamp = time.perf_counter_ns()
+        command = CommandMsg(type=CommandType.PUSH_EVENT_MARKER,
+                             args={'name': marker, 'client_timestamp': client_timestamp})
+
+        # Sent now, the marker would overtake the ones waiting to be replayed.
+        if self.client.outbox_size > 0 and (self._held or self.client.outbox):
+            request_id = next(self._request_ids)
+            self._hold([command.args])
+            error = SpikeRecorderUnavailable("Event marker waiting in outbox behind undelivered markers.")
+            QtCore.QTimer.singleShot(0, lambda: self._emit_failed(request_id, command, error))
+            return request_id
+
+        return self.send(command)
+
+    def send(self, command: CommandMsg) -> int:
+        """
+        Send any command without waiting for the reply, which comes as the replied or failed signal.
+
+        Args:
+            command: The command to send.
+
+        Returns:
+            The request ID the reply will carry.
+        """
+        if self.socket is None:
+            raise ValueError("SpikeRecorder server connection not setup!")
+
+        request_id = next(self._request_ids)
+        log_sent(logger, command)
+        self.client.record_sent(command.type)
+        self._pending[request_id] = (command, time.perf_counter_ns())
+
+        try:
+            self.socket.send_multipart([str(request_id).encode(), b'', self.client.codec.encode(command)],
+                                       flags=zmq.NOBLOCK)
+        except zmq.error.ZMQError as ex:
+            self._fail(request_id, SpikeRecorderUnavailable(str(ex)), deferred=True)
+            return request_id
+
+        if not self._timeout_timer.isActive():
+            self._timeout_timer.start()
+
+        # The socket's FD is edge triggered and sending can consume the edge of a reply that is
+        # already waiting, so check for one once control is back in the event loop.
+        QtCore.QTimer.singleShot(0, self._on_readable)
+
+        return request_id
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """
+        Block until every command in flight has its reply, or has timed out. Signals are emitted
+        as usual.
+
+        Args:
+            timeout: The longest time to wait, in seconds, defaults to the reply timeout.
+
+        Returns:
+            True if nothing is left in flight.
+        """
+        if timeout is None:
+            timeout = self.timeout_ms / 1000.0
+
+        deadline = time.monotonic() + timeout
+        while self._pending and self.socket is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.socket.poll(int(remaining * 1000) + 1):
+                self._on_readable()
+
+        self._expire()
+        self._release_held(block=True)
+        return not self._pending
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Round trip statistics for each command type, blocking and not. See SpikeRecorder.stats
+
+        Returns:
+            A dictionary from command type name to its statistics.
+        """
+        return self.client.stats()
+
+    def reset_stats(self):
+        """
+        Clear the round trip statistics. See SpikeRecorder.reset_stats
+
+        Returns:
+            None
+        """
+        self.client.reset_stats()
+
+    def _on_readable(self):
+        """
+        Handle every reply that has arrived.
+        """
+        while self.socket is not None and self.socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            frames = self.socket.recv_multipart(zmq.NOBLOCK)
+
+            # Replies come back as [request_id, empty delimiter, message]
+            if len(frames) != 3:
+                logger.warning(f"Dropping malformed reply from SpikeRecorder: {frames}")
+                continue
+
+            try:
+                request_id = int(frames[0])
+            except ValueError:
+                logger.warning(f"Dropping reply with bad request ID from SpikeRecorder: {frames}")
+                continue
+
+            # Replies to requests that already timed out are dropped.
+            entry = self._pending.pop(request_id, None)
+            if entry is None:
+                continue
+
+            command, start = entry
+            try:
+                reply = wire.decode(frames[2])
+            except Exception as ex:
+                self._emit_failed(request_id, command, ex)
+                continue
+
+            latency_ns = time.perf_counter_ns() - start
+            self.client.record_reply(command.type, latency_ns, error=reply.type == CommandType.REPLY_ERROR)
+            log_received(logger, command, reply, latency_ns)
+
+            if reply.type == CommandType.REPLY_ERROR:
+                self._emit_failed(request_id, command, Exception(f"Spike-Recorder Application Command Error: \n{reply}"))
+            else:
+                if command.type == CommandType.PUSH_EVENT_MARKER:
+                    self.client.record_markers([command.args], reply)
+                self.replied.emit(request_id, reply)
+
+        if not self._pending:
+            self._timeout_timer.stop()
+
+    def _expire(self):
+        """
+        If any command has waited longer than the timeout, fail every command in flight and start
+        over with a new socket. The old one would still send what it holds when the recorder comes
+        back, and replies to what it did send can't reach the new one.
+        """
+        now = time.perf_counter_ns()
+        timeout_ns = self.timeout_ms * 1000000
+        if any(now - start > timeout_ns for command, start in self._pending.values()):
+            # In the order they were sent, so the markers go in the outbox in that order.
+            for request_id in list(self._pending):
+                self._fail(request_id, SpikeRecorderUnavailable())
+            if self.socket is not None:
+                self._open_socket()
+
+        if not self._pending:
+            self._timeout_timer.stop()
+
+    def _hold(self, markers: List[Dict]):
+        """
+        Put markers in the client's outbox, behind any on their way there already.
+        """
+        self._held.extend(markers)
+        self._release_held()
+
+    def _release_held(self, block: bool = False):
+        """
+        Move held markers to the client's outbox. The heartbeat holds the client's lock while it
+        replays, so unless block is set, try again later rather than stall the event loop.
+        """
+        if not self._held:
+            return
+
+        with self.client.try_lock(blocking=block) as locked:
+            if not locked:
+                QtCore.QTimer.singleShot(10, self._release_held)
+                return
+
+            self.client.queue_unsent(list(self._held))
+            self._held.clear()
+
+    def _fail(self, request_id: int, error: Exception, deferred: bool = False):
+        """
+        Fail a command in flight, putting it in the outbox if it is a marker that may be replayed.
+
+        Args:
+            request_id: The command's request ID.
+            error: Why it failed.
+            deferred: Emit failed from the event loop rather than right away.
+        """
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+
+        command = entry[0]
+        if isinstance(error, SpikeRecorderUnavailable):
+            self.client.record_timeout(command.type)
+            logger.error("Warning: Failed to communicate with Spike-Recorder application. No spike recording is occurring.")
+
+            # Keep undelivered markers for the heartbeat to replay.
+            if command.type == CommandType.PUSH_EVENT_MARKER and self.client.outbox_size > 0:
+                self._hold([command.args])
+
+        if deferred:
+            # Like any other reply, from the event loop, not from inside send.
+            QtCore.QTimer.singleShot(0, lambda: self._emit_failed(request_id, command, error))
+        else:
+            self._emit_failed(request_id, command, error)
+
+    def _emit_failed(self, request_id: int, command: CommandMsg, error: Exception):
+        logger.error(f"SpikeRecorder command {command.type.value} failed: {error!r}")
+        self.failed.emit(request_id, error)
@@ -0,0 +1,602 @@
+"""
+Read back the recordings the SpikeRecorder writes, a WAV file of the samples and a -events.txt file
+of the markers pushed while recording, once they're finished with Recording, or while they're
+still being written with RecordingTail.
+
+The samples are memory mapped, not read, so opening a recording takes the same few milliseconds
+however long it is and slicing it only touches the pages that are used:
+
+    >>> recording = Recording("participant-07.wav")
+    >>> recording.markers["Trial 1: Stop"]
+    array([123456])
+    >>> recording.channel(0, start=123456 - 5000, stop=123456 + 5000)
+"""
+import os
+import re
+import struct
+import threading
+import time
+
+import attr
+import numpy as np
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Data chunk sizes that mean the writer hasn't filled the real size in yet.
+_PLACEHOLDER_SIZES = (0, 0xFFFFFFFF)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class WavInfo:
+    """
+    What is needed to map a WAV file's samples.
+
+    Args:
+        sample_rate: Samples per second, per channel.
+        num_channels: The number of channels.
+        dtype: The NumPy type of a sample.
+        data_offset: Where the samples start in the file, in bytes.
+        data_size: The size of the samples according to the header, in bytes. Not to be trusted
+            for a recording still being written, or cut short by a crash.
+    """
+    sample_rate: int
+    num_channels: int
+    dtype: np.dtype
+    data_offset: int
+    data_size: int
+
+    @property
+    def frame_size(self) -> int:
+        """
+        Bytes per sample of all channels.
+        """
+        return self.num_channels * self.dtype.itemsize
+
+
+def _sample_dtype(format_tag: int, bits: int) -> np.dtype:
+    if format_tag == WAVE_FORMAT_PCM and bits == 8:
+        return np.dtype('u1')
+    if format_tag == WAVE_FORMAT_PCM and bits in (16, 32):
+        return np.dtype(f'<i{bits // 8}')
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        return np.dtype(f'<f{bits // 8}')
+    raise ValueError(f"Can't memory map WAV samples of format {format_tag:#x} with {bits} bits.")
+
+
+def read_wav_info(wav_path: str) -> WavInfo:
+    """
+    Read a WAV file's header.
+
+    Args:
+        wav_path: The WAV file.
+
+    Returns:
+        The header's contents.
+    """
+    with open(wav_path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12:
+            raise ValueError(f"{wav_path} has no header yet.")
+        riff, _, wave_id = struct.unpack('<4sI4s', header)
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{wav_path} is not a WAV file.")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{wav_path} has no data chunk.")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                if len(body) < 16:
+                    raise ValueError(f"{wav_path} has an incomplete fmt chunk.")
+                format_tag, num_channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack('<H', body[24:26])[0]
+                fmt = (format_tag, num_channels, sample_rate, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{wav_path} has its data chunk before its fmt chunk.")
+                format_tag, num_channels, sample_rate, bits = fmt
+                return WavInfo(sample_rate=sample_rate, num_channels=num_channels,
+                               dtype=_sample_dtype(format_tag, bits), data_offset=f.tell(), data_size=chunk_size)
+            else:
+                # Chunks are word aligned
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def available_samples(wav_path: str, info: WavInfo) -> int:
+    """
+    The number of whole samples, per channel, in a WAV file. The header's size is used unless the
+    file is shorter, or the header hasn't been finalized, in which case it comes from the file's
+    size.
+
+    Args:
+        wav_path: The WAV file.
+        info: Its header.
+
+    Returns:
+        The number of samples.
+    """
+    on_disk = max(os.path.getsize(wav_path) - info.data_offset, 0)
+    size = on_disk if info.data_size in _PLACEHOLDER_SIZES else min(info.data_size, on_disk)
+    return size // info.frame_size
+
+
+_HEADER_LINE = re.compile(r'^\s*(#|$)')
+
+
+def parse_events(lines) -> Tuple[List[str], List[float]]:
+    """
+    Parse the lines of an events file, "label,\\ttime in seconds" each, skipping comments.
+
+    Args:
+        lines: The lines.
+
+    Returns:
+        The labels and times, in the order of the file.
+    """
+    labels = []
+    times = []
+    for line in lines:
+        if _HEADER_LINE.match(line):
+            continue
+        label, sep, time_text = line.rstrip('\r\n').rpartition(',')
+        try:
+            time_s = float(time_text)
+        except ValueError:
+            sep = ''
+        if not sep:
+            logger.warning(f"Skipping malformed events file line: {line!r}")
+            continue
+        labels.append(label)
+        times.append(time_s)
+    return labels, times
+
+
+class Markers:
+    """
+    The markers of a recording as a table, in time order, with an index from label to where the
+    label occurs.
+
+        >>> markers["Trial 3: Stop"]
+        array([183500])
+        >>> markers.match(r"Trial \\d+: Stop").sample_indices
+
+    Args:
+        labels: Each marker's label.
+        times: Each marker's time, in seconds from the start of the recording.
+        sample_rate: The recording's sample rate, to turn times into sample indices.
+    """
+
+    def __init__(self, labels: Sequence[str], times: Sequence[float], sample_rate: int):
+        times = np.asarray(times, dtype=np.float64)
+        order = np.argsort(times, kind='stable')
+
+        self.labels = np.asarray(labels, dtype=object)[order] if len(labels) else np.zeros(0, dtype=object)
+        self.times = times[order]
+        self.sample_rate = sample_rate
+        self.sample_indices = np.round(self.times * sample_rate).astype(np.int64)
+        self._index: Optional[Dict[str, np.ndarray]] = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        return zip(self.labels, self.sample_indices)
+
+    def __getitem__(self, label: str) -> np.ndarray:
+        """
+        The sample indices of every marker with this label, empty if there are none.
+        """
+        return self.index.get(label, np.zeros(0, dtype=np.int64))
+
+    def __repr__(self):
+        return f"Markers({len(self)} markers, {len(self.index)} labels)"
+
+    @property
+    def index(self) -> Dict[str, np.ndarray]:
+        """
+        A dictionary from each label to the sample indices it occurs at, built on first use.
+        """
+        if self._index is None:
+            positions: Dict[str, List[int]] = {}
+            for i, label in enumerate(self.labels):
+                positions.setdefault(label, []).append(i)
+            self._index = {label: self.sample_indices[p] for label, p in positions.items()}
+        return self._index
+
+    def select(self, mask: np.ndarray) -> 'Markers':
+        """
+        The markers where mask is True, or at the given positions.
+
+        Args:
+            mask: A boolean mask, or integer positions, into the table.
+
+        Returns:
+            The selected markers.
+        """
+        return Markers(self.labels[mask], self.times[mask], self.sample_rate)
+
+    def match(self, pattern: Union[str, 're.Pattern']) -> 'Markers':
+        """
+        The markers whose label matches a regular expression, anywhere in the label, see re.search
+
+        Args:
+            pattern: The regular expression.
+
+        Returns:
+            The matching markers.
+        """
+        regex = re.compile(pattern)
+        return self.select(np.array([regex.search(label) is not None for label in self.labels], dtype=bool))
+
+
+def read_events(events_path: str, sample_rate: int) -> Markers:
+    """
+    Read an events file.
+
+    Args:
+        events_path: The -events.txt file.
+        sample_rate: The recording's sample rate.
+
+    Returns:
+        The markers.
+    """
+    with open(events_path, 'r', errors='replace') as f:
+        labels, times = parse_events(f)
+    return Markers(labels, times, sample_rate)
+
+
+def events_path_for(wav_path: str) -> str:
+    """
+    Where the SpikeRecorder puts the events file of a WAV file.
+    """
+    return os.path.splitext(wav_path)[0] + "-events.txt"
+
+
+class Recording:
+    """
+    A SpikeRecorder recording, opened for reading. The samples are memory mapped and every way of
+    getting at them returns a view, nothing is read until it is used, so a recording of any length
+    opens in milliseconds and in constant memory.
+
+    Recordings that weren't finalized, still being written or cut short by a crash, open with the
+    samples actually on disk, see available_samples. See RecordingTail to follow one as it grows.
+
+        >>> with Recording("participant-07.wav") as recording:
+        ...     stop = recording.markers["Trial 1: Stop"][0]
+        ...     window = recording.seconds(stop / recording.sample_rate - 1.0, stop / recording.sample_rate)
+
+    Args:
+        wav_path: The WAV file.
+        events_path: The events file, defaults to the one next to the WAV. If it doesn't exist the
+            recording has no markers.
+    """
+
+    def __init__(self, wav_path: str, events_path: str = None):
+        self.wav_path = wav_path
+        self.events_path = events_path if events_path is not None else events_path_for(wav_path)
+
+        self.info = read_wav_info(wav_path)
+        self.num_samples = available_samples(wav_path, self.info)
+
+        if self.num_samples > 0:
+            self._samples = np.memmap(wav_path, dtype=self.info.dtype, mode='r', offset=self.info.data_offset,
+                                      shape=(self.num_samples, self.num_channels))
+        else:
+            self._samples = np.zeros((0, self.num_channels), dtype=self.info.dtype)
+
+        self._markers: Optional[Markers] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.num_samples
+
+    def __repr__(self):
+        return (f"Recording({self.wav_path!r}, {self.num_channels} channels, {self.sample_rate} Hz, "
+                f"{self.duration:.1f} s)")
+
+    @property
+    def sample_rate(self) -> int:
+        return self.info.sample_rate
+
+    @property
+    def num_channels(self) -> int:
+        return self.info.num_channels
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.info.dtype
+
+    @property
+    def duration(self) -> float:
+        """
+        The recording's length, in seconds.
+        """
+        return self.num_samples / self.sample_rate
+
+    @property
+    def samples(self) -> np.ndarray:
+        """
+        Every sample, an array of shape (num_samples, num_channels) mapped onto the file.
+        """
+        if self._samples is None:
+            raise ValueError("Recording is closed.")
+        return self._samples
+
+    @property
+    def markers(self) -> Markers:
+        """
+        The recording's markers, read from the events file on first use.
+        """
+        if self._markers is None:
+            if os.path.exists(self.events_path):
+                self._markers = read_events(self.events_path, self.sample_rate)
+            else:
+                self._markers = Markers([], [], self.sample_rate)
+        return self._markers
+
+    def to_samples(self, seconds: Union[float, np.ndarray]) -> Union[int, np.ndarray]:
+        """
+        Convert times, in seconds, to sample indices.
+        """
+        if np.ndim(seconds) == 0:
+            return int(round(seconds * self.sample_rate))
+        return np.round(np.asarray(seconds) * self.sample_rate).astype(np.int64)
+
+    def to_seconds(self, samples: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        """
+        Convert sample indices to times, in seconds.
+        """
+        return np.asarray(samples) / self.sample_rate if np.ndim(samples) else samples / self.sample_rate
+
+    def channel(self, channel: int, start: int = None, stop: int = None) -> np.ndarray:
+        """
+        A view of one channel's samples.
+
+        Args:
+            channel: The channel.
+            start: The first sample, defaults to the start of the recording.
+            stop: One past the last sample, defaults to the end of the recording.
+
+        Returns:
+            A one dimensional, strided, view.
+        """
+        return self.samples[start:stop, channel]
+
+    def seconds(self, start: float = None, stop: float = None, channel: int = None) -> np.ndarray:
+        """
+        A view of the samples between two times.
+
+        Args:
+            start: The start, in seconds, defaults to the start of the recording.
+            stop: The end, in seconds, defaults to the end of the recording.
+            channel: Only this channel, defaults to all of them.
+
+        Returns:
+            A view of shape (num_samples, num_channels), or (num_samples,) for one channel.
+        """
+        first = None if start is None else max(self.to_samples(start), 0)
+        last = None if stop is None else max(self.to_samples(stop), 0)
+        if channel is None:
+            return self.samples[first:last]
+        return self.samples[first:last, channel]
+
+    def epochs(self, events=None, before: float = 1.0, after: float = 1.0, **kwargs) -> 'Epochs':
+        """
+        Cut a window around each marker, see spike_recorder.epochs.extract_epochs
+
+        Args:
+            events: A regular expression for the labels of the markers to lock to, or Markers. None
+                is every marker.
+            before: How long each window starts before its marker, in seconds.
+            after: How long each window ends after its marker, in seconds.
+            **kwargs: Passed on to extract_epochs.
+
+        Returns:
+            The epochs, of shape (trials, channels, samples).
+        """
+        from spike_recorder.epochs import extract_epochs
+        return extract_epochs(self, events, before=before, after=after, **kwargs)
+
+    def close(self):
+        """
+        Unmap the samples. Views taken before closing keep the mapping alive until they are gone.
+
+        Returns:
+            None
+        """
+        self._samples = None
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class TailBlock:
+    """
+    What was added to a recording between two polls of a RecordingTail.
+
+    Args:
+        start: The index of the first sample in samples.
+        samples: The new samples, of shape (num_samples, num_channels), possibly none.
+        markers: The new markers, possibly none. A marker can arrive before the samples it points at.
+    """
+    start: int
+    samples: np.ndarray
+    markers: Markers
+
+    @property
+    def stop(self) -> int:
+        """
+        One past the index of the last sample in samples.
+        """
+        return self.start + len(self.samples)
+
+
+class RecordingTail:
+    """
+    Follow a recording while it is being written, like tail -f, for monitoring and quality checks
+    during a session. Each poll returns the samples and markers added since the last one.
+
+    The header of a recording in progress can't be trusted, the SpikeRecorder only writes the sizes
+    when it finishes, so the amount of data comes from the file's size, in whole samples. Files
+    that don't exist yet, or don't have a complete header yet, are waited for.
+
+        >>> tail = RecordingTail("participant-07.wav")
+        >>> for block in tail.follow(idle_timeout=5.0):
+        ...     check(block.samples, block.markers)
+
+    Args:
+        wav_path: The WAV file.
+        events_path: The events file, defaults to the one next to the WAV.
+        poll_interval: How long follow waits between polls that found nothing new, in seconds. New
+            data is seen at most this long after it lands.
+        max_block: The most samples a poll returns, the rest are left for the next one, to bound
+            memory when starting behind. None is no limit.
+        start: The sample to start from, defaults to the start of the recording.
+    """
+
+    def __init__(self, wav_path: str, events_path: str = None, poll_interval: float = 0.05,
+                 max_block: int = None, start: int = 0):
+        self.wav_path = wav_path
+        self.events_path = events_path if events_path is not None else events_path_for(wav_path)
+        self.poll_interval = poll_interval
+        self.max_block = max_block
+
+        self.info: Optional[WavInfo] = None
+        self.position = start
+        self.markers_seen = 0
+
+        self._wav = None
+        self._events = None
+        self._partial = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self) -> Iterator[TailBlock]:
+        return self.follow()
+
+    @property
+    def sample_rate(self) -> Optional[int]:
+        """
+        The recording's sample rate, None until its header has been written.
+        """
+        return self.info.sample_rate if self.info is not None else None
+
+    def _open_wav(self) -> bool:
+        if self.info is None:
+            try:
+                self.info = read_wav_info(self.wav_path)
+            except (OSError, ValueError):
+                return False
+            self._wav = open(self.wav_path, 'rb')
+        return True
+
+    def _read_samples(self) -> np.ndarray:
+        # Read the header's size again each time, it is filled in when the recording is finalized,
+        # and anything after it, a LIST chunk for example, isn't samples.
+        self._wav.seek(self.info.data_offset - 4)
+        data_size, = struct.unpack('<I', self._wav.read(4))
+        on_disk = max(os.fstat(self._wav.fileno()).st_size - self.info.data_offset, 0)
+        size = on_disk if data_size in _PLACEHOLDER_SIZES else min(data_size, on_disk)
+
+        count = max(size // self.info.frame_size - self.position, 0)
+        if self.max_block is not None:
+            count = min(count, self.max_block)
+
+        self._wav.seek(self.info.data_offset + self.position * self.info.frame_size)
+        data = self._wav.read(count * self.info.frame_size)
+        count = len(data) // self.info.frame_size
+        return np.frombuffer(data[:count * self.info.frame_size], dtype=self.info.dtype).reshape(count, self.info.num_channels)
+
+    def _read_markers(self) -> Markers:
+        if self._events is None:
+            try:
+                self._events = open(self.events_path, 'rb')
+            except OSError:
+                return Markers([], [], self.sample_rate)
+
+        # Only whole lines, the rest of a line being written is kept for the next poll.
+        lines = (self._partial + self._events.read()).split(b'\n')
+        self._partial = lines.pop()
+        labels, times = parse_events(line.decode(errors='replace') for line in lines)
+        self.markers_seen = self.markers_seen + len(labels)
+        return Markers(labels, times, self.sample_rate)
+
+    def poll(self) -> Optional[TailBlock]:
+        """
+        Read what has been added since the last poll, without waiting.
+
+        Returns:
+            The new samples and markers, None if there are neither.
+        """
+        if not self._open_wav():
+            return None
+
+        start = self.position
+        samples = self._read_samples()
+        markers = self._read_markers()
+        self.position = self.position + len(samples)
+
+        if len(samples) == 0 and len(markers) == 0:
+            return None
+        return TailBlock(start=start, samples=samples, markers=markers)
+
+    def follow(self, idle_timeout: float = None, stop_event: threading.Event = None) -> Iterator[TailBlock]:
+        """
+        Poll until told to stop, yielding each block of new data as it lands.
+
+        Args:
+            idle_timeout: Stop after this many seconds without new data, for example once the
+                recording has stopped. None keeps going.
+            stop_event: Stop once this is set, checked at least every poll_interval.
+
+        Returns:
+            An iterator of blocks.
+        """
+        last_data = time.monotonic()
+        while stop_event is None or not stop_event.is_set():
+            block = self.poll()
+            if block is not None:
+                last_data = time.monotonic()
+                yield block
+                continue
+
+            if idle_timeout is not None and time.monotonic() - last_data >= idle_timeout:
+                return
+
+            if stop_event is not None:
+                stop_event.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+
+    def close(self):
+        """
+        Close the files.
+
+        Returns:
+            None
+        """
+        for f in (self._wav, self._events):
+            if f is not None:
+                f.close()
+        self._wav = None
+        self._events = None
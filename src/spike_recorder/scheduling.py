@@ -0,0 +1,236 @@
+"""
+Keep the recorder and the experiment out of each other's way, and out of the way of everything else
+on the machine, by pinning them to separate CPUs and setting their niceness. The jitter probe shows
+whether it helps: it measures how late timer wakeups are, which is what the experiments' clock
+rendering and marker timing depend on.
+
+    spike-recorder-jitter --duration 10
+    spike-recorder-jitter --duration 10 --cpus 2,3 --nice -5
+
+CPU affinity is only available on Linux, elsewhere it is ignored with a warning. Lowering niceness
+below 0 needs privileges, CAP_SYS_NICE or root, without them it is also ignored with a warning.
+"""
+import os
+import time
+
+from typing import Callable, List, Optional, Sequence
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.stats import LatencyHistogram
+
+
+def parse_cpus(spec: str) -> List[int]:
+    """
+    Parse a CPU list, in the format taskset and /sys use, e.g. "0-1,4".
+
+    Args:
+        spec: The CPU list.
+
+    Returns:
+        The CPU numbers, sorted.
+    """
+    cpus = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+
+    if not cpus:
+        raise ValueError(f"Empty CPU list: '{spec}'")
+    return sorted(cpus)
+
+
+def _threads(pid: int) -> List[int]:
+    """
+    The thread IDs of a process. On Linux affinity and niceness belong to threads, not processes.
+    """
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid or os.getpid()}/task")]
+    except OSError:
+        return [pid]
+
+
+def set_scheduling(cpus: Optional[Sequence[int]] = None, nice: Optional[int] = None, pid: int = 0):
+    """
+    Pin a process to a set of CPUs and set its niceness. Threads it starts afterwards inherit both.
+
+    Args:
+        cpus: The CPUs the process may run on, None leaves its affinity alone.
+        nice: The niceness, from -20, the highest priority, to 19, the lowest. None leaves it alone.
+        pid: The process, 0 for this one.
+
+    Returns:
+        None
+    """
+    threads = _threads(pid) if cpus is not None or nice is not None else []
+
+    if cpus is not None:
+        if not hasattr(os, 'sched_setaffinity'):
+            logger.warning("CPU affinity isn't supported on this platform, ignoring it.")
+        else:
+            for tid in threads:
+                try:
+                    os.sched_setaffinity(tid, cpus)
+                except ProcessLookupError:
+                    pass
+                except OSError as ex:
+                    logger.warning(f"Couldn't pin process {pid or os.getpid()} to CPUs {list(cpus)}: {ex}")
+                    break
+
+    if nice is not None:
+        if not hasattr(os, 'setpriority'):
+            logger.warning("Setting niceness isn't supported on this platform, ignoring it.")
+        else:
+            for tid in threads:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, tid, nice)
+                except ProcessLookupError:
+                    pass
+                except OSError as ex:
+                    logger.warning(f"Couldn't set niceness of process {pid or os.getpid()} to {nice}: {ex}")
+                    break
+
+
+def run_with_scheduling(target: Callable, cpus: Optional[Sequence[int]] = None, nice: Optional[int] = None,
+                        **kwargs):
+    """
+    A process target that sets the process's scheduling, see set_scheduling, before it calls target.
+    Setting it from inside the process covers every thread the process starts.
+
+    Args:
+        target: The function to run.
+        cpus: The CPUs to run on.
+        nice: The niceness.
+        **kwargs: Passed on to target.
+
+    Returns:
+        What target returns.
+    """
+    set_scheduling(cpus=cpus, nice=nice)
+    return target(**kwargs)
+
+
+def add_scheduling_args(parser, ui: bool = True):
+    """
+    Add the CPU affinity and niceness options of the recorder, and optionally the experiment's UI,
+    to a command line.
+
+    Args:
+        parser: The argparse.ArgumentParser to add the options to.
+        ui: Whether to add the options for the experiment's UI process as well.
+
+    Returns:
+        None
+    """
+    parser.add_argument('--recorder-cpus', type=parse_cpus, default=None,
+                        help='CPUs to pin the SpikeRecorder to, e.g. 2-3. Default is any.')
+    parser.add_argument('--recorder-nice', type=int, default=None,
+                        help='Niceness of the SpikeRecorder, -20 to 19. Below 0 needs privileges.')
+    if ui:
+        parser.add_argument('--ui-cpus', type=parse_cpus, default=None,
+                            help='CPUs to pin the experiment to, e.g. 0-1. Default is any. A recorder launched '
+                                 'without --recorder-cpus runs on these too.')
+        parser.add_argument('--ui-nice', type=int, default=None,
+                            help='Niceness of the experiment, -20 to 19. Below 0 needs privileges.')
+
+
+def measure_jitter(duration: float = 5.0, interval: float = 0.001, qt: bool = False) -> LatencyHistogram:
+    """
+    Measure how late timer wakeups are. A timer is set to fire every interval and each wakeup's
+    lateness, from when it was due, is recorded. Wakeups are scheduled on a fixed grid, so one late
+    wakeup doesn't push the rest back.
+
+    Args:
+        duration: How long to measure for, in seconds.
+        interval: The timer period, in seconds.
+        qt: Use a Qt precise timer in an event loop, like the experiments' clock, rather than sleeps.
+            Needs a QCoreApplication, one is created if there isn't one.
+
+    Returns:
+        The histogram of lateness, in nanoseconds.
+    """
+    lateness = LatencyHistogram()
+    interval_ns = int(interval * 1e9)
+    count = int(duration / interval)
+
+    if qt:
+        _measure_qt(lateness, interval_ns, count)
+        return lateness
+
+    due = time.perf_counter_ns() + interval_ns
+    for i in range(count):
+        delay = due - time.perf_counter_ns()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+        lateness.record(time.perf_counter_ns() - due)
+        due = due + interval_ns
+
+    return lateness
+
+
+def _measure_qt(lateness: LatencyHistogram, interval_ns: int, count: int):
+    from PyQt5 import QtCore
+
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        app = QtCore.QCoreApplication([])
+
+    loop = QtCore.QEventLoop()
+    timer = QtCore.QTimer()
+    timer.setTimerType(QtCore.Qt.PreciseTimer)
+    state = {'due': 0, 'left': count}
+
+    def schedule():
+        timer.start(max(int((state['due'] - time.perf_counter_ns()) // 1000000), 0))
+
+    def fire():
+        lateness.record(time.perf_counter_ns() - state['due'])
+        state['left'] = state['left'] - 1
+        if state['left'] <= 0:
+            loop.quit()
+            return
+        state['due'] = state['due'] + interval_ns
+        schedule()
+
+    timer.setSingleShot(True)
+    timer.timeout.connect(fire)
+    state['due'] = time.perf_counter_ns() + interval_ns
+    schedule()
+    loop.exec_()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure timer wakeup lateness, optionally pinned to CPUs "
+                                                 "and with a niceness, to check the isolation of a rig.")
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds to measure for. Default is 5.')
+    parser.add_argument('--interval-ms', type=float, default=1.0, help='Timer period in milliseconds. Default is 1.')
+    parser.add_argument('--cpus', type=parse_cpus, default=None, help='CPUs to pin the probe to, e.g. 2-3.')
+    parser.add_argument('--nice', type=int, default=None, help='Niceness of the probe, -20 to 19.')
+    parser.add_argument('--qt', action='store_true', help='Use a Qt timer and event loop, like the experiments.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    set_scheduling(cpus=args.cpus, nice=args.nice)
+
+    lateness = measure_jitter(duration=args.duration, interval=args.interval_ms / 1000.0, qt=args.qt)
+
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else "any"
+    nice = os.getpriority(os.PRIO_PROCESS, 0) if hasattr(os, 'getpriority') else "n/a"
+    logger.info(f"{'qt' if args.qt else 'sleep'} timer, {args.interval_ms} ms period, {lateness.count} wakeups, "
+                f"cpus {cpus}, nice {nice}")
+    logger.info(f"{'lateness':<10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'p99.9 ms':>10}{'max ms':>10}")
+    logger.info(f"{'':<10}" + "".join(f"{lateness.percentile(q) / 1e6:>10.3f}" for q in (50, 90, 99, 99.9))
+                + f"{lateness.max_ns / 1e6:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
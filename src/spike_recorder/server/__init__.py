@@ -1,53 +1,229 @@
 # -*- coding: utf-8 -*-
+"""
+Launches the Backyard Brains SpikeRecorder application, which lives in the native _core module.
+
+_core is a large extension, it links SDL, OpenGL and BASS, so it is only imported when the
+application is actually run, in the launched process. Clients that talk to an already running
+recorder never load it.
+"""
 import os
 import sys
 import platform
 import multiprocessing
 
 from multiprocessing import Process, Queue
+from typing import Optional, Sequence, Union
 
-from ._core import __doc__, run
-from ._core import __file__ as module_file_path
+import logging
+logger = logging.getLogger(__name__)
 
+from spike_recorder.protocol import DEFAULT_PORT, ENDPOINT_ENV_VAR, TRANSPORTS, make_endpoint, bind_endpoint
+from spike_recorder.server.native_log import NativeLog
 
-# Fix for MacOS High Sierra, see:
-# https://stackoverflow.com/questions/30669659/multiproccesing-and-error-the-process-has-forked-and-you-cannot-use-this-corefou
-if platform.system() == "Darwin":
-    multiprocessing.set_start_method('spawn', force=True)
 
+def default_start_method() -> Optional[str]:
+    """
+    The multiprocessing start method recorder processes use unless told otherwise. On MacOS that is
+    spawn, forking a process that has loaded CoreFoundation isn't safe, see:
+    https://stackoverflow.com/questions/30669659/multiproccesing-and-error-the-process-has-forked-and-you-cannot-use-this-corefou
+    Everywhere else it is the platform default. Only recorder processes are affected, the global
+    start method is left alone.
 
-def _run_wrapper():
+    Returns:
+        The start method name, or None for the platform default.
     """
-    A simple wrapper that changes directory before launching the SpikeRecorder pybind11 module. The module
-    needs to run from its location directory because it looks for files.
+    if platform.system() == "Darwin":
+        return "spawn"
+    return None
+
+
+def run_application(endpoint: str = None, log_file_path: str = None):
     """
+    Run the SpikeRecorder application in this process, the target of the processes launch starts.
+    It changes directory before running the pybind11 module, which needs to run from its location
+    directory because it looks for files.
+
+    Args:
+        endpoint: The endpoint the application should bind its command socket to, passed on through
+            the SPIKE_RECORDER_ENDPOINT environment variable. None leaves the application's default.
+        log_file_path: The file the application writes its log to, see native_log.NativeLog. Defaults
+            to byb.log next to the native module.
+    """
+    from ._core import run
+    from ._core import __file__ as module_file_path
+
+    if endpoint is not None:
+        os.environ[ENDPOINT_ENV_VAR] = bind_endpoint(endpoint)
+
+    if log_file_path is None:
+        log_file_path = os.path.join(os.path.dirname(module_file_path), 'byb.log')
+    log_file_path = os.path.abspath(log_file_path)
+
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    log_file_path = os.path.join(os.path.dirname(module_file_path), 'byb.log')
     run(log_file_path)
 
 
-def launch(is_async: bool = False) -> multiprocessing.Process:
+def prepare_log(log: Union['NativeLog', bool]) -> Optional['NativeLog']:
+    """
+    The session the application's log goes to, see launch's log argument, with its directory ready.
+    For processes running run_application that aren't started by launch.
+
+    Args:
+        log: True for a new session in the default log directory, a NativeLog, or False.
+
+    Returns:
+        The session, or None if the log is left in byb.log
+    """
+    if log is True:
+        log = NativeLog()
+    if not log:
+        return None
+
+    try:
+        log.prepare()
+    except OSError as ex:
+        logger.warning(f"Can't use log directory {log.log_dir}, leaving the SpikeRecorder log in byb.log: {ex}")
+        return None
+    return log
+
+
+def __getattr__(name):
+    """
+    The native module's run function is still available as spike_recorder.server.run, loaded on
+    first use.
+    """
+    if name == "run":
+        from ._core import run
+        return run
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def check_launch_endpoint(endpoint: Optional[str]):
+    """
+    Check the application can be launched for clients to reach on endpoint, see launch.
+
+    Args:
+        endpoint: The endpoint clients will connect to, None for the default.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If endpoint isn't tcp port 5555.
+    """
+    if endpoint is not None and not (endpoint.startswith("tcp://") and endpoint.endswith(f":{DEFAULT_PORT}")):
+        raise ValueError(f"The SpikeRecorder application only listens on tcp port {DEFAULT_PORT}, it can't be "
+                         f"launched on {endpoint}.")
+
+
+def launch(is_async: bool = False, endpoint: str = None, start_method: str = None,
+           cpus: Sequence[int] = None, nice: int = None,
+           log: Union['NativeLog', bool] = True) -> multiprocessing.Process:
     """
     Lauch the Backyard Brains Spike recorder application. This function launches a subprocess.
 
     Args:
         is_async: Should the this function run asynchronously. That is, should it return instantly or
             block until the application closes.
+        endpoint: The endpoint clients will connect to the application's command socket on. The
+            application always listens on tcp port 5555, whatever it is given, so anything else is
+            refused. Other transports and ports are only for the reference server, see
+            spike_recorder.server.reference
+        start_method: The multiprocessing start method, see default_start_method. To have a recorder
+            ready for each of several sessions, start it once and reuse it, see the experiments' kiosk mode.
+        cpus: The CPUs to pin the application to, see spike_recorder.scheduling. Default is any.
+        nice: The application's niceness. Default is to inherit ours.
+        log: Where the application's log goes, see native_log. True streams it into the
+            spike_recorder.native logger with a new session in the default log directory, or pass a
+            NativeLog to choose. False leaves it in byb.log next to the native module.
 
     Returns:
         The Process containing the SpikeRecorder application.
+
+    Raises:
+        ValueError: If endpoint isn't tcp port 5555.
     """
-    p = Process(target=_run_wrapper)
+    check_launch_endpoint(endpoint)
+
+    kwargs = {'endpoint': endpoint}
+
+    log = prepare_log(log)
+    if log:
+        kwargs['log_file_path'] = log.raw_path
+
+    context = multiprocessing.get_context(start_method or default_start_method())
+    if cpus is None and nice is None:
+        p = context.Process(target=run_application, kwargs=kwargs)
+    else:
+        from spike_recorder.scheduling import run_with_scheduling
+        p = context.Process(target=run_with_scheduling,
+                            kwargs={'target': run_application, 'cpus': cpus, 'nice': nice, **kwargs})
     p.start()
 
+    if log:
+        log.start(process=p)
+
     if not is_async:
         p.join()
+        if log:
+            log.stop()
 
     return p
 
 
+def add_endpoint_args(parser):
+    """
+    Add the command socket endpoint options shared by the spike-recorder, iowa and libet command lines.
+
+    Args:
+        parser: The argparse.ArgumentParser to add the options to.
+
+    Returns:
+        None
+    """
+    parser.add_argument('--endpoint', default=None,
+                        help='ZeroMQ endpoint of the SpikeRecorder command socket, e.g. tcp://localhost:5555 or '
+                             'ipc:///tmp/spike-recorder.ipc. Overrides --transport and --port.')
+    parser.add_argument('--transport', choices=TRANSPORTS, default="tcp",
+                        help='Transport for the SpikeRecorder command socket. ipc uses a Unix domain socket in '
+                             'the temp directory, which is faster for a recorder on the same machine. The '
+                             'SpikeRecorder application only supports tcp, ipc is for the reference server. '
+                             'Default is tcp.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'The tcp port of the SpikeRecorder command socket. The SpikeRecorder application '
+                             f'only supports the default. Default is {DEFAULT_PORT}.')
+
+
+def endpoint_from_args(args) -> str:
+    """
+    Get the command socket endpoint from options added with add_endpoint_args.
+
+    Returns:
+        The endpoint.
+    """
+    if args.endpoint is not None:
+        return args.endpoint
+    return make_endpoint(transport=args.transport, port=args.port)
+
+
 def main():
-    launch()
+    import argparse
+
+    from spike_recorder.scheduling import add_scheduling_args
+
+    parser = argparse.ArgumentParser()
+    add_endpoint_args(parser)
+    add_scheduling_args(parser, ui=False)
+    parser.add_argument('--log-dir', default=None,
+                        help='Where to keep the SpikeRecorder log of each session. Default is ~/.spike_recorder/logs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        launch(endpoint=endpoint_from_args(args), cpus=args.recorder_cpus, nice=args.recorder_nice,
+               log=NativeLog(log_dir=args.log_dir))
+    except ValueError as ex:
+        parser.error(str(ex))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+"""
+The native application's log, byb.log, brought into Python logging while the application runs.
+
+The application writes its log to a file it is given. Each session gets its own raw file, which a
+background thread in our process follows, like tail -f, and re-logs line by line under the
+spike_recorder.native logger. Native warnings, audio underruns for example, so show up next to our
+own logs as they happen. Each session also writes its own lines, and only those, to a per session
+file with rotation and a size cap. Once the raw file passes max_raw_bytes and has been read, it is
+truncated, and it is removed when the session ends, so logs no longer grow without bound.
+
+Following a file rather than handing the application a pipe means a slow or stalled reader can
+never block the application's writes. Truncating it is logrotate's copytruncate, a line written
+between the last read and the truncation is lost. The application doesn't open the file for
+appending, so it goes on writing at its old offset, the bytes before that read back as NULs, which
+are dropped, and take no space on disk.
+
+    >>> log = NativeLog(log_dir="logs")
+    >>> process = launch(is_async=True, log=log)
+
+The level of each line is guessed from its wording, lines mentioning fatal or error are logged as
+ERROR, warnings as WARNING and everything else as INFO.
+"""
+import glob
+import itertools
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+NATIVE_LOGGER = "spike_recorder.native"
+
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser("~"), ".spike_recorder", "logs")
+
+_ERROR = re.compile(r'\b(fatal|error|failed|exception)\b', re.IGNORECASE)
+_WARNING = re.compile(r'\b(warn|warning|underrun|overrun|xrun)\b', re.IGNORECASE)
+
+# Tells apart the sessions one process starts in the same second.
+_session_numbers = itertools.count()
+
+
+def native_level(line: str) -> int:
+    """
+    Guess the level of a native log line.
+
+    Args:
+        line: The line.
+
+    Returns:
+        The logging level.
+    """
+    if _ERROR.search(line):
+        return logging.ERROR
+    if _WARNING.search(line):
+        return logging.WARNING
+    return logging.INFO
+
+
+class NativeLog:
+    """
+    One session of the native application's log. Give raw_path to the application and call start
+    once it has been launched. See the module docstring.
+
+    Args:
+        log_dir: Where to put the session's files, defaults to ~/.spike_recorder/logs
+        session: The session's name, defaults to the date and time, our process ID and a count of
+            the sessions this process has started.
+        max_bytes: The size at which the session's log file is rotated.
+        backup_count: How many rotated files of the session to keep, so a session takes at most
+            (backup_count + 1) * max_bytes on disk.
+        max_raw_bytes: The size past which the raw file is truncated, once it has been read.
+        keep_sessions: How many sessions' logs to keep in log_dir, older ones are deleted on start.
+        poll_interval: How often to check the raw file for new lines, in seconds.
+    """
+
+    def __init__(self, log_dir: str = None, session: str = None, max_bytes: int = 10 * 2**20,
+                 backup_count: int = 3, max_raw_bytes: int = 2**20, keep_sessions: int = 20,
+                 poll_interval: float = 0.1):
+        if session is None:
+            session = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_session_numbers)}"
+
+        self.log_dir = os.path.abspath(log_dir if log_dir is not None else DEFAULT_LOG_DIR)
+        self.session = session
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_raw_bytes = max_raw_bytes
+        self.keep_sessions = keep_sessions
+        self.poll_interval = poll_interval
+
+        self.logger = logging.getLogger(NATIVE_LOGGER)
+        if self.logger.level == logging.NOTSET:
+            self.logger.setLevel(logging.INFO)
+
+        self.lines = 0
+        self._handler: Optional[logging.Handler] = None
+        self._thread = None
+        self._process = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def raw_path(self) -> str:
+        """
+        The file the application writes to.
+        """
+        return os.path.join(self.log_dir, f"byb-{self.session}.raw")
+
+    @property
+    def path(self) -> str:
+        """
+        The session's log file, with rotated files next to it as path.1, path.2, ...
+        """
+        return os.path.join(self.log_dir, f"byb-{self.session}.log")
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def prepare(self):
+        """
+        Create the log directory and delete the oldest sessions beyond keep_sessions. Called by start,
+        call it before the application is launched if it should find the directory there.
+
+        Returns:
+            None
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        sessions = sorted((path for path in glob.glob(os.path.join(self.log_dir, "byb-*.log")) if path != self.path),
+                          key=os.path.getmtime)
+        for old in sessions[:max(len(sessions) - self.keep_sessions + 1, 0)]:
+            base = old[:-len(".log")]
+            for filename in [old, base + ".raw"] + glob.glob(glob.escape(old) + ".*"):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+
+    def start(self, process=None):
+        """
+        Start following the raw file.
+
+        Args:
+            process: The application's process. Once it has exited, the rest of the file is read and
+                the session ends by itself.
+
+        Returns:
+            None
+        """
+        self.prepare()
+
+        self._handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                             backupCount=self.backup_count)
+        self._handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        # Every session logs to the same logger, the file only gets this one's lines.
+        self._handler.addFilter(lambda record: getattr(record, 'native_session', None) == self.session)
+        self.logger.addHandler(self._handler)
+
+        self._process = process
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._follow, daemon=True, name="NativeLog")
+        self._thread.start()
+
+    def stop(self):
+        """
+        Read what is left of the raw file, then close the session's log and remove the raw file.
+
+        Returns:
+            None
+        """
+        thread = self._thread
+        if thread is not None:
+            self._stop_event.set()
+            if thread is not threading.current_thread():
+                thread.join()
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            if self._handler is None:
+                return
+            self.logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+            try:
+                os.remove(self.raw_path)
+            except OSError:
+                pass
+
+    def _follow(self):
+        f = None
+        partial = ""
+        try:
+            while True:
+                stopping = self._stop_event.is_set() or (self._process is not None and not self._process.is_alive())
+
+                if f is None and os.path.exists(self.raw_path):
+                    f = open(self.raw_path, 'r', errors='replace')
+
+                if f is not None:
+                    # The application truncated or replaced the file, start over.
+                    try:
+                        if os.stat(self.raw_path).st_size < f.tell():
+                            f.seek(0)
+                    except OSError:
+                        pass
+
+                    data = f.read().replace('\0', '')
+                    if data:
+                        lines = (partial + data).split('\n')
+                        partial = lines.pop()
+                        for line in lines:
+                            self._emit(line)
+                        continue
+
+                    if f.tell() > self.max_raw_bytes:
+                        try:
+                            os.truncate(self.raw_path, 0)
+                            f.seek(0)
+                        except OSError:
+                            pass
+
+                if stopping:
+                    break
+
+                self._stop_event.wait(self.poll_interval)
+
+            if partial:
+                self._emit(partial)
+        except Exception:
+            logger.exception(f"Failed to follow the SpikeRecorder log {self.raw_path}")
+        finally:
+            if f is not None:
+                f.close()
+
+        if self._process is not None and not self._stop_event.is_set():
+            self._finish()
+
+    def _emit(self, line: str):
+        line = line.rstrip('\r')
+        if line.strip():
+            self.lines = self.lines + 1
+            self.logger.log(native_level(line), line, extra={'native_session': self.session})
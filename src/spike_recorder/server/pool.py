@@ -0,0 +1,260 @@
+"""
+A pool of reference server processes started ahead of time, for tests, CI and benchmarks that go
+through many recorders. The native application can't be pooled, see RecorderPool, sessions run
+back to back reuse one recorder instead, see the experiments' kiosk mode.
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import attr
+
+from typing import Callable, List, Sequence
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.protocol import DEFAULT_PORT, make_endpoint
+
+
+@attr.s(auto_attribs=True)
+class PooledRecorder:
+    """
+    A running recorder handed out by a RecorderPool.
+
+    Args:
+        endpoint: The recorder's command endpoint, connect a client to it.
+        process: The process the recorder runs in.
+        warmup_seconds: How long it took from starting the process to the recorder answering.
+    """
+    endpoint: str
+    process: multiprocessing.Process
+    warmup_seconds: float
+
+    def client(self, **client_args):
+        """
+        A connected client for this recorder.
+
+        Args:
+            **client_args: Passed on to SpikeRecorder.
+
+        Returns:
+            The connected SpikeRecorder.
+        """
+        from spike_recorder.client import SpikeRecorder
+
+        client = SpikeRecorder(endpoint=self.endpoint, **client_args)
+        client.connect()
+        return client
+
+    def shutdown(self, timeout: float = 10.0):
+        """
+        Shut the recorder down, terminating the process if it doesn't exit within timeout.
+
+        Args:
+            timeout: Seconds to wait for the process to exit.
+
+        Returns:
+            None
+        """
+        if self.process.is_alive():
+            client = self.client(timeout_ms=500)
+            try:
+                client.shutdown(block=True)
+            except Exception as ex:
+                logger.warning(f"Recorder at {self.endpoint} didn't acknowledge shutdown: {ex}")
+            finally:
+                client.close()
+
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class RecorderPool:
+    """
+    Keeps recorder processes started, initialised and answering commands, ready to be handed out.
+    Every time one is acquired a replacement starts warming up in the background.
+
+        >>> pool = RecorderPool(size=1)
+        >>> pool.start()
+        >>> ...
+        >>> recorder = pool.acquire()
+        >>> client = recorder.client()
+        >>> ...
+        >>> client.shutdown()
+        >>> pool.close()
+
+    Each recorder gets its own endpoint, tcp ports counting up from base_port, or ipc sockets in the
+    temp directory. The native application can't be pooled, it always listens on its default
+    endpoint and ignores the one it is given, so every recorder after the first would clash with it.
+    The pool runs the reference server, or a target that binds the endpoint it's called with. Passing
+    spike_recorder.server.run_application is refused, any other target that doesn't bind its
+    endpoint never answers there and is given up on after ready_timeout.
+
+    Args:
+        size: How many recorders to keep ready.
+        transport: "tcp" or "ipc", see protocol.make_endpoint
+        base_port: The first tcp port to use.
+        start_method: The multiprocessing start method. Defaults to forkserver where it is
+            available, except on MacOS, see spike_recorder.server.default_start_method. The fork
+            server imports the preload modules once, so each new recorder starts with them loaded.
+        target: The function run in each recorder process, called with an endpoint keyword, which
+            it must listen on. Defaults to spike_recorder.server.reference.run_server
+        preload: Modules for the fork server to import ahead of time. Defaults to the target's module.
+        ready_timeout: How long, in seconds, a recorder may take to start answering commands
+            before it is given up on.
+    """
+
+    def __init__(self, size: int = 1, transport: str = "tcp", base_port: int = DEFAULT_PORT + 100,
+                 start_method: str = None, target: Callable = None, preload: Sequence[str] = None,
+                 ready_timeout: float = 60.0):
+        from spike_recorder.server import run_application, default_start_method
+        from spike_recorder.server.reference import run_server
+
+        if size < 1:
+            raise ValueError("RecorderPool size must be at least 1.")
+        if target is run_application:
+            raise ValueError("RecorderPool can't run the native application, it ignores the endpoint it is given.")
+
+        if start_method is None:
+            start_method = default_start_method()
+        if start_method is None and "forkserver" in multiprocessing.get_all_start_methods():
+            start_method = "forkserver"
+
+        self.size = size
+        self.transport = transport
+        self.target = target if target is not None else run_server
+        self.ready_timeout = ready_timeout
+        self.context = multiprocessing.get_context(start_method)
+
+        if preload is None:
+            preload = [self.target.__module__]
+        if self.context.get_start_method() == "forkserver":
+            self.context.set_forkserver_preload(list(preload))
+
+        self._ports = itertools.count(base_port)
+        self._ready: "queue.Queue[PooledRecorder]" = queue.Queue()
+        self._warming: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def idle(self) -> int:
+        """
+        The number of recorders ready to be acquired.
+        """
+        return self._ready.qsize()
+
+    def start(self):
+        """
+        Start warming up the pool's recorders.
+
+        Returns:
+            None
+        """
+        for i in range(self.size):
+            self._warm()
+
+    def acquire(self, timeout: float = None) -> PooledRecorder:
+        """
+        Take a ready recorder out of the pool and start warming up its replacement. The recorder
+        belongs to the caller from now on, shut it down when done with it.
+
+        Args:
+            timeout: How long to wait, in seconds, if no recorder is ready yet. None waits forever.
+
+        Returns:
+            The recorder.
+
+        Raises:
+            TimeoutError: If no recorder was ready within timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                recorder = self._ready.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"No recorder ready after {timeout} seconds.")
+
+            if not self._closed:
+                self._warm()
+
+            if recorder.process.is_alive():
+                return recorder
+
+            logger.warning(f"Pooled recorder at {recorder.endpoint} exited while idle, discarding it.")
+
+    def close(self):
+        """
+        Stop warming up recorders and shut down the idle ones. Recorders already acquired are
+        left alone.
+
+        Returns:
+            None
+        """
+        self._closed = True
+
+        with self._lock:
+            warming = list(self._warming)
+        for thread in warming:
+            thread.join()
+
+        while True:
+            try:
+                recorder = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            recorder.shutdown()
+
+    def _next_endpoint(self) -> str:
+        port = next(self._ports)
+        if self.transport == "ipc":
+            path = os.path.join(tempfile.gettempdir(), f"spike-recorder-pool-{os.getpid()}-{port}.ipc")
+            return make_endpoint("ipc", path=path)
+        return make_endpoint(self.transport, port=port)
+
+    def _warm(self):
+        thread = threading.Thread(target=self._warm_one, daemon=True, name="RecorderPoolWarmup")
+        with self._lock:
+            self._warming = [t for t in self._warming if t.is_alive()] + [thread]
+        thread.start()
+
+    def _warm_one(self):
+        """
+        Start one recorder and wait for it to answer, then make it available.
+        """
+        from spike_recorder.client import SpikeRecorder
+
+        endpoint = self._next_endpoint()
+        start = time.perf_counter()
+        process = self.context.Process(target=self.target, kwargs={'endpoint': endpoint})
+        process.start()
+
+        client = SpikeRecorder(endpoint=endpoint, timeout_ms=250)
+        try:
+            client.connect()
+            ready = client.wait_ready(timeout=self.ready_timeout)
+        finally:
+            client.close()
+
+        recorder = PooledRecorder(endpoint=endpoint, process=process, warmup_seconds=time.perf_counter() - start)
+
+        if not ready or not process.is_alive():
+            logger.error(f"Pooled recorder at {endpoint} didn't come up within {self.ready_timeout} seconds.")
+            process.terminate()
+            process.join()
+            return
+
+        logger.info(f"Pooled recorder at {endpoint} ready after {recorder.warmup_seconds:.2f} seconds.")
+
+        if self._closed:
+            recorder.shutdown()
+        else:
+            self._ready.put(recorder)
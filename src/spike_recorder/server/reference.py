@@ -0,0 +1,500 @@
+"""
+A pure Python reference implementation of the SpikeRecorder command server.
+
+It speaks the same protocol as the application, see spike_recorder.protocol, and writes recordings
+in the same layout, a WAV file of the samples and a -events.txt file of markers next to it. Samples
+come from a SampleSource rather than audio hardware and there is no GUI, so it runs headless. It is
+used as a test fixture and as the target for client benchmarks. It also publishes its samples,
+see spike_recorder.stream.
+
+    >>> with ReferenceServer(endpoint="tcp://127.0.0.1:*") as server:
+    ...     client = SpikeRecorder(endpoint=server.endpoint)
+    ...     client.connect()
+
+Or from the command line:
+
+    python -m spike_recorder.server.reference --endpoint tcp://localhost:5555
+"""
+import datetime
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+import zmq
+
+from typing import List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.protocol import CommandMsg, CommandType, DEFAULT_ENDPOINT, bind_endpoint
+from spike_recorder import wire
+from spike_recorder.stream import pack_block
+
+
+class SampleSource:
+    """
+    Where the reference server gets its samples from. Derive and implement read.
+
+    Args:
+        sample_rate: Samples per second, per channel.
+        num_channels: The number of channels.
+    """
+
+    def __init__(self, sample_rate: int = 10000, num_channels: int = 1):
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+
+    def read(self, num_samples: int) -> np.ndarray:
+        """
+        Produce the next block of samples.
+
+        Args:
+            num_samples: The number of samples, per channel, to produce.
+
+        Returns:
+            An int16 array of shape (num_samples, num_channels).
+        """
+        raise NotImplementedError("read method not implemented for base class. Derive a class and implement the"
+                                  " read method.")
+
+
+class SyntheticSource(SampleSource):
+    """
+    Gaussian noise with spikes, a stand in for a neural recording.
+
+    Args:
+        sample_rate: Samples per second, per channel.
+        num_channels: The number of channels.
+        noise_std: Standard deviation of the background noise.
+        spike_rate_hz: Mean firing rate of the spikes on each channel.
+        spike_amplitude: Peak amplitude of the spikes.
+        seed: Seed for the random number generator.
+    """
+
+    def __init__(self, sample_rate: int = 10000, num_channels: int = 1, noise_std: float = 200.0,
+                 spike_rate_hz: float = 20.0, spike_amplitude: float = 4000.0, seed: Optional[int] = None):
+        super().__init__(sample_rate=sample_rate, num_channels=num_channels)
+        self.noise_std = noise_std
+        self.spike_rate_hz = spike_rate_hz
+        self._rng = np.random.RandomState(seed)
+
+        # A 2 ms biphasic spike waveform
+        t = np.linspace(0.0, 1.0, max(int(0.002 * sample_rate), 4))
+        self._waveform = spike_amplitude * (-np.sin(2 * np.pi * t) * np.exp(-3 * t))
+
+        self._carry = np.zeros((len(self._waveform), num_channels))
+
+    def read(self, num_samples: int) -> np.ndarray:
+        width = len(self._waveform)
+        block = self._rng.normal(0.0, self.noise_std, size=(num_samples + width, self.num_channels))
+        block[:width] += self._carry
+
+        spikes = self._rng.random_sample((num_samples, self.num_channels)) < self.spike_rate_hz / self.sample_rate
+        for sample, channel in zip(*np.nonzero(spikes)):
+            block[sample:sample + width, channel] += self._waveform
+
+        self._carry = block[num_samples:].copy()
+        return np.clip(block[:num_samples], -32768, 32767).astype(np.int16)
+
+
+class Recording:
+    """
+    An open recording, the WAV file and its events file, whose first sample is start_sample_index
+    of the acquisition.
+    """
+
+    def __init__(self, wav_path: str, source: SampleSource, start_sample_index: int = 0):
+        self.wav_path = wav_path
+        self.start_sample_index = start_sample_index
+        self.events_path = os.path.splitext(wav_path)[0] + "-events.txt"
+        self.num_samples = 0
+
+        self._wav = wave.open(wav_path, 'wb')
+        self._wav.setnchannels(source.num_channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(source.sample_rate)
+        self._sample_rate = source.sample_rate
+
+        self._events = open(self.events_path, 'w')
+        self._events.write("# Marker IDs can be arbitrary strings.\n")
+        self._events.write("# Marker ID,\tTime (in s)\n")
+        self._events.flush()
+
+    def write_samples(self, samples: np.ndarray):
+        self._wav.writeframes(samples.tobytes())
+        self.num_samples = self.num_samples + len(samples)
+
+    def write_marker(self, name: str, sample_index: int):
+        self._events.write(f"{name},\t{sample_index / self._sample_rate:.4f}\n")
+        self._events.flush()
+
+    def close(self):
+        self._wav.close()
+        self._events.close()
+
+
+class ReferenceServer:
+    """
+    A headless, protocol compatible, SpikeRecorder command server.
+
+    Args:
+        endpoint: The endpoint to listen for commands on. A tcp port of * binds a free port, the
+            actual endpoint is available from the endpoint attribute once started.
+        source: Where samples come from, defaults to a SyntheticSource.
+        recordings_dir: Where to put recordings when START_RECORD doesn't give a filename.
+        encodings: The wire encodings the server will agree to, see spike_recorder.wire
+        data_endpoint: Where to publish the sample stream, see spike_recorder.stream. The actual
+            endpoint is advertised in STATUS replies. None turns the stream off.
+    """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, source: SampleSource = None,
+                 recordings_dir: str = None, encodings=("binary", "json"),
+                 data_endpoint: Optional[str] = "tcp://127.0.0.1:*"):
+        self.endpoint = endpoint
+        self.source = source if source is not None else SyntheticSource(seed=0)
+        self.recordings_dir = recordings_dir if recordings_dir is not None else os.getcwd()
+        self.encodings = encodings
+        self.data_endpoint = data_endpoint
+
+        # Every command received, handy for tests.
+        self.received: List[CommandMsg] = []
+
+        # Samples acquired since the server started
+        self.sample_index = 0
+
+        self.recording: Optional[Recording] = None
+        self.last_recording: Optional[Recording] = None
+
+        self.codec = wire.JSON
+        self._context = zmq.Context()
+        self._socket = None
+        self._data_socket = None
+        self._sequence = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._start_time = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def bind(self):
+        """
+        Bind the command socket. Called by start and run.
+
+        Returns:
+            None
+        """
+        if self._socket is not None:
+            return
+
+        self._socket = self._context.socket(zmq.REP)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.bind(bind_endpoint(self.endpoint))
+        self.endpoint = self._socket.getsockopt_string(zmq.LAST_ENDPOINT)
+        logger.info(f"Reference SpikeRecorder server listening on {self.endpoint}")
+
+        if self.data_endpoint is not None:
+            self._data_socket = self._context.socket(zmq.PUB)
+            self._data_socket.setsockopt(zmq.LINGER, 0)
+            self._data_socket.bind(bind_endpoint(self.data_endpoint))
+            self.data_endpoint = self._data_socket.getsockopt_string(zmq.LAST_ENDPOINT)
+            logger.info(f"Reference SpikeRecorder server publishing samples on {self.data_endpoint}")
+
+    def start(self):
+        """
+        Start serving from a background thread.
+
+        Returns:
+            None
+        """
+        self.bind()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True, name="ReferenceSpikeRecorder")
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving, finish any recording in progress and release the socket.
+
+        Returns:
+            None
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+        if self._data_socket is not None:
+            self._data_socket.close()
+            self._data_socket = None
+
+        self._context.term()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the server to stop, for example after a SHUTDOWN command.
+
+        Args:
+            timeout: Seconds to wait, None waits forever.
+
+        Returns:
+            True if the server has stopped.
+        """
+        return self._stop_event.wait(timeout)
+
+    def run(self):
+        """
+        Serve commands and acquire samples until stopped or shutdown. Blocks.
+
+        Returns:
+            None
+        """
+        self.bind()
+        self._start_time = time.perf_counter()
+
+        try:
+            while not self._stop_event.is_set():
+
+                # Wake up at least every 10 ms to acquire samples.
+                if self._socket.poll(10):
+                    self._acquire()
+                    self._handle(self._socket.recv())
+
+                self._acquire()
+        finally:
+            self._stop_recording()
+            self._stop_event.set()
+
+    def _acquire(self):
+        """
+        Read however many samples the source has produced, in real time, since the last call.
+        """
+        due = int((time.perf_counter() - self._start_time) * self.source.sample_rate) - self.sample_index
+        if due <= 0:
+            return
+
+        samples = self.source.read(due)
+
+        if self._data_socket is not None:
+            self._data_socket.send_multipart(pack_block(self._sequence, self.sample_index,
+                                                        self.source.sample_rate, samples))
+            self._sequence = self._sequence + 1
+
+        self.sample_index = self.sample_index + due
+
+        if self.recording is not None:
+            self.recording.write_samples(samples)
+
+    def _handle(self, data: bytes):
+        """
+        Handle one command and send the reply.
+        """
+        codec = self.codec
+        try:
+            msg = wire.decode(data)
+        except Exception as ex:
+            self._reply(codec, CommandMsg(type=CommandType.REPLY_ERROR, args={'what': f"Bad message: {ex}"}))
+            return
+
+        self.received.append(msg)
+        logger.debug(f"Reference server received: {msg}")
+
+        handler = getattr(self, f"_on_{msg.type.value.lower()}", None)
+        if handler is None:
+            reply = CommandMsg(type=CommandType.REPLY_ERROR, args={'what': f"Unsupported command {msg.type.value}"})
+        else:
+            try:
+                reply = handler(msg.args)
+            except Exception as ex:
+                logger.exception(f"Reference server failed to handle {msg}")
+                reply = CommandMsg(type=CommandType.REPLY_ERROR, args={'what': str(ex)})
+
+        # Replies go out in the encoding the command came in, a NEGOTIATE reply is always JSON.
+        self._reply(codec, reply)
+
+    def _reply(self, codec, reply: CommandMsg):
+        data = codec.encode(reply)
+
+        # The application null terminates its JSON replies
+        if codec is wire.JSON:
+            data = data + b'\0'
+
+        self._socket.send(data)
+
+    @staticmethod
+    def _ok(**args) -> CommandMsg:
+        return CommandMsg(type=CommandType.REPLY_OK, args=args)
+
+    @staticmethod
+    def _error(what: str) -> CommandMsg:
+        return CommandMsg(type=CommandType.REPLY_ERROR, args={'what': what})
+
+    def _recording_path(self, filename: Optional[str]) -> str:
+        """
+        Work out the WAV path for START_RECORD the same way the application does.
+        """
+        if filename is None:
+            directory = self.recordings_dir
+        elif os.path.isdir(filename):
+            directory = filename
+        else:
+            return filename
+
+        stamp = datetime.datetime.now().strftime("%Y-%m-%d_%H.%M.%S")
+        return os.path.join(directory, f"BYB_Recording_{stamp}.wav")
+
+    def _stop_recording(self) -> Optional[Recording]:
+        recording = self.recording
+        if recording is not None:
+            self.recording = None
+            recording.close()
+            self.last_recording = recording
+            logger.info(f"Reference server finished recording {recording.wav_path}")
+        return recording
+
+    def _on_start_record(self, args) -> CommandMsg:
+        if self.recording is not None:
+            return self._error("Already recording.")
+
+        self.recording = Recording(self._recording_path(args.get('filename')), self.source, self.sample_index)
+        logger.info(f"Reference server recording to {self.recording.wav_path}")
+        return self._ok(wav_path=self.recording.wav_path, events_path=self.recording.events_path,
+                        start_sample_index=self.recording.start_sample_index)
+
+    def _on_stop_record(self, args) -> CommandMsg:
+        recording = self._stop_recording()
+        if recording is None:
+            return self._error("Not recording.")
+
+        # The files are closed, so this reply doubles as the files flushed notice.
+        return self._ok(finalized=True, wav_path=recording.wav_path, events_path=recording.events_path,
+                        start_sample_index=recording.start_sample_index)
+
+    def _on_status(self, args) -> CommandMsg:
+        status = self._clock()
+        if self.data_endpoint is not None:
+            status['data_endpoint'] = self.data_endpoint
+
+        if self.recording is not None:
+            return self._ok(recording=True, finalized=False, wav_path=self.recording.wav_path,
+                            events_path=self.recording.events_path,
+                            start_sample_index=self.recording.start_sample_index, **status)
+        elif self.last_recording is not None:
+            return self._ok(recording=False, finalized=True, wav_path=self.last_recording.wav_path,
+                            events_path=self.last_recording.events_path,
+                            start_sample_index=self.last_recording.start_sample_index, **status)
+        else:
+            return self._ok(recording=False, finalized=False, **status)
+
+    def _push_marker(self, name: str) -> Optional[int]:
+        """
+        Write a marker at the current sample of the recording.
+
+        Returns:
+            The sample index it landed on, None if not recording.
+        """
+        if self.recording is None:
+            return None
+
+        sample_index = self.recording.num_samples
+        self.recording.write_marker(name, sample_index)
+        return sample_index
+
+    def _on_push_event_marker(self, args) -> CommandMsg:
+        sample_index = self._push_marker(args['name'])
+        if sample_index is None:
+            return self._ok()
+        return self._ok(sample_index=sample_index, sample_time=sample_index / self.source.sample_rate)
+
+    def _on_push_event_markers(self, args) -> CommandMsg:
+        indices = [self._push_marker(marker['name']) for marker in args['markers']]
+        if self.recording is None:
+            return self._ok()
+        return self._ok(sample_indices=indices, sample_times=[i / self.source.sample_rate for i in indices])
+
+    def _on_shutdown(self, args) -> CommandMsg:
+        self._stop_event.set()
+        return self._ok()
+
+    def _on_negotiate(self, args) -> CommandMsg:
+        for encoding in args.get('encodings', []):
+            if encoding in self.encodings and encoding in wire.ENCODINGS:
+                self.codec = wire.get_codec(encoding)
+                return self._ok(encoding=encoding)
+        return self._error("No supported encoding.")
+
+    def _clock(self) -> dict:
+        """
+        The sample clock, how many samples have been acquired so far, for PING and STATUS replies.
+        """
+        return {'sample_index': self.sample_index, 'sample_rate': self.source.sample_rate}
+
+    def _on_ping(self, args) -> CommandMsg:
+        # Markers land on the sample count as of when they are handled, so time pings the same way.
+        clock = self._clock()
+        return self._ok(recorder_time_ns=clock['sample_index'] * 1_000_000_000 // clock['sample_rate'], **clock)
+
+    def _on_heartbeat(self, args) -> CommandMsg:
+        return self._ok()
+
+
+def run_server(endpoint: str = DEFAULT_ENDPOINT, recordings_dir: str = None):
+    """
+    Run a reference server until it is sent SHUTDOWN. A process target, like the native
+    application's, see spike_recorder.server.pool.RecorderPool
+
+    Args:
+        endpoint: The endpoint to listen for commands on.
+        recordings_dir: Where to put recordings that are started without a filename.
+
+    Returns:
+        None
+    """
+    server = ReferenceServer(endpoint=endpoint, recordings_dir=recordings_dir)
+    try:
+        server.run()
+    finally:
+        server.stop()
+
+
+def main():
+    import argparse
+    from spike_recorder.server import add_endpoint_args, endpoint_from_args
+
+    parser = argparse.ArgumentParser(description="Run the headless reference SpikeRecorder server.")
+    add_endpoint_args(parser)
+    parser.add_argument('--recordings-dir', default=None,
+                        help='Where to put recordings that are started without a filename. Default is the '
+                             'current directory.')
+    parser.add_argument('--sample-rate', type=int, default=10000,
+                        help='Samples per second of the synthetic signal. Default is 10000.')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='Number of channels of the synthetic signal. Default is 1.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    server = ReferenceServer(endpoint=endpoint_from_args(args),
+                             source=SyntheticSource(sample_rate=args.sample_rate, num_channels=args.channels),
+                             recordings_dir=args.recordings_dir)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Threshold crossing spike detection, over a finished recording or the blocks of one still being
+recorded.
+
+    >>> with Recording("participant-07.wav") as recording:
+    ...     spikes = detect_spikes(recording, threshold=5.0)
+    >>> spikes.times[spikes.channels == 0]
+
+    >>> detector = SpikeDetector(sample_rate=10000, num_channels=2)
+    >>> for block in RecordingTail("participant-07.wav").follow(idle_timeout=5.0):
+    ...     spikes = detector.process(block.samples)
+
+The threshold of each channel is a multiple of its noise, estimated robustly from the median
+absolute deviation of each block, so spikes themselves barely move it and it follows slow drift.
+Crossings, amplitudes and waveforms are measured from each channel's baseline, its median, so a DC
+offset or unsigned 8 bit samples, centred on 128, are handled like any other recording. Blocks are
+processed with a small overlap carried between them, enough for the waveform snippets and for
+crossings on block boundaries, and memory is bounded by the block size whatever the recording's
+length. With a fixed noise and baseline the result doesn't depend on how the data is split. With
+them estimated per block, each block's threshold comes from that block alone, so splitting the
+data differently can move the thresholds, and the spikes found close to them.
+"""
+import attr
+import numpy as np
+
+from typing import List, Optional, Sequence, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The ratio of the standard deviation to the median absolute deviation of Gaussian noise.
+MAD_TO_SIGMA = 1.4826
+
+SIGNS = ("negative", "positive", "both")
+
+
+@attr.s(auto_attribs=True)
+class Spikes:
+    """
+    Detected spikes, in time order.
+
+    Args:
+        sample_indices: The sample of each spike's threshold crossing.
+        channels: Each spike's channel.
+        amplitudes: The peak of each spike, the sample furthest past the threshold in its snippet,
+            from the channel's baseline.
+        waveforms: Each spike's snippet of shape (spikes, samples), aligned on the crossing and
+            from the channel's baseline, None if they weren't extracted. Samples before the start
+            or after the end of the recording are NaN.
+        sample_rate: The recording's sample rate.
+        pre: How many samples of each snippet come before the crossing.
+    """
+    sample_indices: np.ndarray
+    channels: np.ndarray
+    amplitudes: np.ndarray
+    waveforms: Optional[np.ndarray]
+    sample_rate: int
+    pre: int = 0
+
+    def __len__(self):
+        return len(self.sample_indices)
+
+    @property
+    def times(self) -> np.ndarray:
+        """
+        The time of each spike, in seconds from the start of the recording.
+        """
+        return self.sample_indices / self.sample_rate
+
+    @classmethod
+    def concatenate(cls, parts: Sequence['Spikes'], sample_rate: int, pre: int = 0,
+                    snippet_length: int = None) -> 'Spikes':
+        """
+        Join the spikes of consecutive blocks.
+
+        Args:
+            parts: The blocks' spikes, in order.
+            sample_rate: The recording's sample rate.
+            pre: How many samples of each snippet come before the crossing.
+            snippet_length: The snippets' length, None if there are no snippets.
+
+        Returns:
+            All the spikes.
+        """
+        waveforms = None
+        if snippet_length is not None:
+            waveforms = (np.concatenate([p.waveforms for p in parts]) if parts
+                         else np.zeros((0, snippet_length), dtype=np.float32))
+        return cls(sample_indices=np.concatenate([p.sample_indices for p in parts] + [np.zeros(0, np.int64)]),
+                   channels=np.concatenate([p.channels for p in parts] + [np.zeros(0, np.int16)]),
+                   amplitudes=np.concatenate([p.amplitudes for p in parts] + [np.zeros(0, np.float32)]),
+                   waveforms=waveforms, sample_rate=sample_rate, pre=pre)
+
+
+def mad_noise(samples: np.ndarray) -> np.ndarray:
+    """
+    A robust estimate of each channel's noise standard deviation, from its median absolute deviation.
+
+    Args:
+        samples: Samples of shape (num_samples, num_channels).
+
+    Returns:
+        The noise of each channel.
+    """
+    return _baseline_and_noise(samples)[1]
+
+
+def _baseline_and_noise(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Each channel's median, and its noise, see mad_noise.
+    """
+    median = np.median(samples, axis=0)
+    return median, np.median(np.abs(samples - median), axis=0) * MAD_TO_SIGMA
+
+
+class SpikeDetector:
+    """
+    A streaming threshold crossing spike detector. Feed it consecutive blocks of samples with
+    process, each returns the spikes it could complete, then call flush at the end for the rest.
+    Block boundaries don't change the result if noise and baseline are given, otherwise the
+    thresholds follow each block's own estimates. See the module docstring.
+
+    Args:
+        sample_rate: The sample rate.
+        num_channels: The number of channels.
+        threshold: The threshold, as a multiple of each channel's noise.
+        sign: Which crossings count, "negative", "positive" or "both".
+        refractory: After a spike, how long its channel ignores crossings, in seconds.
+        snippet: How long each waveform snippet extends before and after its crossing, in seconds.
+            None doesn't extract snippets.
+        noise: Each channel's noise, fixed. None estimates it from each block, see mad_noise.
+        baseline: Each channel's baseline, fixed, for example 0 for signed samples without an
+            offset. None estimates it from each block as the channel's median.
+        min_noise_samples: Blocks shorter than this keep the previous noise and baseline estimates.
+    """
+
+    def __init__(self, sample_rate: int, num_channels: int, threshold: float = 4.5, sign: str = "negative",
+                 refractory: float = 0.001, snippet: Optional[Tuple[float, float]] = (0.0005, 0.001),
+                 noise: Sequence[float] = None, baseline: Sequence[float] = None, min_noise_samples: int = 1000):
+        if sign not in SIGNS:
+            raise ValueError(f"sign must be one of {SIGNS}, not '{sign}'")
+
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.threshold = threshold
+        self.sign = sign
+        self.refractory = int(round(refractory * sample_rate))
+        self.min_noise_samples = min_noise_samples
+        self.fixed_noise = noise is not None
+        self.noise: Optional[np.ndarray] = None if noise is None else np.asarray(noise, dtype=np.float32)
+        self.fixed_baseline = baseline is not None
+        self.baseline: Optional[np.ndarray] = None if baseline is None else np.asarray(baseline, dtype=np.float32)
+
+        self.extract_waveforms = snippet is not None
+        if snippet is None:
+            self.pre, self.post = 0, 1
+        else:
+            self.pre = int(round(snippet[0] * sample_rate))
+            self.post = max(int(round(snippet[1] * sample_rate)), 1)
+
+        self.reset()
+
+    @property
+    def snippet_length(self) -> int:
+        return self.pre + self.post
+
+    def reset(self):
+        """
+        Start a new stream.
+
+        Returns:
+            None
+        """
+        # The overlap carried into the next block, starting with NaN before the first sample, which
+        # never crosses a threshold, so that every sample has a full snippet.
+        self._carry = np.full((self.pre + 1, self.num_channels), np.nan, dtype=np.float32)
+        self._carry_start = -(self.pre + 1)
+        self._next = 0
+        self._last_spike = np.full(self.num_channels, np.iinfo(np.int64).min // 2, dtype=np.int64)
+        if not self.fixed_noise:
+            self.noise = None
+        if not self.fixed_baseline:
+            self.baseline = None
+
+    @property
+    def thresholds(self) -> Optional[np.ndarray]:
+        """
+        Each channel's current threshold, from its baseline, None until the noise has been estimated.
+        """
+        return None if self.noise is None else self.noise * self.threshold
+
+    def process(self, samples: np.ndarray) -> Spikes:
+        """
+        Detect the spikes in the next block of samples.
+
+        Args:
+            samples: The block, of shape (num_samples, num_channels), following on from the last.
+
+        Returns:
+            The spikes whose snippets are complete. The last few samples are held back until the
+            next block, or flush.
+        """
+        samples = np.asarray(samples)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        if samples.shape[1] != self.num_channels:
+            raise ValueError(f"Expected {self.num_channels} channels, got {samples.shape[1]}")
+
+        fixed = self.fixed_noise and self.fixed_baseline
+        if not fixed and len(samples) > 0 and \
+                (self.noise is None or self.baseline is None or len(samples) >= self.min_noise_samples):
+            baseline, noise = _baseline_and_noise(samples)
+            if not self.fixed_noise:
+                self.noise = noise.astype(np.float32)
+            if not self.fixed_baseline:
+                self.baseline = baseline.astype(np.float32)
+
+        return self._detect(samples)
+
+    def flush(self) -> Spikes:
+        """
+        Detect the spikes held back at the end of the stream, their snippets are padded with NaN.
+
+        Returns:
+            The spikes.
+        """
+        return self._detect(np.full((self.post, self.num_channels), np.nan, dtype=np.float32))
+
+    def _crossed(self, x: np.ndarray) -> np.ndarray:
+        """
+        Which samples, already relative to the baseline, are past the threshold.
+        """
+        thresholds = self.thresholds
+        with np.errstate(invalid='ignore'):
+            if self.sign == "negative":
+                return x < -thresholds
+            if self.sign == "positive":
+                return x > thresholds
+            return np.abs(x) > thresholds
+
+    def _refractory(self, indices: np.ndarray, channels: np.ndarray) -> np.ndarray:
+        """
+        Which crossings, in time order, are outside the refractory period of the spike before on
+        their channel.
+        """
+        keep = np.ones(len(indices), dtype=bool)
+        for channel in np.unique(channels):
+            where = np.flatnonzero(channels == channel)
+            times = indices[where]
+            gaps = np.diff(times, prepend=self._last_spike[channel])
+            if (gaps > self.refractory).all():
+                self._last_spike[channel] = times[-1]
+                continue
+
+            # Rare enough to walk: a spike only blocks the crossings after it if it was kept.
+            last = self._last_spike[channel]
+            for i, t in zip(where, times):
+                if t - last > self.refractory:
+                    last = t
+                else:
+                    keep[i] = False
+            self._last_spike[channel] = last
+        return keep
+
+    def _detect(self, samples: np.ndarray) -> Spikes:
+        buffer = np.concatenate([self._carry, samples.astype(np.float32, copy=False)])
+        start = self._carry_start
+
+        first = self._next - start
+        end = len(buffer) - self.post
+
+        spikes = []
+        if end > first and self.noise is not None and self.baseline is not None:
+            crossed = self._crossed(buffer[first - 1:end] - self.baseline)
+            rows, channels = np.nonzero(crossed[1:] & ~crossed[:-1])
+            rows = rows + first
+
+            keep = self._refractory(rows + start, channels)
+            rows, channels = rows[keep], channels[keep]
+
+            offsets = np.arange(-self.pre, self.post)
+            snippets = buffer[rows[:, None] + offsets[None, :], channels[:, None]] - self.baseline[channels, None]
+            after = snippets[:, self.pre:]
+            with np.errstate(invalid='ignore'):
+                if self.sign == "negative":
+                    amplitudes = np.nanmin(after, axis=1) if len(after) else np.zeros(0, np.float32)
+                elif self.sign == "positive":
+                    amplitudes = np.nanmax(after, axis=1) if len(after) else np.zeros(0, np.float32)
+                else:
+                    peak = np.nanargmax(np.abs(after), axis=1) if len(after) else np.zeros(0, np.intp)
+                    amplitudes = after[np.arange(len(after)), peak]
+
+            spikes.append(Spikes(sample_indices=(rows + start).astype(np.int64), channels=channels.astype(np.int16),
+                                 amplitudes=amplitudes.astype(np.float32),
+                                 waveforms=snippets if self.extract_waveforms else None,
+                                 sample_rate=self.sample_rate, pre=self.pre))
+
+        # Carry what the next crossings need: the sample before each and the start of its snippet.
+        if end > first:
+            self._next = start + end
+        keep_from = self._next - start - self.pre - 1
+        self._carry = buffer[keep_from:].copy()
+        self._carry_start = start + keep_from
+
+        return Spikes.concatenate(spikes, self.sample_rate, self.pre,
+                                  self.snippet_length if self.extract_waveforms else None)
+
+
+def detect_spikes(recording, channels: Sequence[int] = None, block_duration: float = 10.0, start: int = None,
+                  stop: int = None, **kwargs) -> Spikes:
+    """
+    Detect the spikes of a recording, a block at a time.
+
+    Args:
+        recording: The spike_recorder.recording.Recording.
+        channels: The channels to detect spikes on, defaults to all of them. The spikes' channels are
+            the recording's.
+        block_duration: How much of the recording to process at a time, in seconds. This bounds the
+            memory used, besides the spikes, and is also the span of each noise and baseline estimate.
+        start: The first sample, defaults to the start of the recording.
+        stop: One past the last sample, defaults to the end of the recording.
+        **kwargs: Passed on to SpikeDetector.
+
+    Returns:
+        The spikes, with sample indices into the recording.
+    """
+    channels = list(range(recording.num_channels)) if channels is None else list(channels)
+    start = 0 if start is None else start
+    stop = recording.num_samples if stop is None else min(stop, recording.num_samples)
+    block_size = max(int(block_duration * recording.sample_rate), 1)
+
+    detector = SpikeDetector(sample_rate=recording.sample_rate, num_channels=len(channels), **kwargs)
+    parts: List[Spikes] = []
+    for first in range(start, stop, block_size):
+        parts.append(detector.process(recording.samples[first:min(first + block_size, stop), channels]))
+    parts.append(detector.flush())
+
+    spikes = Spikes.concatenate(parts, recording.sample_rate, detector.pre,
+                                detector.snippet_length if detector.extract_waveforms else None)
+    spikes.sample_indices += start
+    spikes.channels = np.asarray(channels, dtype=np.int16)[spikes.channels]
+    logger.info(f"Detected {len(spikes)} spikes in {(stop - start) / recording.sample_rate:.1f} s "
+                f"of {len(channels)} channels.")
+    return spikes
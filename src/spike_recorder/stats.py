@@ -0,0 +1,186 @@
+"""
+Round trip latency instrumentation for the SpikeRecorder clients.
+"""
+import array
+import threading
+
+from typing import Dict, Optional
+
+from spike_recorder.protocol import CommandType
+
+
+class LatencyHistogram:
+    """
+    A fixed memory, HDR style, log-linear histogram of latencies in nanoseconds. Values below
+    2**precision_bits are counted exactly. Above that, each power of two range is split into
+    2**precision_bits equal buckets, so any recorded value is known to within a relative error of
+    2**-precision_bits. Memory doesn't grow with the number of values recorded.
+
+    Args:
+        precision_bits: Sub buckets per power of two, as a power of two. The default of 5 gives
+            about 3% relative error.
+        highest_ns: The largest value that can be told apart, larger values are counted in the
+            top bucket. The exact max is always kept.
+    """
+
+    def __init__(self, precision_bits: int = 5, highest_ns: int = 60 * 10**9):
+        self.precision_bits = precision_bits
+        self._sub_buckets = 1 << precision_bits
+        self._max_index = self._index(highest_ns)
+        self._counts = array.array('Q', bytes(8 * (self._max_index + 1)))
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all recorded values.
+
+        Returns:
+            None
+        """
+        for i in range(len(self._counts)):
+            self._counts[i] = 0
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns: Optional[int] = None
+        self.max_ns: Optional[int] = None
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_buckets:
+            return value
+        shift = value.bit_length() - self.precision_bits - 1
+        return (shift << self.precision_bits) + (value >> shift)
+
+    def _highest_equivalent(self, index: int) -> int:
+        if index < self._sub_buckets:
+            return index
+        shift = (index >> self.precision_bits) - 1
+        mantissa = index - (shift << self.precision_bits)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value_ns: int):
+        """
+        Record a latency.
+
+        Args:
+            value_ns: The latency in nanoseconds.
+
+        Returns:
+            None
+        """
+        value_ns = max(int(value_ns), 0)
+        self._counts[min(self._index(value_ns), self._max_index)] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if self.max_ns is None or value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def percentile(self, q: float) -> Optional[int]:
+        """
+        The latency at a percentile, to within the histogram's precision.
+
+        Args:
+            q: The percentile, between 0 and 100.
+
+        Returns:
+            The latency in nanoseconds, None if nothing has been recorded.
+        """
+        if self.count == 0:
+            return None
+
+        target = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return min(max(self._highest_equivalent(index), self.min_ns), self.max_ns)
+
+        return self.max_ns
+
+    @property
+    def mean_ns(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return self.total_ns / self.count
+
+
+class CommandStats:
+    """
+    Counters and a latency histogram for a single command type.
+    """
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.reset()
+
+    def reset(self):
+        self.sent = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency.reset()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """
+        Returns:
+            A dictionary of the counters and latency percentiles, latencies are in milliseconds.
+        """
+        def ms(value):
+            return None if value is None else value / 1e6
+
+        return {
+            'sent': self.sent,
+            'replies': self.latency.count,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'min_ms': ms(self.latency.min_ns),
+            'mean_ms': ms(self.latency.mean_ns),
+            'p50_ms': ms(self.latency.percentile(50)),
+            'p90_ms': ms(self.latency.percentile(90)),
+            'p99_ms': ms(self.latency.percentile(99)),
+            'max_ms': ms(self.latency.max_ns),
+        }
+
+
+class ClientStats:
+    """
+    Per CommandType round trip statistics for a client. Safe to update from multiple threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands: Dict[CommandType, CommandStats] = {}
+
+    def _get(self, command_type: CommandType) -> CommandStats:
+        stats = self._commands.get(command_type)
+        if stats is None:
+            stats = self._commands[command_type] = CommandStats()
+        return stats
+
+    def record_sent(self, command_type: CommandType):
+        with self._lock:
+            self._get(command_type).sent += 1
+
+    def record_reply(self, command_type: CommandType, latency_ns: int, error: bool = False):
+        with self._lock:
+            stats = self._get(command_type)
+            stats.latency.record(latency_ns)
+            if error:
+                stats.errors += 1
+
+    def record_timeout(self, command_type: CommandType):
+        with self._lock:
+            self._get(command_type).timeouts += 1
+
+    def reset(self):
+        with self._lock:
+            for stats in self._commands.values():
+                stats.reset()
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Returns:
+            A dictionary from command type name to its CommandStats summary.
+        """
+        with self._lock:
+            return {command_type.value: stats.summary() for command_type, stats in self._commands.items()}
@@ -0,0 +1,295 @@
+"""
+Live samples from the recorder. Next to its command socket the recorder publishes sample blocks
+on a ZeroMQ PUB socket, its address is in the STATUS reply as args['data_endpoint']. Each block is
+a two frame message, a fixed header followed by the raw int16 samples, interleaved by channel:
+
+    magic (B), version (B), num_channels (H), sample_rate (I), sequence (Q), first_sample (Q)
+
+The sequence number goes up by one per block, gaps in it are blocks the subscriber missed. The
+first_sample is the recorder's sample clock, the index of the block's first sample since the
+recorder started, so first_sample / sample_rate is its time. Both start over from 0 when the
+recorder is restarted.
+"""
+import struct
+import threading
+
+import numpy as np
+import zmq
+
+from typing import List, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+BLOCK_MAGIC = 0xB6
+BLOCK_VERSION = 1
+
+_HEADER = struct.Struct('<BBHIQQ')
+
+
+def pack_block(sequence: int, first_sample: int, sample_rate: int, samples: np.ndarray) -> List[bytes]:
+    """
+    Build the frames of a sample block.
+
+    Args:
+        sequence: The block's sequence number.
+        first_sample: Sample clock index of the block's first sample.
+        sample_rate: Samples per second, per channel.
+        samples: An int16 array of shape (num_samples, num_channels).
+
+    Returns:
+        The header and sample frames.
+    """
+    header = _HEADER.pack(BLOCK_MAGIC, BLOCK_VERSION, samples.shape[1], sample_rate, sequence, first_sample)
+    return [header, np.ascontiguousarray(samples, dtype='<i2').tobytes()]
+
+
+def unpack_block(frames: List[bytes]) -> Tuple[int, int, int, np.ndarray]:
+    """
+    Parse the frames of a sample block, see pack_block.
+
+    Args:
+        frames: The header and sample frames.
+
+    Returns:
+        The sequence number, first sample index, sample rate and an int16 array of shape
+        (num_samples, num_channels) over the sample frame.
+    """
+    if len(frames) != 2 or len(frames[0]) != _HEADER.size:
+        raise ValueError("Malformed sample block.")
+
+    magic, version, num_channels, sample_rate, sequence, first_sample = _HEADER.unpack(frames[0])
+    if magic != BLOCK_MAGIC or version != BLOCK_VERSION:
+        raise ValueError(f"Unsupported sample block, magic {magic:#x} version {version}.")
+
+    samples = np.frombuffer(frames[1], dtype='<i2').reshape(-1, num_channels)
+    return sequence, first_sample, sample_rate, samples
+
+
+class SampleStream:
+    """
+    Subscribes to the recorder's sample stream and keeps the most recent samples in a preallocated
+    ring buffer.
+
+    The buffer is stored twice over, so the latest samples are always one contiguous slice of it
+    and latest hands out views, not copies. A view stays valid until the stream has received
+    seconds minus its length worth of newer samples, copy it to keep it longer.
+
+    Samples arrive either from a background thread, see start, or whenever poll is called, for
+    example from a GUI timer, in which case views stay valid until the next poll.
+
+        >>> stream = recorder.sample_stream(seconds=10.0)
+        >>> stream.start()
+        >>> last_second = stream.latest(1.0)
+
+    Args:
+        endpoint: The recorder's data endpoint, see CommandType.STATUS
+        seconds: How many seconds of samples to keep.
+        sample_rate: If known, with num_channels, the buffer is allocated up front rather than when
+            the first block arrives.
+        num_channels: The number of channels, see sample_rate.
+        context: The ZeroMQ context to create the socket in, defaults to the shared context, see
+            spike_recorder.client.shared_context
+    """
+
+    def __init__(self, endpoint: str, seconds: float = 10.0, sample_rate: int = None, num_channels: int = None,
+                 context: zmq.Context = None):
+        self.endpoint = endpoint
+        self.seconds = seconds
+
+        if context is None:
+            context = zmq.Context.instance()
+        self.context = context
+        self.socket = None
+
+        # Learnt from the first block.
+        self.sample_rate: Optional[int] = None
+        self.num_channels: Optional[int] = None
+        self.capacity = 0
+        self._buffer: Optional[np.ndarray] = None
+
+        # Sample clock index one past the newest sample in the buffer.
+        self.end_sample: Optional[int] = None
+
+        self.blocks = 0
+        self.dropped_blocks = 0
+        self.missing_samples = 0
+        self.restarts = 0
+        self._next_sequence: Optional[int] = None
+
+        if sample_rate is not None and num_channels is not None:
+            self._allocate(sample_rate, num_channels)
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def connect(self):
+        """
+        Subscribe to the sample stream.
+
+        Returns:
+            None
+        """
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b'')
+        self.socket.connect(self.endpoint)
+
+    def close(self):
+        """
+        Stop receiving and close the subscription.
+
+        Returns:
+            None
+        """
+        self.stop()
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def start(self):
+        """
+        Receive samples from a background thread.
+
+        Returns:
+            None
+        """
+        if self.socket is None:
+            self.connect()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True, name="SampleStream")
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread, if it is running.
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def poll(self, timeout_ms: int = 0) -> int:
+        """
+        Put every block that has arrived into the buffer, waiting up to timeout_ms for the first.
+
+        Args:
+            timeout_ms: How long to wait if nothing has arrived yet, in milliseconds.
+
+        Returns:
+            The number of blocks received.
+        """
+        received = 0
+        while self.socket.poll(timeout_ms if received == 0 else 0):
+            self.add_block(*unpack_block(self.socket.recv_multipart(copy=True)))
+            received = received + 1
+        return received
+
+    def _receive_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll(timeout_ms=10)
+            except Exception:
+                logger.exception("Failed to receive samples from SpikeRecorder.")
+
+    def _allocate(self, sample_rate: int, num_channels: int):
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.capacity = max(int(round(self.seconds * sample_rate)), 1)
+        self._buffer = np.zeros((2 * self.capacity, num_channels), dtype=np.int16)
+        self._filled = 0
+        self.end_sample = None
+
+    def _write(self, samples: np.ndarray):
+        """
+        Append samples at end_sample, writing both copies.
+        """
+        if len(samples) > self.capacity:
+            self.end_sample = self.end_sample + len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+
+        n = len(samples)
+        pos = self.end_sample % self.capacity
+
+        first = min(n, self.capacity - pos)
+        for offset in (0, self.capacity):
+            self._buffer[offset + pos:offset + pos + first] = samples[:first]
+        if n > first:
+            for offset in (0, self.capacity):
+                self._buffer[offset:offset + n - first] = samples[first:]
+
+        self.end_sample = self.end_sample + n
+        self._filled = min(self._filled + n, self.capacity)
+
+    def add_block(self, sequence: int, first_sample: int, sample_rate: int, samples: np.ndarray):
+        """
+        Put a block in the buffer, counting any blocks or samples missed since the last one.
+        Missing samples are filled with zeros so the buffer stays aligned with the sample clock.
+        If the sequence number or the sample clock goes back further than a repeated block would,
+        the recorder has restarted, and the buffer starts over with this block.
+
+        Args:
+            sequence: The block's sequence number.
+            first_sample: Sample clock index of the block's first sample.
+            sample_rate: Samples per second, per channel.
+            samples: An int16 array of shape (num_samples, num_channels).
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._buffer is None or sample_rate != self.sample_rate or samples.shape[1] != self.num_channels:
+                self._allocate(sample_rate, samples.shape[1])
+
+            if self.end_sample is not None and (sequence < self._next_sequence - 1
+                                                or first_sample + len(samples) < self.end_sample):
+                logger.warning(f"SpikeRecorder sample stream started over at block {sequence}, sample "
+                               f"{first_sample}, after sample {self.end_sample}, clearing the buffer.")
+                self.restarts = self.restarts + 1
+                self._allocate(sample_rate, samples.shape[1])
+
+            if self.end_sample is None:
+                self.end_sample = first_sample
+                self._next_sequence = sequence
+
+            if sequence > self._next_sequence:
+                self.dropped_blocks = self.dropped_blocks + sequence - self._next_sequence
+            self._next_sequence = sequence + 1
+
+            gap = first_sample - self.end_sample
+            if gap > 0:
+                self.missing_samples = self.missing_samples + gap
+                self._write(np.zeros((min(gap, self.capacity), self.num_channels), dtype=np.int16))
+                self.end_sample = first_sample
+            elif gap < 0:
+                # Overlaps what we already have, a block repeated.
+                samples = samples[-gap:]
+
+            if len(samples):
+                self._write(samples)
+            self.blocks = self.blocks + 1
+
+    def latest(self, seconds: float = None) -> np.ndarray:
+        """
+        A view of the most recent samples.
+
+        Args:
+            seconds: How many seconds of samples, defaults to everything in the buffer. Fewer are
+                returned if the buffer doesn't hold that many yet.
+
+        Returns:
+            An int16 array of shape (num_samples, num_channels), a view into the ring buffer. The
+            sample clock index of its first sample is end_sample - len(view).
+        """
+        with self._lock:
+            if self._buffer is None:
+                return np.zeros((0, self.num_channels or 0), dtype=np.int16)
+
+            n = self._filled if seconds is None else min(int(round(seconds * self.sample_rate)), self._filled)
+            end = self.end_sample % self.capacity + self.capacity
+            return self._buffer[end - n:end]
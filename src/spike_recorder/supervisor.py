@@ -0,0 +1,371 @@
+"""
+Keep a recording going through recorder crashes. The supervisor watches the recorder's process and,
+if it answers them, its heartbeat, restarts it when it dies or stops answering, and carries on
+recording into the next numbered segment. A session manifest lists the segments and the gaps between them.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import attr
+
+from typing import Callable, List, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.protocol import DEFAULT_ENDPOINT, RecordingFiles, SpikeRecorderUnavailable
+
+
+@attr.s(auto_attribs=True)
+class Segment:
+    """
+    One continuous stretch of recording, a WAV file and its events file.
+
+    Args:
+        index: The segment's number, counting from 0.
+        wav_path: The segment's WAV file.
+        events_path: Its events file, None if the recorder didn't say.
+        started: When recording began, seconds since the epoch.
+        ended: When it ended, None while recording.
+        finalized: Whether the recorder confirmed it closed the files. A segment cut short by a crash
+            isn't, its WAV header may not cover all the samples written. Nor is one recorded by a
+            version of the application that doesn't report its state, whether or not it was.
+        restart: The number of the recorder restart this segment followed, 0 for the first segment.
+    """
+    index: int
+    wav_path: str
+    events_path: Optional[str]
+    started: float
+    ended: Optional[float] = None
+    finalized: bool = False
+    restart: int = 0
+
+
+@attr.s(auto_attribs=True)
+class Gap:
+    """
+    A stretch of the session nothing was recorded in.
+
+    Args:
+        start: The last time the recorder was known to be recording, seconds since the epoch.
+        end: When the continuation segment began recording.
+        reason: Why the recorder was restarted, "exited" or "unresponsive".
+    """
+    start: float
+    end: float
+    reason: str
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class RecorderSupervisor:
+    """
+    Launches a recorder, starts recording and keeps an eye on it from a background thread. If the
+    recorder's process exits, or it misses max_missed_heartbeats heartbeats in a row, the process is
+    killed and relaunched and recording resumes in a continuation segment, so at most the time it
+    takes to notice and restart is lost. Segments are named <name>-000.wav, <name>-001.wav, ... in
+    session_dir and the manifest, <name>-manifest.json, is rewritten every time one starts or ends.
+
+    Heartbeats are only watched if the recorder answered one while starting, see
+    SpikeRecorder.wait_ready. Versions of the application that ignore HEARTBEAT would otherwise look
+    hung and be restarted over and over, for those only the process is watched.
+
+        >>> supervisor = RecorderSupervisor(session_dir="data", name="participant-07")
+        >>> supervisor.start()
+        >>> supervisor.client.push_event_marker("Trial 1: Start")
+        >>> ...
+        >>> supervisor.stop()
+
+    Push markers through client, it is shared with the supervisor and reconnects to the restarted
+    recorder by itself. Give it an outbox_size so markers pushed during a restart are delivered to
+    the continuation segment rather than raising SpikeRecorderUnavailable.
+
+    Args:
+        session_dir: The directory for the segments and the manifest.
+        name: The session's name, the prefix of its files.
+        endpoint: The recorder's command endpoint.
+        check_interval: Seconds between checks on the recorder.
+        max_missed_heartbeats: Consecutive heartbeats the recorder may miss before it is restarted, if
+            it answers heartbeats at all.
+        max_restarts: How many times to restart the recorder before giving up on the session.
+        ready_timeout: How long, in seconds, a (re)started recorder has to start answering.
+        heartbeat_grace: How long, in seconds, a (re)started recorder has to answer a HEARTBEAT before
+            only its process is watched, see SpikeRecorder.wait_ready
+        start_method: The multiprocessing start method, see spike_recorder.server.default_start_method
+        target: The function run in the recorder process, called with an endpoint keyword.
+            Defaults to the native application, spike_recorder.server.run_application, which always
+            listens on its default endpoint. spike_recorder.server.reference.run_server runs the reference server instead.
+        on_restart: Called from the supervisor's thread with the Gap after each successful restart.
+        log_dir: Where the native application's log goes, a session for each launch, see
+            spike_recorder.server.native_log. Defaults to ~/.spike_recorder/logs
+        **client_args: Passed on to the SpikeRecorder client.
+    """
+
+    def __init__(self, session_dir: str, name: str = "session", endpoint: str = DEFAULT_ENDPOINT,
+                 check_interval: float = 1.0, max_missed_heartbeats: int = 3, max_restarts: int = 10,
+                 ready_timeout: float = 60.0, heartbeat_grace: float = 5.0, start_method: str = None,
+                 target: Callable = None,
+                 on_restart: Callable[[Gap], None] = None, log_dir: str = None, **client_args):
+        from spike_recorder.server import run_application, default_start_method
+
+        self.session_dir = os.path.abspath(session_dir)
+        self.name = name
+        self.endpoint = endpoint
+        self.check_interval = check_interval
+        self.max_missed_heartbeats = max_missed_heartbeats
+        self.max_restarts = max_restarts
+        self.ready_timeout = ready_timeout
+        self.heartbeat_grace = heartbeat_grace
+        self.target = target if target is not None else run_application
+        self.on_restart = on_restart
+        self.log_dir = log_dir
+
+        self.context = multiprocessing.get_context(start_method or default_start_method())
+        self.process = None
+        self.client = SpikeRecorder(endpoint=endpoint, **client_args)
+
+        self.segments: List[Segment] = []
+        self.gaps: List[Gap] = []
+        self.restarts = 0
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+
+        # Set when the recorder couldn't be brought back, the session is over.
+        self.failed = False
+
+        # The last time the recorder answered while recording.
+        self._last_alive: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.session_dir, f"{self.name}-manifest.json")
+
+    @property
+    def segment(self) -> Optional[Segment]:
+        """
+        The segment being recorded, None before start or after stop.
+        """
+        if self.segments and self.segments[-1].ended is None:
+            return self.segments[-1]
+        return None
+
+    def start(self):
+        """
+        Launch the recorder, start recording the first segment and start watching.
+
+        Returns:
+            None
+
+        Raises:
+            SpikeRecorderUnavailable: If the recorder didn't come up within ready_timeout.
+        """
+        os.makedirs(self.session_dir, exist_ok=True)
+        self.started = time.time()
+
+        self._launch()
+        self._start_segment()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True, name="RecorderSupervisor")
+        self._thread.start()
+
+    def stop(self, shutdown: bool = True):
+        """
+        Stop watching, finish the current segment and, by default, shut the recorder down.
+
+        Args:
+            shutdown: Whether to shut the recorder down.
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            segment = self.segment
+            if segment is not None:
+                try:
+                    files = self.client.stop_record(wait_finalized=True)
+
+                    # None means the recorder doesn't say, the files may well be finalized but we
+                    # can't tell.
+                    segment.finalized = files is not None
+                    if files is not None:
+                        segment.events_path = files.events_path
+                except Exception as ex:
+                    logger.error(f"Failed to stop recording segment {segment.index}: {ex!r}")
+                segment.ended = time.time()
+
+            self.ended = time.time()
+            self.write_manifest()
+
+            if shutdown and self.process is not None and self.process.is_alive():
+                try:
+                    self.client.shutdown(block=True)
+                except Exception as ex:
+                    logger.warning(f"SpikeRecorder didn't acknowledge shutdown: {ex!r}")
+                self._reap(timeout=10.0)
+
+        self.client.close()
+
+    def manifest(self) -> dict:
+        """
+        The session manifest, as written to manifest_path.
+
+        Returns:
+            A dictionary of the session's name, start and end times, restarts, segments and gaps.
+            Times are seconds since the epoch.
+        """
+        return {
+            'name': self.name,
+            'endpoint': self.endpoint,
+            'started': self.started,
+            'ended': self.ended,
+            'restarts': self.restarts,
+            'failed': self.failed,
+            'segments': [attr.asdict(segment) for segment in self.segments],
+            'gaps': [dict(attr.asdict(gap), duration=gap.duration) for gap in self.gaps],
+        }
+
+    def write_manifest(self):
+        """
+        Write the manifest, replacing the previous one in a single step so a crash of this
+        process never leaves it half written.
+
+        Returns:
+            None
+        """
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest(), f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _launch(self):
+        """
+        Start the recorder process and wait until it answers.
+        """
+        from spike_recorder.server import NativeLog, prepare_log, run_application
+
+        kwargs = {'endpoint': self.endpoint}
+
+        # Otherwise the native application writes byb.log into the package directory.
+        log = prepare_log(NativeLog(log_dir=self.log_dir)) if self.target is run_application else None
+        if log:
+            kwargs['log_file_path'] = log.raw_path
+
+        self.process = self.context.Process(target=self.target, kwargs=kwargs)
+        self.process.start()
+        if log:
+            log.start(process=self.process)
+
+        self.client.connect()
+        if not self.client.wait_ready(timeout=self.ready_timeout, heartbeat_grace=self.heartbeat_grace):
+            raise SpikeRecorderUnavailable(f"SpikeRecorder at {self.endpoint} didn't come up "
+                                           f"within {self.ready_timeout} seconds.")
+
+    def _reap(self, timeout: float = 2.0):
+        """
+        Wait for the recorder process to exit, killing it if it doesn't.
+        """
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def _start_segment(self):
+        """
+        Start recording the next segment.
+        """
+        index = len(self.segments)
+        filename = os.path.join(self.session_dir, f"{self.name}-{index:03d}.wav")
+
+        files = self.client.start_record(filename)
+        files = self.client.wait_recording_started() or files
+        if files is None:
+            files = RecordingFiles(wav_path=filename, events_path=None)
+
+        self._last_alive = time.time()
+        self.segments.append(Segment(index=index, wav_path=files.wav_path, events_path=files.events_path,
+                                     started=self._last_alive, restart=self.restarts))
+        self.write_manifest()
+        logger.info(f"Recording segment {index} to {files.wav_path}")
+
+    def _watch(self):
+        missed = 0
+        while not self._stop_event.wait(self.check_interval):
+            with self._lock:
+                if not self.process.is_alive():
+                    logger.error(f"SpikeRecorder exited with code {self.process.exitcode}, restarting.")
+                    reason = "exited"
+                elif not self.client.answers_heartbeat:
+                    self._last_alive = time.time()
+                    continue
+                elif self.client.heartbeat():
+                    missed = 0
+                    self._last_alive = time.time()
+                    continue
+                else:
+                    missed = missed + 1
+                    if missed < self.max_missed_heartbeats:
+                        continue
+                    logger.error(f"SpikeRecorder missed {missed} heartbeats, restarting.")
+                    reason = "unresponsive"
+
+                missed = 0
+                if not self._restart(reason):
+                    return
+
+    def _restart(self, reason: str) -> bool:
+        """
+        Close the dead segment, relaunch the recorder and record the next segment.
+
+        Returns:
+            False if the recorder couldn't be restarted and the supervisor has given up.
+        """
+        segment = self.segment
+        if segment is not None:
+            segment.ended = self._last_alive
+        gap_start = self._last_alive
+
+        self._reap()
+
+        while self.restarts < self.max_restarts and not self._stop_event.is_set():
+            self.restarts = self.restarts + 1
+            try:
+                self._launch()
+                self._start_segment()
+            except Exception as ex:
+                logger.error(f"Restart {self.restarts} of SpikeRecorder failed: {ex!r}")
+                if self.process is not None and self.process.is_alive():
+                    self._reap()
+                continue
+
+            gap = Gap(start=gap_start, end=self.segment.started, reason=reason)
+            self.gaps.append(gap)
+            self.write_manifest()
+            logger.warning(f"SpikeRecorder restarted, {gap.duration:.2f} seconds not recorded.")
+
+            if self.on_restart is not None:
+                self.on_restart(gap)
+            return True
+
+        self.failed = True
+        self.write_manifest()
+        logger.error(f"Gave up on SpikeRecorder after {self.restarts} restarts.")
+        return False
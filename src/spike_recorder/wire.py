@@ -0,0 +1,262 @@
+"""
+Wire encodings for CommandMsg.
+
+Two encodings are supported, plain JSON, which is what the SpikeRecorder application has always
+spoken, and a compact binary encoding. The client and server agree on one with a NEGOTIATE
+command when connecting and fall back to JSON if the server doesn't understand it.
+
+A binary frame is a fixed header followed by the message's fields and an optional JSON tail:
+
+    magic (u8) | version (u8) | type code (u8) | field flags (u8) | fields ... | JSON tail
+
+Each CommandType has a fixed schema of args fields. Bit i of the flags is set when field i of
+the schema is present in the frame. Any args that don't fit the schema are carried in the JSON
+tail, so every CommandMsg survives a round trip even if its type has no binary fast path.
+"""
+import json
+import struct
+
+from typing import Any, Dict, List, Tuple
+
+from spike_recorder.protocol import CommandMsg, CommandType
+
+MAGIC = 0xB5
+VERSION = 1
+
+_HEADER = struct.Struct("<BBBB")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_MARKER = struct.Struct("<qH")
+
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+
+def _is_str(value) -> bool:
+    return isinstance(value, str)
+
+
+def _is_int64(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and _INT64_MIN <= value <= _INT64_MAX
+
+
+def _is_float(value) -> bool:
+    return isinstance(value, float)
+
+
+def _is_marker_list(value) -> bool:
+    return isinstance(value, list) and all(
+        isinstance(m, dict) and m.keys() == {'name', 'client_timestamp'} and
+        _is_str(m['name']) and _is_int64(m['client_timestamp']) for m in value)
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode()
+    return _U32.pack(len(data)) + data
+
+
+def _unpack_str(buf: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _U32.unpack_from(buf, offset)
+    offset = offset + _U32.size
+    return buf[offset:offset + length].decode(), offset + length
+
+
+def _pack_int64(value: int) -> bytes:
+    return _I64.pack(value)
+
+
+def _unpack_int64(buf: bytes, offset: int) -> Tuple[int, int]:
+    return _I64.unpack_from(buf, offset)[0], offset + _I64.size
+
+
+def _pack_float(value: float) -> bytes:
+    return _F64.pack(value)
+
+
+def _unpack_float(buf: bytes, offset: int) -> Tuple[float, int]:
+    return _F64.unpack_from(buf, offset)[0], offset + _F64.size
+
+
+def _pack_marker_list(value: List[Dict]) -> bytes:
+    parts = [_U32.pack(len(value))]
+    for marker in value:
+        name = marker['name'].encode()
+        parts.append(_MARKER.pack(marker['client_timestamp'], len(name)))
+        parts.append(name)
+    return b''.join(parts)
+
+
+def _unpack_marker_list(buf: bytes, offset: int) -> Tuple[List[Dict], int]:
+    (count,) = _U32.unpack_from(buf, offset)
+    offset = offset + _U32.size
+    markers = []
+    for i in range(count):
+        client_timestamp, length = _MARKER.unpack_from(buf, offset)
+        offset = offset + _MARKER.size
+        markers.append({'name': buf[offset:offset + length].decode(), 'client_timestamp': client_timestamp})
+        offset = offset + length
+    return markers, offset
+
+
+# The field kinds, (type check, packer, unpacker)
+_FIELD_KINDS = {
+    's': (_is_str, _pack_str, _unpack_str),
+    'q': (_is_int64, _pack_int64, _unpack_int64),
+    'd': (_is_float, _pack_float, _unpack_float),
+    'M': (_is_marker_list, _pack_marker_list, _unpack_marker_list),
+}
+
+# Stable one byte codes for each message type. Codes must never be reused, append new types
+# at the end. Types without a code are sent as JSON even when the binary encoding is in use.
+_TYPE_CODES = {
+    CommandType.START_RECORD: 1,
+    CommandType.STOP_RECORD: 2,
+    CommandType.PUSH_EVENT_MARKER: 3,
+    CommandType.SHUTDOWN: 4,
+    CommandType.REPLY_OK: 5,
+    CommandType.REPLY_ERROR: 6,
+    CommandType.PUSH_EVENT_MARKERS: 7,
+    CommandType.PING: 8,
+    CommandType.HEARTBEAT: 9,
+    CommandType.STATUS: 10,
+}
+
+# The args fields with a binary fast path for each message type, (name, kind)
+_SCHEMAS = {
+    CommandType.START_RECORD: (('filename', 's'),),
+    CommandType.PUSH_EVENT_MARKER: (('name', 's'), ('client_timestamp', 'q')),
+    CommandType.PUSH_EVENT_MARKERS: (('markers', 'M'),),
+    CommandType.PING: (('client_time_ns', 'q'),),
+    CommandType.REPLY_OK: (('recorder_time_ns', 'q'), ('sample_index', 'q'), ('sample_time', 'd')),
+    CommandType.REPLY_ERROR: (('what', 's'),),
+}
+
+
+class MessageCodec:
+    """
+    A binary encoder and decoder for a single message type, compiled from its schema.
+
+    Args:
+        type: The message type.
+        code: The type's one byte code.
+        fields: The schema, a sequence of (args name, field kind) pairs. At most eight fields.
+    """
+
+    def __init__(self, type: CommandType, code: int, fields: Tuple[Tuple[str, str], ...] = ()):
+        if len(fields) > 8:
+            raise ValueError("A binary message schema supports at most 8 fields.")
+
+        self.type = type
+        self.code = code
+        self._fields = [(name, 1 << i) + _FIELD_KINDS[kind] for i, (name, kind) in enumerate(fields)]
+        self._bits = {name: 1 << i for i, (name, kind) in enumerate(fields)}
+
+    def encode(self, args: Dict[str, Any]) -> bytes:
+        flags = 0
+        parts = [b'']
+        for name, bit, check, pack, unpack in self._fields:
+            if name in args and check(args[name]):
+                flags = flags | bit
+                parts.append(pack(args[name]))
+
+        # Anything that didn't fit the schema goes in the JSON tail
+        if len(parts) - 1 < len(args):
+            extra = {key: value for key, value in args.items() if not flags & self._bits.get(key, 0)}
+            parts.append(json.dumps(extra).encode())
+
+        parts[0] = _HEADER.pack(MAGIC, VERSION, self.code, flags)
+        return b''.join(parts)
+
+    def decode(self, buf: bytes, flags: int) -> Dict[str, Any]:
+        args = {}
+        offset = _HEADER.size
+        for name, bit, check, pack, unpack in self._fields:
+            if flags & bit:
+                args[name], offset = unpack(buf, offset)
+
+        if offset < len(buf):
+            args.update(json.loads(buf[offset:]))
+
+        return args
+
+
+_ENCODERS = {type: MessageCodec(type, code, _SCHEMAS.get(type, ())) for type, code in _TYPE_CODES.items()}
+_DECODERS = {codec.code: codec for codec in _ENCODERS.values()}
+
+
+def decode(data: bytes) -> CommandMsg:
+    """
+    Decode a message in either encoding. Binary frames are recognised by their leading magic byte,
+    anything else is parsed as (possibly null terminated) JSON.
+
+    Args:
+        data: The raw bytes of the message frame.
+
+    Returns:
+        The decoded CommandMsg.
+    """
+    if not data or data[0] != MAGIC:
+        return CommandMsg.from_reply(data)
+
+    magic, version, code, flags = _HEADER.unpack_from(data, 0)
+
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary message version {version}.")
+
+    codec = _DECODERS.get(code)
+    if codec is None:
+        raise ValueError(f"Unknown binary message type code {code}.")
+
+    return CommandMsg(type=codec.type, args=codec.decode(bytes(data), flags))
+
+
+class JsonCodec:
+    """
+    The JSON wire encoding, understood by every version of the SpikeRecorder application.
+    """
+    name = "json"
+
+    def encode(self, msg: CommandMsg) -> bytes:
+        return msg.to_json().encode()
+
+    def decode(self, data: bytes) -> CommandMsg:
+        return decode(data)
+
+
+class BinaryCodec:
+    """
+    The binary wire encoding, see the module documentation for the frame layout.
+    """
+    name = "binary"
+
+    def encode(self, msg: CommandMsg) -> bytes:
+        codec = _ENCODERS.get(msg.type)
+        if codec is None:
+            return msg.to_json().encode()
+        return codec.encode(msg.args)
+
+    def decode(self, data: bytes) -> CommandMsg:
+        return decode(data)
+
+
+JSON = JsonCodec()
+BINARY = BinaryCodec()
+
+ENCODINGS = {codec.name: codec for codec in (JSON, BINARY)}
+
+
+def get_codec(name: str):
+    """
+    Get the codec for an encoding name.
+
+    Args:
+        name: The name of the encoding, "json" or "binary".
+
+    Returns:
+        The codec instance.
+    """
+    try:
+        return ENCODINGS[name]
+    except KeyError:
+        raise ValueError(f"Unknown wire encoding '{name}', must be one of {list(ENCODINGS)}.")
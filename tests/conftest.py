@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+import zmq
+
+from spike_recorder.protocol import CommandMsg, CommandType
+from spike_recorder import wire
+
+
+class EchoServer(threading.Thread):
+    """
+    A minimal stand in for the SpikeRecorder application command server. It replies to every
+    command after a fixed delay, with a null terminated reply like the real application.
+    """
+    def __init__(self, delay=0.0, encodings=("json",), clock_offset_ns=0, endpoint="tcp://*:5555"):
+        super().__init__(daemon=True)
+        self.delay = delay
+        self.clock_offset_ns = clock_offset_ns
+        self.encodings = encodings
+        self.codec = wire.JSON
+        self.received = []
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.REP)
+        self.socket.bind(endpoint)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if not self.socket.poll(10):
+                continue
+            msg = wire.decode(self.socket.recv())
+            self.received.append(msg)
+            time.sleep(self.delay)
+            codec = self.codec
+            if msg.args.get('name') == "bad":
+                reply = CommandMsg(type=CommandType.REPLY_ERROR, args={'what': "bad marker"})
+            elif msg.type == CommandType.NEGOTIATE:
+                chosen = [e for e in msg.args['encodings'] if e in self.encodings]
+                if chosen:
+                    reply = CommandMsg(type=CommandType.REPLY_OK, args={'encoding': chosen[0]})
+                    self.codec = wire.get_codec(chosen[0])
+                else:
+                    reply = CommandMsg(type=CommandType.REPLY_ERROR, args={'what': "no common encoding"})
+            elif msg.type == CommandType.PING:
+                reply = CommandMsg(type=CommandType.REPLY_OK,
+                                   args={'recorder_time_ns': time.perf_counter_ns() + self.clock_offset_ns})
+            else:
+                reply = CommandMsg(type=CommandType.REPLY_OK)
+
+            data = codec.encode(reply)
+            if codec is wire.JSON:
+                data = data + b'\0'
+            self.socket.send(data)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.socket.close()
+        self.context.term()
+
+
+@pytest.fixture
+def echo_server():
+    server = EchoServer(delay=0.01)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def reference_server(tmp_path):
+    from spike_recorder.server.reference import ReferenceServer, SyntheticSource
+
+    server = ReferenceServer(endpoint="tcp://127.0.0.1:*", source=SyntheticSource(seed=0),
+                             recordings_dir=str(tmp_path))
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from spike_recorder.client import CommandType, SpikeRecorderUnavailable
+from spike_recorder.async_client import AsyncSpikeRecorder
+
+from conftest import EchoServer
+
+
+def test_async_commands_in_flight(echo_server):
+
+    async def session():
+        recorder = AsyncSpikeRecorder()
+        recorder.connect()
+        try:
+            await recorder.start_record("test.wav")
+            await asyncio.gather(*[recorder.push_event_marker(f"marker{i}") for i in range(10)])
+            await recorder.stop_record()
+        finally:
+            await recorder.close()
+
+    asyncio.run(session())
+
+    types = [msg.type for msg in echo_server.received]
+    assert types[0] == CommandType.START_RECORD
+    assert types[-1] == CommandType.STOP_RECORD
+    names = {msg.args['name'] for msg in echo_server.received[1:-1]}
+    assert names == {f"marker{i}" for i in range(10)}
+
+
+def test_async_reply_error(echo_server):
+
+    async def session():
+        recorder = AsyncSpikeRecorder()
+        recorder.connect()
+        try:
+            await recorder.push_event_marker("bad")
+        finally:
+            await recorder.close()
+
+    with pytest.raises(Exception, match="Command Error"):
+        asyncio.run(session())
+
+
+@pytest.mark.parametrize("server_encodings,expected", [(("json", "binary"), "binary"), (("json",), "json")])
+def test_async_negotiate(server_encodings, expected):
+    server = EchoServer(encodings=server_encodings)
+    server.start()
+
+    async def session():
+        recorder = AsyncSpikeRecorder()
+        recorder.connect(encoding="binary")
+        try:
+            await asyncio.gather(*[recorder.push_event_marker(f"marker{i}") for i in range(5)])
+            return recorder.codec.name
+        finally:
+            await recorder.close()
+
+    try:
+        assert asyncio.run(session()) == expected
+    finally:
+        server.stop()
+
+    # Every command waits on the one negotiation.
+    types = [msg.type for msg in server.received]
+    assert types == [CommandType.NEGOTIATE] + [CommandType.PUSH_EVENT_MARKER] * 5
+    assert {msg.args['name'] for msg in server.received[1:]} == {f"marker{i}" for i in range(5)}
+
+
+def test_async_unavailable():
+
+    async def session():
+        recorder = AsyncSpikeRecorder()
+        recorder.timeout = 0.05
+        recorder.connect()
+        try:
+            await recorder.push_event_marker("nobody home")
+        finally:
+            await recorder.close()
+
+    with pytest.raises(SpikeRecorderUnavailable):
+        asyncio.run(session())
@@ -11,5 +11,8 @@ def test_json_serialize():
     check_round_trip(CommandMsg(type=CommandType.START_RECORD, args={"filename": "test"}))
     check_round_trip(CommandMsg(type=CommandType.STOP_RECORD))
     check_round_trip(CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={"name": "test2"}))
+    check_round_trip(CommandMsg(type=CommandType.PUSH_EVENT_MARKERS,
+                                args={"markers": [{"name": "a", "client_timestamp": 1},
+                                                  {"name": "b", "client_timestamp": 2}]}))
     check_round_trip(CommandMsg(type=CommandType.REPLY_OK))
     check_round_trip(CommandMsg(type=CommandType.REPLY_ERROR, args={"what": "blah blah"}))
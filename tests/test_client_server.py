@@ -1,4 +1,3 @@
-import time
 import os
 import pytest
 
@@ -12,10 +11,10 @@ def test_client(tmp_path):
     Integrated test of SpikeRecorder client server
 
         - Launches server application.
-        - Connects
+        - Connects, and waits for it to answer
         - Starts a recording
         - Sends some event markers
-        - Stops the recording
+        - Stops the recording, and waits for the files to be saved
         - Shuts things down
 
     """
@@ -27,30 +26,26 @@ def test_client(tmp_path):
     recorder_client.launch()
     recorder_client.connect()
 
-    # Give things time to show up, takes a decent time on mac
-    time.sleep(10)
+    # Startup takes a decent time on mac
+    assert recorder_client.wait_ready(timeout=60.0)
 
     # Start a recording
     recorder_client.start_record(wav_file_name)
-
-    time.sleep(3)
+    recorder_client.wait_recording_started()
 
     # Push some event markers
     recorder_client.push_event_marker("Hello")
-    time.sleep(1)
     recorder_client.push_event_marker("World!")
-    time.sleep(3)
 
     # Stop recording
-    recorder_client.stop_record()
-
-    time.sleep(3)
+    files = recorder_client.stop_record(wait_finalized=True)
 
     # Make sure the recording session WAV and events txt is there.
     assert os.path.isfile(wav_file_name)
     assert os.path.isfile(event_file_name)
+    if files is not None:
+        assert files.wav_path == wav_file_name
+        assert files.events_path == event_file_name
 
     # Shutdown
     recorder_client.shutdown()
-
-
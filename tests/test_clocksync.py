@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.protocol import SpikeRecorderUnavailable
+from spike_recorder.clocksync import ClockSynchronizer
+
+from conftest import EchoServer
+
+
+class FakeClocks:
+    """
+    Simulated client and recorder clocks. The recorder runs offset_ns ahead of the client and
+    gains drift nanoseconds per nanosecond. Every other ping has a slow reply leg.
+    """
+    def __init__(self, offset_ns, drift):
+        self.offset_ns = offset_ns
+        self.drift = drift
+        self.now = 1_000_000_000
+        self.pings = 0
+
+    def recorder_time(self, client_ns):
+        return int(client_ns + self.offset_ns + self.drift * client_ns)
+
+    def ping(self):
+        self.pings += 1
+        t0 = self.now
+        recorder = self.recorder_time(t0 + 100_000)
+        slow = 5_000_000 if self.pings % 2 else 0
+        t3 = t0 + 200_000 + slow
+        self.now = t3 + 1_000_000
+        return t0, recorder, t3
+
+
+def test_offset_and_uncertainty():
+    clocks = FakeClocks(offset_ns=3_000_000, drift=0.0)
+    sync = ClockSynchronizer(ping=clocks.ping, num_pings=4)
+
+    estimate = sync.synchronize()
+
+    # The fast ping is symmetric so the offset is exact, the uncertainty is half its round trip.
+    assert estimate.offset_ns == pytest.approx(3_000_000)
+    assert estimate.uncertainty_ns == 100_000
+    assert estimate.drift == 0.0
+    assert clocks.pings == 4
+
+
+def test_drift():
+    clocks = FakeClocks(offset_ns=-2_000_000, drift=50e-6)
+    sync = ClockSynchronizer(ping=clocks.ping, num_pings=2)
+
+    for i in range(5):
+        estimate = sync.synchronize()
+        clocks.now = clocks.now + 10_000_000_000
+
+    assert estimate.drift == pytest.approx(50e-6, rel=1e-3)
+
+    client_ns = clocks.now + 60_000_000_000
+    assert estimate.to_recorder_time(client_ns) == pytest.approx(clocks.recorder_time(client_ns), abs=1000)
+    assert estimate.to_client_time(estimate.to_recorder_time(client_ns)) == pytest.approx(client_ns)
+
+
+def test_sync_on_connect():
+    server = EchoServer(clock_offset_ns=250_000_000)
+    server.start()
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect(sync_clock=True)
+        estimate = recorder.clock_estimate
+        assert abs(estimate.offset_ns - 250_000_000) <= estimate.uncertainty_ns + 1_000_000
+
+        recorder.push_event_marker("stamped")
+        assert isinstance(server.received[-1].args['client_timestamp'], int)
+    finally:
+        recorder.close()
+        server.stop()
+
+
+def test_sync_no_server():
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        recorder.clock.num_pings = 1
+        assert recorder.sync_clock() is None
+        assert recorder.clock_estimate is None
+    finally:
+        recorder.close()
+
+
+def test_refresh_off_the_marker_path():
+    server = EchoServer()
+    server.start()
+    recorder = SpikeRecorder(clock_sync_interval=0.05)
+    try:
+        recorder.connect(sync_clock=True)
+        assert recorder.clock_estimate is not None
+
+        # The recorder stops answering pings after the first sync. Markers must not wait on the
+        # refresh, and a failing refresh must not be retried on every marker.
+        bursts = []
+
+        def stalled():
+            bursts.append(threading.current_thread().name)
+            time.sleep(0.3)
+            raise SpikeRecorderUnavailable()
+
+        recorder.clock.synchronize = stalled
+        time.sleep(0.1)
+
+        start = time.monotonic()
+        for i in range(50):
+            recorder.push_event_marker(f"m{i}")
+            time.sleep(0.01)
+        assert time.monotonic() - start < 0.5 + 0.3
+
+        time.sleep(0.3)
+        assert bursts and set(bursts) == {"SpikeRecorderClockSync"}
+        assert len(bursts) <= 2
+    finally:
+        recorder.close()
+        server.stop()
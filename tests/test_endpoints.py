@@ -0,0 +1,65 @@
+import sys
+
+import pytest
+
+from spike_recorder.client import SpikeRecorder, SpikeRecorderUnavailable
+from spike_recorder.protocol import make_endpoint, bind_endpoint
+
+from conftest import EchoServer
+
+
+def test_make_endpoint(tmp_path):
+    assert make_endpoint() == "tcp://localhost:5555"
+    assert make_endpoint(host="10.0.0.2", port=6000) == "tcp://10.0.0.2:6000"
+    assert make_endpoint("ipc", path=str(tmp_path / "rec.ipc")) == f"ipc://{tmp_path / 'rec.ipc'}"
+    assert make_endpoint("ipc").endswith("spike-recorder-5555.ipc")
+
+    with pytest.raises(ValueError):
+        make_endpoint("udp")
+
+
+def test_bind_endpoint():
+    assert bind_endpoint("tcp://localhost:6000") == "tcp://127.0.0.1:6000"
+    assert bind_endpoint("ipc:///tmp/a.ipc") == "ipc:///tmp/a.ipc"
+
+
+def test_native_launch_only_on_default_port():
+    import argparse
+
+    from spike_recorder.protocol import DEFAULT_PORT
+    from spike_recorder.server import add_endpoint_args, endpoint_from_args, launch
+
+    parser = argparse.ArgumentParser()
+    add_endpoint_args(parser)
+    assert endpoint_from_args(parser.parse_args([])) == make_endpoint(port=DEFAULT_PORT)
+
+    # The application ignores the endpoint, it would never answer on these.
+    for endpoint in (make_endpoint("ipc"), make_endpoint(port=6000)):
+        with pytest.raises(ValueError):
+            launch(is_async=True, endpoint=endpoint, log=False)
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="ipc:// transport is not available on Windows.")
+def test_ipc_transport(tmp_path):
+    endpoint = make_endpoint("ipc", path=str(tmp_path / "recorder.ipc"))
+    server = EchoServer(endpoint=endpoint)
+    server.start()
+    recorder = SpikeRecorder(endpoint=endpoint)
+    try:
+        recorder.connect()
+        recorder.push_event_marker("over ipc")
+        assert server.received[-1].args['name'] == "over ipc"
+    finally:
+        recorder.close()
+        server.stop()
+
+
+def test_timeout():
+    recorder = SpikeRecorder(endpoint="tcp://localhost:5556", timeout_ms=20)
+    try:
+        recorder.connect()
+        with pytest.raises(SpikeRecorderUnavailable):
+            recorder.push_event_marker("nobody home")
+        assert recorder.stats()['PUSH_EVENT_MARKER']['timeouts'] == 1
+    finally:
+        recorder.close()
@@ -0,0 +1,93 @@
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from spike_recorder.epochs import extract_epochs
+from spike_recorder.recording import Markers, Recording
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = str(tmp_path / "libet.wav")
+    samples = (np.arange(3 * 10000) % 30000).astype(np.int16).reshape(10000, 3)
+    samples[:, 2] = -samples[:, 2]
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(3)
+        wav.setsampwidth(2)
+        wav.setframerate(1000)
+        wav.writeframes(samples.tobytes())
+
+    markers = [("Trial 1: Stop", 50), ("Trial 1: Next", 500), ("Trial 2: Stop", 2000), ("Trial 2: Retry", 2500),
+               ("Trial 3: Stop", 6000), ("Trial 4: Stop", 9950)]
+    with open(os.path.splitext(path)[0] + "-events.txt", 'w') as f:
+        f.write("# Marker IDs can be arbitrary strings.\n")
+        f.write("# Marker ID,\tTime (in s)\n")
+        for name, sample_index in markers:
+            f.write(f"{name},\t{sample_index / 1000:.4f}\n")
+
+    with Recording(path) as recording:
+        yield recording
+
+
+def test_epochs_pad(recording):
+    epochs = extract_epochs(recording, r"Trial \d+: Stop", before=0.1, after=0.2)
+
+    assert epochs.data.shape == (4, 3, 300)
+    assert epochs.data.dtype == np.float32
+    assert list(epochs.labels) == ["Trial 1: Stop", "Trial 2: Stop", "Trial 3: Stop", "Trial 4: Stop"]
+    np.testing.assert_array_equal(epochs.sample_indices, [50, 2000, 6000, 9950])
+    np.testing.assert_array_equal(epochs.truncated, [True, False, False, True])
+    np.testing.assert_allclose(epochs.times[[0, 100, 299]], [-0.1, 0.0, 0.199])
+
+    samples = np.asarray(recording.samples)
+    np.testing.assert_array_equal(epochs.data[1], samples[1900:2200].T)
+    np.testing.assert_array_equal(epochs.data[2], samples[5900:6200].T)
+
+    # The first starts before the recording, the last ends after it.
+    assert np.isnan(epochs.data[0, :, :50]).all()
+    np.testing.assert_array_equal(epochs.data[0, :, 50:], samples[0:250].T)
+    np.testing.assert_array_equal(epochs.data[3, :, :150], samples[9850:].T)
+    assert np.isnan(epochs.data[3, :, 150:]).all()
+
+
+def test_epochs_drop_channels_baseline(recording):
+    epochs = recording.epochs(r"Stop$", before=0.1, after=0.2, truncated="drop", channels=[2, 0],
+                              baseline=(-0.1, 0.0), dtype=np.float64)
+
+    assert epochs.data.shape == (2, 2, 300)
+    np.testing.assert_array_equal(epochs.channels, [2, 0])
+    np.testing.assert_array_equal(epochs.sample_indices, [2000, 6000])
+    assert not epochs.truncated.any()
+
+    samples = np.asarray(recording.samples, dtype=np.float64)
+    expected = samples[1900:2200][:, [2, 0]].T
+    expected = expected - expected[:, :100].mean(axis=1, keepdims=True)
+    np.testing.assert_allclose(epochs.data[0], expected)
+    np.testing.assert_allclose(epochs.data[:, :, :100].mean(axis=2), 0, atol=1e-9)
+
+    assert len(epochs.select(epochs.sample_indices > 3000)) == 1
+
+
+def test_epochs_many(recording):
+    # Thousands of overlapping epochs, gathered in batches, match a loop over them.
+    indices = np.random.default_rng(0).integers(100, 9800, size=3000)
+    markers = Markers(["m"] * len(indices), indices / 1000, sample_rate=1000)
+
+    epochs = extract_epochs(recording, markers, before=0.1, after=0.1, batch_size=100, dtype=np.int16,
+                            truncated="drop")
+    samples = np.asarray(recording.samples)
+    expected = np.stack([samples[i - 100:i + 100].T for i in markers.sample_indices])
+    np.testing.assert_array_equal(epochs.data, expected)
+
+
+def test_epochs_errors(recording):
+    with pytest.raises(ValueError):
+        extract_epochs(recording, truncated="clip")
+    with pytest.raises(ValueError):
+        extract_epochs(recording, dtype=np.int16)
+    with pytest.raises(ValueError):
+        extract_epochs(recording, before=0.1, after=0.1, baseline=(-0.5, 0.0))
+
+    assert len(extract_epochs(recording, "no such marker")) == 0
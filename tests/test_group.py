@@ -0,0 +1,86 @@
+import wave
+
+import pytest
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.group import RecorderGroup
+from spike_recorder.protocol import SpikeRecorderUnavailable
+from spike_recorder.server.reference import ReferenceServer
+
+
+@pytest.fixture
+def reference_servers(tmp_path):
+    servers = [ReferenceServer(endpoint="tcp://127.0.0.1:*", recordings_dir=str(tmp_path)) for i in range(3)]
+    for server in servers:
+        server.start()
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def test_group_broadcast(reference_servers, tmp_path):
+    group = RecorderGroup([server.endpoint for server in reference_servers])
+    try:
+        assert all(r.ok for r in group.connect().values())
+
+        results = group.start_record(str(tmp_path.joinpath("rig{index}.wav")))
+        assert list(results) == group.endpoints
+        assert all(r.ok and r.latency_ms > 0 for r in results.values())
+
+        group.push_event_marker("Hello")
+        group.stop_record()
+    finally:
+        group.close()
+
+    for i, server in enumerate(reference_servers):
+        with wave.open(str(tmp_path.joinpath(f"rig{i}.wav")), 'rb') as wav:
+            assert wav.getnchannels() == 1
+        with open(tmp_path.joinpath(f"rig{i}-events.txt")) as f:
+            assert f.read().splitlines()[-1].startswith("Hello,")
+
+    # Every recorder got the same client timestamp
+    timestamps = {server.received[-2].args['client_timestamp'] for server in reference_servers}
+    assert len(timestamps) == 1
+
+
+def test_group_partial_failure(reference_servers):
+    endpoints = [server.endpoint for server in reference_servers[:2]] + ["tcp://127.0.0.1:5598"]
+    group = RecorderGroup(endpoints, timeout_ms=100)
+    try:
+        group.connect()
+        results = group.push_event_marker("Hello")
+    finally:
+        group.close()
+
+    assert [r.ok for r in results.values()] == [True, True, False]
+    assert isinstance(results[endpoints[2]].error, SpikeRecorderUnavailable)
+
+    # The missing recorder doesn't hold the others up by more than its own timeout
+    assert results[endpoints[2]].latency_ms >= 100
+
+
+def test_group_filenames():
+    with pytest.raises(ValueError):
+        RecorderGroup(["tcp://localhost:5555", "tcp://localhost:5555"])
+
+    group = RecorderGroup(["tcp://localhost:5555", "tcp://localhost:5556"])
+    try:
+        with pytest.raises(ValueError):
+            group.start_record(["only_one.wav"])
+    finally:
+        group.close()
+
+
+@pytest.mark.parametrize("endpoints", [["tcp://localhost:5555", "tcp://localhost:5556"], ["ipc:///tmp/rig.ipc"]])
+def test_group_launch_refused(endpoints, monkeypatch):
+    launched = []
+    monkeypatch.setattr(SpikeRecorder, "launch", staticmethod(lambda endpoint=None: launched.append(endpoint)))
+
+    group = RecorderGroup(endpoints)
+    try:
+        with pytest.raises(ValueError):
+            group.launch()
+        assert launched == []
+        assert group.processes == {}
+    finally:
+        group.close()
@@ -0,0 +1,52 @@
+"""
+Import time regression test. Processes that only talk to a running recorder import
+spike_recorder.client, that must stay cheap and must not drag in the native application.
+"""
+import os
+import subprocess
+import sys
+
+import spike_recorder
+
+# Budget for the cumulative import time of spike_recorder.client, in microseconds, as reported by
+# python -X importtime. Most of it is zmq.
+IMPORT_BUDGET_US = 300000
+
+# Modules the client must not import.
+HEAVY_MODULES = ("spike_recorder.server", "spike_recorder.server._core", "multiprocessing", "numpy", "pandas",
+                 "PyQt5")
+
+
+def import_client(module="spike_recorder.client"):
+    env = dict(os.environ)
+    src = os.path.dirname(os.path.dirname(os.path.abspath(spike_recorder.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([src] + [p for p in [env.get('PYTHONPATH')] if p])
+
+    code = (f"import sys; import {module}; "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    cumulative = None
+    for line in result.stderr.splitlines():
+        fields = [f.strip() for f in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            cumulative = int(fields[1])
+
+    return cumulative, result.stdout.strip()
+
+
+def test_client_import_time():
+    # Best of a few runs to keep scheduler noise out of it.
+    runs = [import_client() for i in range(3)]
+
+    for cumulative, loaded in runs:
+        assert loaded == "[]", f"spike_recorder.client imported {loaded}"
+
+    best = min(cumulative for cumulative, loaded in runs)
+    assert best < IMPORT_BUDGET_US, f"import spike_recorder.client took {best / 1000:.1f} ms"
+
+
+def test_async_client_imports_light():
+    cumulative, loaded = import_client("spike_recorder.async_client")
+    assert loaded == "[]", f"spike_recorder.async_client imported {loaded}"
@@ -0,0 +1,106 @@
+import argparse
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+
+from spike_recorder.experiments.app_runner import run_kiosk, launch_recorder, add_attach_args, check_recorder_args
+from spike_recorder.experiments.libet.app import LibetMainWindow, IntroDialog
+from spike_recorder.qt_client import QtSpikeRecorder
+from spike_recorder.server import add_endpoint_args, endpoint_from_args
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication([])
+    yield app
+    app.setQuitOnLastWindowClosed(True)
+
+
+def test_kiosk_reuses_recorder(qapp, reference_server, tmp_path):
+    record_client = QtSpikeRecorder(endpoint=reference_server.endpoint)
+    record_client.connect()
+
+    windows = []
+
+    def make_session(client):
+        ui = LibetMainWindow(spike_record=True, record_client=client, exit_on_close=False)
+        intro_d = IntroDialog(parent=ui)
+        windows.append(ui)
+
+        # Stand in for the participant, accept the instructions then run one trial and close. Not
+        # before run_session waits on the window, a slow dialog can let the timer fire early.
+        def participate():
+            if not ui.testAttribute(QtCore.Qt.WA_DeleteOnClose):
+                QtCore.QTimer.singleShot(10, participate)
+                return
+            ui.record_event_marker(f"Session {len(windows)}")
+            ui.close()
+
+        QtCore.QTimer.singleShot(0, intro_d.accept)
+        QtCore.QTimer.singleShot(50, participate)
+        return ui, intro_d
+
+    filenames = [str(tmp_path / "libet_p1.csv"), str(tmp_path / "libet_p2.csv")]
+    sessions = run_kiosk(qapp, make_session, record_client=record_client, filenames=filenames)
+
+    assert sessions == 2
+    assert len(windows) == 2
+
+    # One recorder, one recording per participant, each with its own markers.
+    for i, filename in enumerate(filenames):
+        wav = os.path.splitext(filename)[0] + ".wav"
+        assert os.path.exists(wav)
+        with open(os.path.splitext(filename)[0] + "-events.txt") as f:
+            assert f"Session {i + 1}" in f.read()
+
+    # The ledger and statistics only cover the last participant.
+    assert [entry.label for entry in record_client.ledger] == ["Session 2"]
+    assert record_client.stats()['PUSH_EVENT_MARKER']['sent'] == 1
+
+    # Shut down at the end of the kiosk, not after each session.
+    assert reference_server.wait(timeout=5.0)
+    record_client.close()
+
+
+def test_kiosk_stops_when_cancelled(qapp):
+    made = []
+
+    def make_session(client):
+        ui = LibetMainWindow(spike_record=False, exit_on_close=False)
+        intro_d = IntroDialog(parent=ui)
+        made.append(ui)
+        QtCore.QTimer.singleShot(0, intro_d.reject)
+        return ui, intro_d
+
+    assert run_kiosk(qapp, make_session) == 0
+    assert len(made) == 1
+
+
+def test_attach_to_running_recorder(qapp, reference_server):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spike-record', action='store_true')
+    add_endpoint_args(parser)
+    add_attach_args(parser)
+
+    # The application can't be launched on ipc, only a recorder already running there can be used.
+    with pytest.raises(SystemExit):
+        check_recorder_args(parser, parser.parse_args(["--spike-record", "--transport", "ipc"]))
+    with pytest.raises(ValueError):
+        launch_recorder("ipc:///tmp/spike-recorder-test.ipc", 100)
+
+    args = parser.parse_args(["--spike-record", "--attach", "--endpoint", reference_server.endpoint])
+    check_recorder_args(parser, args)
+    record_client = launch_recorder(endpoint_from_args(args), 500, attach=args.attach)
+    try:
+        assert record_client.client.alive
+        record_client.push_event_marker("attached")
+        assert record_client.wait_idle()
+        assert [entry.label for entry in record_client.ledger] == ["attached"]
+    finally:
+        record_client.close()
@@ -0,0 +1,104 @@
+import csv
+import time
+
+import numpy as np
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.ledger import MarkerLedger
+from spike_recorder.recording import Recording
+
+
+def test_ledger_export(tmp_path):
+    ledger = MarkerLedger()
+    ledger.append("Hello", 100, 2000, 0.2)
+    ledger.append("World!", 200)
+
+    table = ledger.to_numpy()
+    assert table.dtype.names == MarkerLedger.FIELDS
+    assert list(table['label']) == ["Hello", "World!"]
+    assert list(table['sample_index']) == [2000, -1]
+    assert table['sample_time'][0] == 0.2 and np.isnan(table['sample_time'][1])
+
+    csv_file = tmp_path.joinpath("ledger.csv")
+    ledger.to_csv(str(csv_file))
+    with open(csv_file, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [list(MarkerLedger.FIELDS), ["Hello", "100", "2000", "0.2"], ["World!", "200", "", ""]]
+
+    assert len(MarkerLedger().to_numpy()) == 0
+
+    ledger.clear()
+    assert len(ledger) == 0 and list(ledger) == []
+
+
+def test_ledger_matches_events_file(reference_server, tmp_path):
+    wav_file_name = tmp_path.joinpath("test.wav").absolute().as_posix()
+
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect(encoding="binary")
+        recorder.push_event_marker("before")
+        recorder.start_record(wav_file_name)
+        for i in range(3):
+            time.sleep(0.02)
+            recorder.push_event_marker(f"marker{i}")
+        files = recorder.stop_record(wait_finalized=True)
+    finally:
+        recorder.close()
+
+    table = recorder.ledger.to_numpy()
+    assert list(table['label']) == ["before", "marker0", "marker1", "marker2"]
+
+    # Not recording, so no sample
+    assert table['sample_index'][0] == -1
+    assert np.all(np.diff(table['sample_index'][1:]) > 0)
+    np.testing.assert_allclose(table['sample_time'][1:], table['sample_index'][1:] / reference_server.source.sample_rate)
+
+    with open(files.events_path) as f:
+        event_times = [float(line.split(",\t")[1]) for line in f.read().splitlines()[2:]]
+    np.testing.assert_allclose(event_times, table['sample_time'][1:], atol=1e-4)
+
+
+def test_ledger_batched(reference_server):
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint, marker_buffer_size=4, marker_max_delay=None)
+    try:
+        recorder.connect()
+        recorder.start_record()
+        for i in range(4):
+            recorder.push_event_marker(f"marker{i}")
+        recorder.stop_record()
+    finally:
+        recorder.close()
+
+    assert [entry.label for entry in recorder.ledger] == [f"marker{i}" for i in range(4)]
+    assert all(entry.sample_index is not None for entry in recorder.ledger)
+
+
+def test_ledger_estimated_samples(reference_server, tmp_path):
+    wav_file_name = tmp_path.joinpath("test.wav").absolute().as_posix()
+
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect(sync_clock=True)
+        recorder.push_event_marker("before")
+        time.sleep(0.05)
+        files = recorder.start_record(wav_file_name)
+        for i in range(3):
+            time.sleep(0.02)
+            recorder.push_event_marker(f"marker{i}")
+        recorder.stop_record(wait_finalized=True)
+    finally:
+        recorder.close()
+
+    with Recording(files.wav_path) as recording:
+        sample_rate = recording.sample_rate
+        estimated = recorder.ledger.estimate_sample_indices(recorder.clock_estimate, files.start_sample_index,
+                                                            sample_rate)
+
+    assert files.start_sample_index > 0
+    assert estimated[0] < 0
+
+    # The estimate is when each marker was pushed, the acknowledgement when it was handled, a
+    # one way trip later.
+    acknowledged = recorder.ledger.to_numpy()['sample_index'][1:]
+    assert np.all(np.abs(estimated[1:] - acknowledged) <= 0.005 * sample_rate)
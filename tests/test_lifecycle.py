@@ -0,0 +1,131 @@
+import threading
+import time
+import wave
+
+import pytest
+import zmq
+
+from spike_recorder.client import SpikeRecorder, CommandType
+from spike_recorder.protocol import make_endpoint
+from spike_recorder.server.reference import ReferenceServer
+
+from conftest import EchoServer
+
+
+def test_wait_ready(tmp_path):
+    endpoint = make_endpoint("ipc", path=str(tmp_path.joinpath("ready.ipc")))
+    server = ReferenceServer(endpoint=endpoint, recordings_dir=str(tmp_path))
+
+    # The server comes up a little after the client starts waiting.
+    timer = threading.Timer(0.3, server.start)
+    timer.start()
+
+    recorder = SpikeRecorder(endpoint=endpoint, timeout_ms=100)
+    try:
+        recorder.connect()
+        start = time.monotonic()
+        assert recorder.wait_ready(timeout=5.0)
+        assert time.monotonic() - start < 2.0
+    finally:
+        recorder.close()
+        timer.join()
+        server.stop()
+
+
+def test_wait_ready_timeout():
+    recorder = SpikeRecorder(endpoint="tcp://127.0.0.1:5597", timeout_ms=50)
+    try:
+        recorder.connect()
+        assert not recorder.wait_ready(timeout=0.2)
+        assert not recorder.wait_ready(timeout=0.2, heartbeat_grace=0.0)
+    finally:
+        recorder.close()
+
+
+def test_shutdown_without_blocking():
+    recorder = SpikeRecorder(timeout_ms=2000)
+    recorder.connect()
+    recorder.shutdown()
+    recorder.close()
+
+    # The command is still delivered once the application is there.
+    server = EchoServer()
+    server.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while not server.received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [msg.type for msg in server.received] == [CommandType.SHUTDOWN]
+    finally:
+        server.stop()
+
+
+def test_wait_ready_without_heartbeat():
+    """
+    An application that never answers HEARTBEAT is ready once its command socket accepts connections.
+    """
+    context = zmq.Context.instance()
+    silent = context.socket(zmq.ROUTER)
+    silent.setsockopt(zmq.LINGER, 0)
+    port = silent.bind_to_random_port("tcp://127.0.0.1")
+
+    recorder = SpikeRecorder(endpoint=make_endpoint(port=port), timeout_ms=50, heartbeat_interval=1.0)
+    try:
+        recorder.connect()
+        start = time.monotonic()
+        assert recorder.wait_ready(timeout=10.0, heartbeat_grace=0.2)
+        assert time.monotonic() - start < 2.0
+        assert recorder._heartbeat_thread is None
+    finally:
+        recorder.close()
+        silent.close()
+
+
+def test_recording_handshake(reference_server, tmp_path):
+    wav_file_name = tmp_path.joinpath("test.wav").absolute().as_posix()
+
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect()
+        assert recorder.wait_ready(timeout=1.0)
+        status = recorder.status()
+        assert not status['recording'] and not status['finalized']
+
+        files = recorder.start_record(wav_file_name)
+        assert files.wav_path == wav_file_name
+        assert recorder.wait_recording_started() == files
+
+        recorder.push_event_marker("Hello")
+        finished = recorder.stop_record(wait_finalized=True)
+    finally:
+        recorder.close()
+
+    assert finished == files
+    assert finished.events_path == tmp_path.joinpath("test-events.txt").absolute().as_posix()
+
+    # The files are complete the moment stop_record returns
+    with wave.open(finished.wav_path, 'rb') as wav:
+        assert wav.getnframes() > 0
+    with open(finished.events_path) as f:
+        assert f.read().splitlines()[-1].startswith("Hello,")
+
+
+def test_handshake_unsupported(echo_server):
+    """
+    An application that doesn't report its state, a bare REPLY_OK to STATUS, doesn't hold things up.
+    """
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        recorder.start_record("test.wav")
+        assert recorder.wait_recording_started() is None
+
+        # With nothing to go on, the files get the time to be finished the old fixed sleep gave them.
+        start = time.monotonic()
+        assert recorder.stop_record(wait_finalized=True, unreported_delay=0.2) is None
+        assert time.monotonic() - start >= 0.2
+    finally:
+        recorder.close()
+
+    with pytest.raises(ValueError):
+        recorder.stop_record(block=False, wait_finalized=True)
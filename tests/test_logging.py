@@ -0,0 +1,94 @@
+import logging
+import threading
+
+import pytest
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.logs import start_background_logging, stop_background_logging
+from spike_recorder.protocol import CommandMsg
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(threading.current_thread().name)
+        self.records.append(record)
+
+
+@pytest.fixture
+def client_logger():
+    log = logging.getLogger("spike_recorder")
+    level = log.level
+    handler = ListHandler()
+    log.addHandler(handler)
+    yield log, handler
+    log.removeHandler(handler)
+    log.setLevel(level)
+
+
+def test_no_formatting_when_disabled(echo_server, client_logger, monkeypatch):
+    log, handler = client_logger
+    log.setLevel(logging.WARNING)
+
+    reprs = []
+    original = CommandMsg.__repr__
+    monkeypatch.setattr(CommandMsg, "__repr__", lambda self: reprs.append(1) or original(self))
+
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        for i in range(5):
+            recorder.push_event_marker(f"marker{i}")
+    finally:
+        recorder.close()
+
+    assert reprs == []
+    assert handler.records == []
+
+
+def test_structured_records(echo_server, client_logger):
+    log, handler = client_logger
+    log.setLevel(logging.DEBUG)
+
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        recorder.push_event_marker("Hello")
+    finally:
+        recorder.close()
+
+    received = [r for r in handler.records if hasattr(r, 'spike_reply')]
+    assert len(received) == 1
+    assert received[0].spike_command == "PUSH_EVENT_MARKER"
+    assert received[0].spike_reply == "REPLY_OK"
+    assert received[0].spike_latency_ns > 0
+    assert "Hello" not in received[0].getMessage()
+
+
+def test_background_logging(echo_server, client_logger):
+    log, handler = client_logger
+    log.setLevel(logging.DEBUG)
+
+    start_background_logging()
+    try:
+        with pytest.raises(RuntimeError):
+            start_background_logging()
+
+        recorder = SpikeRecorder()
+        try:
+            recorder.connect()
+            recorder.push_event_marker("Hello")
+        finally:
+            recorder.close()
+    finally:
+        stop_background_logging()
+
+    assert handler in log.handlers and log.propagate
+    assert any(getattr(r, 'spike_command', None) == "PUSH_EVENT_MARKER" for r in handler.records)
+
+    # Handlers ran on the listener's thread, not the one that logged
+    assert "MainThread" not in handler.threads
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from spike_recorder.client import EventMarkerBuffer, SpikeRecorder
+
+
+def test_flush_on_size():
+    batches = []
+    buffer = EventMarkerBuffer(flush_callback=batches.append, max_size=3, max_delay=None)
+
+    for i in range(7):
+        buffer.append(f"m{i}", client_timestamp=i)
+
+    assert [[m['name'] for m in batch] for batch in batches] == [["m0", "m1", "m2"], ["m3", "m4", "m5"]]
+    assert len(buffer) == 1
+
+    buffer.flush()
+    assert batches[-1] == [{'name': "m6", 'client_timestamp': 6}]
+    assert len(buffer) == 0
+
+    # Flushing an empty buffer sends nothing
+    buffer.flush()
+    assert len(batches) == 3
+
+
+def test_flush_on_deadline():
+    batches = []
+    buffer = EventMarkerBuffer(flush_callback=batches.append, max_size=100, max_delay=0.05)
+
+    buffer.append("a")
+    buffer.append("b")
+    assert batches == []
+
+    deadline = time.monotonic() + 2.0
+    while not batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert [m['name'] for m in batches[0]] == ["a", "b"]
+    assert batches[0][0]['client_timestamp'] <= batches[0][1]['client_timestamp']
+
+
+def test_bad_size():
+    with pytest.raises(ValueError):
+        EventMarkerBuffer(flush_callback=print, max_size=0)
+
+
+def test_deadline_flushes_share_a_thread():
+    threads = []
+    buffer = EventMarkerBuffer(flush_callback=lambda markers: threads.append(threading.current_thread()),
+                               max_size=100, max_delay=0.01)
+
+    for i in range(3):
+        buffer.append(f"m{i}")
+        deadline = time.monotonic() + 2.0
+        while len(threads) <= i and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    assert len(threads) == 3
+    assert len(set(threads)) == 1
+
+    buffer.close()
+    assert not threads[0].is_alive()
+
+    # Buffering again after close starts a new flush thread.
+    buffer.append("again")
+    deadline = time.monotonic() + 2.0
+    while len(threads) < 4 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(threads) == 4
+    buffer.close()
+
+
+def test_client_deadline_flushes_reuse_socket(reference_server):
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint, marker_buffer_size=100, marker_max_delay=0.01)
+    try:
+        recorder.connect()
+        opened = []
+        open_socket = recorder._open_socket
+        recorder._open_socket = lambda: opened.append(threading.current_thread()) or open_socket()
+
+        for i in range(5):
+            recorder.push_event_marker(f"m{i}")
+            deadline = time.monotonic() + 2.0
+            while len(recorder.ledger) <= i and time.monotonic() < deadline:
+                time.sleep(0.005)
+
+        assert len(recorder.ledger) == 5
+        assert len(opened) == 1
+    finally:
+        recorder.close()
@@ -0,0 +1,137 @@
+import logging
+import multiprocessing
+import os
+import time
+
+from spike_recorder.server.native_log import NativeLog, native_level, NATIVE_LOGGER
+
+
+def write_log(path, lines, delay=0.0):
+    with open(path, 'w') as f:
+        for line in lines:
+            f.write(line + "\n")
+            f.flush()
+            time.sleep(delay)
+
+
+def test_native_level():
+    assert native_level("Audio input started") == logging.INFO
+    assert native_level("Warning: audio buffer underrun") == logging.WARNING
+    assert native_level("ERROR: could not open device") == logging.ERROR
+
+
+def test_lines_stream_while_written(tmp_path, caplog):
+    log = NativeLog(log_dir=str(tmp_path), session="s1", poll_interval=0.01)
+    log.start()
+
+    with open(log.raw_path, 'w') as f:
+        f.write("Starting recorder\n")
+        f.flush()
+
+        deadline = time.monotonic() + 5
+        while log.lines < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Seen before the application has finished, or even the line after it.
+        assert log.lines == 1
+
+        f.write("Warning: audio underrun\npartial")
+        f.flush()
+
+    log.stop()
+
+    records = [r for r in caplog.records if r.name == NATIVE_LOGGER]
+    assert [r.getMessage() for r in records] == ["Starting recorder", "Warning: audio underrun", "partial"]
+    assert records[1].levelno == logging.WARNING
+
+    with open(log.path) as f:
+        contents = f.read()
+    assert "WARNING Warning: audio underrun" in contents
+    assert not os.path.exists(log.raw_path)
+
+
+def test_session_ends_with_process(tmp_path):
+    log = NativeLog(log_dir=str(tmp_path), session="s2", poll_interval=0.01)
+    log.prepare()
+
+    p = multiprocessing.Process(target=write_log, args=(log.raw_path, [f"line {i}" for i in range(20)], 0.001))
+    p.start()
+    log.start(process=p)
+    p.join()
+
+    deadline = time.monotonic() + 5
+    while log.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert not log.running
+    assert log.lines == 20
+    assert not os.path.exists(log.raw_path)
+    assert not logging.getLogger(NATIVE_LOGGER).handlers
+
+
+def test_rotation_caps_session_size(tmp_path):
+    log = NativeLog(log_dir=str(tmp_path), session="s3", max_bytes=2000, backup_count=2, poll_interval=0.01)
+    log.start()
+    write_log(log.raw_path, [f"line {i} " + "x" * 80 for i in range(500)])
+    log.stop()
+
+    files = sorted(os.listdir(str(tmp_path)))
+    assert files == ["byb-s3.log", "byb-s3.log.1", "byb-s3.log.2"]
+    assert all(os.path.getsize(os.path.join(str(tmp_path), f)) <= 2000 for f in files)
+
+
+def test_old_sessions_are_pruned(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"byb-old{i}.log"
+        path.write_text("old")
+        (tmp_path / f"byb-old{i}.log.1").write_text("old")
+        os.utime(str(path), (i, i))
+
+    log = NativeLog(log_dir=str(tmp_path), session="new", keep_sessions=3)
+    log.start()
+    log.stop()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["byb-new.log", "byb-old3.log", "byb-old3.log.1",
+                                                  "byb-old4.log", "byb-old4.log.1"]
+
+
+def test_sessions_are_kept_apart(tmp_path):
+    # Launched together, as RecorderGroup does, sessions get their own names and files.
+    logs = [NativeLog(log_dir=str(tmp_path), poll_interval=0.01) for i in range(2)]
+    assert logs[0].session != logs[1].session
+
+    for log in logs:
+        log.start()
+    for i, log in enumerate(logs):
+        write_log(log.raw_path, [f"recorder {i}"])
+
+    deadline = time.monotonic() + 5
+    while any(log.lines < 1 for log in logs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for log in logs:
+        log.stop()
+
+    for i, log in enumerate(logs):
+        with open(log.path) as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 1 and lines[0].endswith(f"INFO recorder {i}")
+
+
+def test_raw_file_is_truncated(tmp_path):
+    log = NativeLog(log_dir=str(tmp_path), session="s4", max_raw_bytes=1000, poll_interval=0.01)
+    log.start()
+
+    # Written like the application does, not appending, so truncating leaves a hole of NULs.
+    with open(log.raw_path, 'w') as f:
+        for i in range(100):
+            f.write(f"line {i} " + "x" * 80 + "\n")
+            f.flush()
+            deadline = time.monotonic() + 5
+            while log.lines <= i and time.monotonic() < deadline:
+                time.sleep(0.001)
+            assert os.stat(log.raw_path).st_blocks * 512 <= 16 * 1024
+
+    log.stop()
+    assert log.lines == 100
+    with open(log.path) as f:
+        assert [line.split()[4] for line in f.read().splitlines()] == [str(i) for i in range(100)]
@@ -0,0 +1,97 @@
+import multiprocessing
+
+import pytest
+
+from spike_recorder.server import default_start_method
+from spike_recorder.server.pool import RecorderPool
+from spike_recorder.server.reference import run_server
+
+
+@pytest.fixture
+def pool():
+    pool = RecorderPool(size=1, transport="ipc", target=run_server, ready_timeout=30.0)
+    yield pool
+    pool.close()
+
+
+def test_default_start_method_is_not_global():
+    # Importing the server package must not change the global start method.
+    assert multiprocessing.get_start_method(allow_none=True) in (None, multiprocessing.get_context().get_start_method())
+    assert default_start_method() in (None, "spawn")
+
+
+def test_pool_hands_out_ready_recorder(pool):
+    pool.start()
+    recorder = pool.acquire(timeout=30.0)
+
+    assert recorder.process.is_alive()
+    assert recorder.warmup_seconds > 0
+
+    client = recorder.client()
+    try:
+        assert client.heartbeat()
+        client.push_event_marker("Trial 1: Start")
+        client.shutdown(block=True)
+    finally:
+        client.close()
+
+    recorder.process.join(10)
+    assert not recorder.process.is_alive()
+
+
+def test_pool_replaces_acquired_recorders(pool):
+    pool.start()
+    first = pool.acquire(timeout=30.0)
+    second = pool.acquire(timeout=30.0)
+
+    try:
+        assert first.endpoint != second.endpoint
+        assert first.process.pid != second.process.pid
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+
+def test_pool_skips_dead_recorders(pool):
+    pool.start()
+    dead = pool.acquire(timeout=30.0)
+    dead.process.terminate()
+    dead.process.join()
+
+    # Put it back as if it had died while idle.
+    pool._ready.put(dead)
+    recorder = pool.acquire(timeout=30.0)
+    try:
+        assert recorder is not dead
+        assert recorder.process.is_alive()
+    finally:
+        recorder.shutdown()
+
+
+def test_acquire_times_out():
+    pool = RecorderPool(size=1, transport="ipc", target=run_server)
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+    pool.close()
+
+
+def test_pool_close_shuts_down_idle_recorders(pool):
+    pool.start()
+    recorder = pool.acquire(timeout=30.0)
+    recorder.shutdown()
+
+    while pool.idle == 0:
+        pool._warming[-1].join()
+    idle = pool._ready.queue[0]
+
+    pool.close()
+    assert not idle.process.is_alive()
+    assert pool.idle == 0
+
+
+def test_pool_refuses_native_application():
+    from spike_recorder.server import run_application
+
+    with pytest.raises(ValueError):
+        RecorderPool(target=run_application)
+    assert RecorderPool(size=1).target is run_server
@@ -0,0 +1,132 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore
+
+from spike_recorder.protocol import CommandType, SpikeRecorderUnavailable
+from spike_recorder.qt_client import QtSpikeRecorder
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        app = QtCore.QCoreApplication([])
+    return app
+
+
+def process_events_until(app, condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+    return condition()
+
+
+def test_markers_do_not_block(qapp, echo_server):
+    recorder = QtSpikeRecorder()
+    replies = []
+    failures = []
+    recorder.replied.connect(lambda request_id, reply: replies.append((request_id, reply)))
+    recorder.failed.connect(lambda request_id, error: failures.append((request_id, error)))
+
+    recorder.connect()
+    try:
+        # The echo server takes 10 ms a reply, sending must not wait for any of them.
+        start = time.perf_counter()
+        request_ids = [recorder.push_event_marker(f"marker{i}") for i in range(5)]
+        assert time.perf_counter() - start < 0.01
+        assert recorder.pending == 5
+
+        assert process_events_until(qapp, lambda: len(replies) == 5)
+        assert [request_id for request_id, reply in replies] == request_ids
+        assert all(reply.type == CommandType.REPLY_OK for request_id, reply in replies)
+
+        recorder.push_event_marker("bad")
+        assert process_events_until(qapp, lambda: len(failures) == 1)
+        assert "Command Error" in str(failures[0][1])
+    finally:
+        recorder.close()
+
+    assert recorder.stats()['PUSH_EVENT_MARKER']['replies'] == 6
+    names = [msg.args['name'] for msg in echo_server.received]
+    assert names == [f"marker{i}" for i in range(5)] + ["bad"]
+
+
+def test_blocking_commands_wait_for_markers(qapp, echo_server):
+    recorder = QtSpikeRecorder()
+    recorder.connect()
+    try:
+        recorder.start_record("test.wav")
+        for i in range(3):
+            recorder.push_event_marker(f"marker{i}")
+        recorder.stop_record()
+        assert recorder.pending == 0
+    finally:
+        recorder.close()
+
+    types = [msg.type for msg in echo_server.received]
+    assert types == [CommandType.START_RECORD] + [CommandType.PUSH_EVENT_MARKER] * 3 + [CommandType.STOP_RECORD]
+
+
+def test_timeout_signal(qapp):
+    recorder = QtSpikeRecorder(endpoint="tcp://127.0.0.1:5595", timeout_ms=50, outbox_size=10)
+    failures = []
+    recorder.failed.connect(lambda request_id, error: failures.append(error))
+
+    recorder.connect()
+    try:
+        recorder.push_event_marker("nobody home")
+        assert process_events_until(qapp, lambda: failures)
+        assert isinstance(failures[0], SpikeRecorderUnavailable)
+        assert [m['name'] for m in recorder.client.outbox] == ["nobody home"]
+    finally:
+        recorder.close()
+
+
+def test_replay_without_duplicates(qapp):
+    from conftest import EchoServer
+
+    recorder = QtSpikeRecorder(timeout_ms=300, outbox_size=10)
+    failures = []
+    recorder.failed.connect(lambda request_id, error: failures.append(error))
+
+    recorder.connect()
+    server = None
+    try:
+        recorder.push_event_marker("a")
+        assert process_events_until(qapp, lambda: failures)
+
+        # Sent now, this one would overtake the marker waiting to be replayed.
+        recorder.push_event_marker("b")
+        assert process_events_until(qapp, lambda: len(failures) == 2)
+        assert isinstance(failures[1], SpikeRecorderUnavailable)
+        assert [m['name'] for m in recorder.client.outbox] == ["a", "b"]
+
+        server = EchoServer()
+        server.start()
+        assert recorder.wait_ready(timeout=5.0)
+        assert not recorder.client.outbox
+
+        replies = []
+        recorder.replied.connect(lambda request_id, reply: replies.append(reply))
+        recorder.push_event_marker("c")
+        assert process_events_until(qapp, lambda: replies)
+
+        # The socket the first attempt at "a" went out on was dropped, so it isn't delivered twice.
+        process_events_until(qapp, lambda: False, timeout=0.2)
+        names = []
+        for msg in server.received:
+            if msg.type == CommandType.PUSH_EVENT_MARKERS:
+                names.extend(m['name'] for m in msg.args['markers'])
+            elif msg.type == CommandType.PUSH_EVENT_MARKER:
+                names.append(msg.args['name'])
+        assert names == ["a", "b", "c"]
+        assert [entry.label for entry in recorder.ledger] == ["a", "b", "c"]
+    finally:
+        recorder.close()
+        if server is not None:
+            server.stop()
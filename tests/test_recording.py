@@ -0,0 +1,241 @@
+import os
+import struct
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.recording import Recording, RecordingTail, Markers, read_wav_info, parse_events
+
+
+def write_recording(path, samples, sample_rate=10000, markers=()):
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype('<i2').tobytes())
+
+    with open(os.path.splitext(str(path))[0] + "-events.txt", 'w') as f:
+        f.write("# Marker IDs can be arbitrary strings.\n")
+        f.write("# Marker ID,\tTime (in s)\n")
+        for name, sample_index in markers:
+            f.write(f"{name},\t{sample_index / sample_rate:.4f}\n")
+
+
+@pytest.fixture
+def samples():
+    return np.arange(2 * 5000, dtype=np.int16).reshape(5000, 2)
+
+
+def test_recording_views(tmp_path, samples):
+    path = tmp_path / "test.wav"
+    write_recording(path, samples, markers=[("Trial 1: Start", 1000), ("Trial 1: Stop", 2000),
+                                            ("Trial 2: Start", 3000), ("Trial 2: Stop", 4000)])
+
+    with Recording(str(path)) as recording:
+        assert recording.sample_rate == 10000
+        assert recording.num_channels == 2
+        assert recording.num_samples == len(recording) == 5000
+        assert recording.duration == pytest.approx(0.5)
+
+        assert isinstance(recording.samples, np.memmap)
+        np.testing.assert_array_equal(recording.samples, samples)
+
+        channel = recording.channel(1, start=100, stop=200)
+        np.testing.assert_array_equal(channel, samples[100:200, 1])
+        assert np.shares_memory(channel, recording.samples)
+
+        window = recording.seconds(0.1, 0.2)
+        np.testing.assert_array_equal(window, samples[1000:2000])
+        np.testing.assert_array_equal(recording.seconds(0.1, 0.2, channel=0), samples[1000:2000, 0])
+
+        assert recording.to_samples(0.25) == 2500
+        np.testing.assert_array_equal(recording.to_samples(np.array([0.1, 0.2])), [1000, 2000])
+        assert recording.to_seconds(2500) == pytest.approx(0.25)
+
+        markers = recording.markers
+        assert len(markers) == 4
+        np.testing.assert_array_equal(markers["Trial 1: Stop"], [2000])
+        assert len(markers["Nope"]) == 0
+        np.testing.assert_array_equal(markers.match(r"Start$").sample_indices, [1000, 3000])
+        assert list(markers.match(r"Trial 2").labels) == ["Trial 2: Start", "Trial 2: Stop"]
+
+    with pytest.raises(ValueError):
+        recording.samples
+
+
+def test_recording_unfinalized(tmp_path, samples):
+    path = tmp_path / "crashed.wav"
+    write_recording(path, samples)
+
+    # A crashed recorder leaves the placeholder size in the header, and maybe half a sample.
+    with open(path, 'r+b') as f:
+        f.seek(40)
+        f.write(struct.pack('<I', 0))
+        f.seek(0, os.SEEK_END)
+        f.write(b'\x01')
+    with Recording(str(path)) as recording:
+        assert recording.num_samples == 5000
+
+    # A header claiming more than is on disk.
+    with open(path, 'r+b') as f:
+        f.seek(40)
+        f.write(struct.pack('<I', 10**6))
+    with Recording(str(path)) as recording:
+        assert recording.num_samples == 5000
+        assert len(recording.markers) == 0
+
+
+def test_recording_empty_and_unsupported(tmp_path):
+    path = tmp_path / "empty.wav"
+    write_recording(path, np.zeros((0, 1), dtype=np.int16))
+    with Recording(str(path)) as recording:
+        assert recording.samples.shape == (0, 1)
+        assert recording.duration == 0
+
+    path = tmp_path / "24bit.wav"
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(3)
+        wav.setframerate(10000)
+        wav.writeframes(b'\x00' * 30)
+    with pytest.raises(ValueError):
+        read_wav_info(str(path))
+
+
+def test_parse_events():
+    labels, times = parse_events(["# Marker IDs can be arbitrary strings.\n", "# Marker ID,\tTime (in s)\n",
+                                  "Choice: A, then B,\t1.5000\n", "\n", "not a marker\n", "Late,\t0.2500\n"])
+    assert labels == ["Choice: A, then B", "Late"]
+    assert times == [1.5, 0.25]
+
+    # The table is in time order, whatever the file's order.
+    markers = Markers(labels, times, sample_rate=1000)
+    np.testing.assert_array_equal(markers.sample_indices, [250, 1500])
+    assert list(markers) == [("Late", 250), ("Choice: A, then B", 1500)]
+
+
+def test_reference_recording_round_trip(reference_server, tmp_path):
+    wav_file_name = tmp_path.joinpath("round-trip.wav").absolute().as_posix()
+
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect()
+        recorder.start_record(wav_file_name)
+        time.sleep(0.1)
+        recorder.push_event_marker("Hello")
+        recorder.stop_record()
+    finally:
+        recorder.close()
+
+    with Recording(wav_file_name) as recording:
+        assert recording.sample_rate == reference_server.source.sample_rate
+        assert recording.num_samples == reference_server.last_recording.num_samples
+        assert 0 < recording.markers["Hello"][0] <= recording.num_samples
+
+
+def test_tail_growing_file(tmp_path):
+    path = tmp_path / "live.wav"
+    events_path = tmp_path / "live-events.txt"
+    samples = np.arange(3 * 1000, dtype=np.int16).reshape(1000, 3)
+
+    tail = RecordingTail(str(path), max_block=400)
+    assert tail.poll() is None
+
+    # The header as the SpikeRecorder writes it while recording, with placeholder sizes.
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 0, b'WAVE', b'fmt ', 16, 1, 3, 1000, 6000, 6, 16, b'data', 0)
+    with open(path, 'wb') as wav, open(events_path, 'wb') as events:
+        wav.write(header[:20])
+        wav.flush()
+        assert tail.poll() is None
+
+        wav.write(header[20:])
+        wav.write(samples[:100].tobytes() + samples[100].tobytes()[:4])
+        wav.flush()
+        events.write(b"# Marker ID,\tTime (in s)\nFirst,\t0.0500\nSec")
+        events.flush()
+
+        block = tail.poll()
+        assert tail.sample_rate == 1000
+        assert block.start == 0 and block.stop == 100
+        np.testing.assert_array_equal(block.samples, samples[:100])
+        assert list(block.markers) == [("First", 50)]
+
+        wav.write(samples[100].tobytes()[4:] + samples[101:].tobytes())
+        wav.flush()
+        events.write(b"ond,\t0.5000\n")
+        events.flush()
+
+        blocks = [tail.poll(), tail.poll(), tail.poll()]
+        assert [(b.start, b.stop) for b in blocks] == [(100, 500), (500, 900), (900, 1000)]
+        np.testing.assert_array_equal(np.concatenate([b.samples for b in blocks]), samples[100:])
+        assert list(blocks[0].markers) == [("Second", 500)]
+        assert len(blocks[1].markers) == 0
+        assert tail.poll() is None
+
+    assert tail.position == 1000
+    assert tail.markers_seen == 2
+    tail.close()
+
+
+def test_tail_reference_session(reference_server, tmp_path):
+    wav_file_name = tmp_path.joinpath("session.wav").absolute().as_posix()
+    stop = threading.Event()
+    blocks = []
+
+    def monitor():
+        with RecordingTail(wav_file_name, poll_interval=0.01) as tail:
+            for block in tail.follow(stop_event=stop):
+                blocks.append(block)
+
+    thread = threading.Thread(target=monitor)
+    thread.start()
+
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect()
+        recorder.start_record(wav_file_name)
+        time.sleep(0.1)
+        recorder.push_event_marker("Hello")
+        time.sleep(0.1)
+        recorder.stop_record()
+    finally:
+        recorder.close()
+
+    # Data has been seen while recording, not only at the end.
+    time.sleep(0.1)
+    stop.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert len(blocks) > 1
+
+    with Recording(wav_file_name) as recording:
+        np.testing.assert_array_equal(np.concatenate([b.samples for b in blocks]), recording.samples)
+        markers = [m for b in blocks for m in b.markers]
+        assert markers == list(recording.markers)
+
+
+def test_tail_stops_at_data_size(tmp_path, samples):
+    path = tmp_path / "finalized.wav"
+    write_recording(path, samples)
+
+    # Chunks after the samples, metadata added when the recording was finalized, aren't samples.
+    with open(path, 'ab') as f:
+        f.write(b'LIST' + struct.pack('<I', 20) + b'INFOISFT' + struct.pack('<I', 8) + b'Recorder')
+
+    tail = RecordingTail(str(path), max_block=1500, poll_interval=0.01)
+    blocks = list(tail.follow(idle_timeout=0.1))
+    tail.close()
+
+    np.testing.assert_array_equal(np.concatenate([block.samples for block in blocks]), samples)
+    assert tail.position == 5000
+
+
+def test_tail_idle_timeout(tmp_path):
+    tail = RecordingTail(str(tmp_path / "never.wav"), poll_interval=0.01)
+    start = time.monotonic()
+    assert list(tail.follow(idle_timeout=0.1)) == []
+    assert 0.1 <= time.monotonic() - start < 1.0
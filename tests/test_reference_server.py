@@ -0,0 +1,84 @@
+import os
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from spike_recorder.client import SpikeRecorder, CommandType
+from spike_recorder.server.reference import SyntheticSource
+
+
+def test_reference_recording(reference_server, tmp_path):
+    wav_file_name = tmp_path.joinpath("test.wav").absolute().as_posix()
+    event_file_name = tmp_path.joinpath("test-events.txt").absolute().as_posix()
+
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect(encoding="binary")
+        assert recorder.codec.name == "binary"
+
+        recorder.start_record(wav_file_name)
+        time.sleep(0.1)
+        recorder.push_event_marker("Hello")
+        time.sleep(0.1)
+        recorder.push_event_marker("World!")
+        recorder.stop_record()
+    finally:
+        recorder.close()
+
+    with wave.open(wav_file_name, 'rb') as wav:
+        assert wav.getframerate() == reference_server.source.sample_rate
+        assert wav.getsampwidth() == 2
+        assert wav.getnframes() >= 0.2 * wav.getframerate()
+
+    with open(event_file_name) as f:
+        lines = f.read().splitlines()
+
+    assert lines[0].startswith("#")
+    assert lines[1] == "# Marker ID,\tTime (in s)"
+    names = [line.split(",\t")[0] for line in lines[2:]]
+    times = [float(line.split(",\t")[1]) for line in lines[2:]]
+    assert names == ["Hello", "World!"]
+    assert 0.05 < times[0] < times[1]
+
+
+def test_reference_default_filename(reference_server, tmp_path):
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect()
+        recorder.start_record()
+        recorder.stop_record()
+    finally:
+        recorder.close()
+
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2
+    assert names[0].startswith("BYB_Recording_") and names[0].endswith("-events.txt")
+    assert names[1].startswith("BYB_Recording_") and names[1].endswith(".wav")
+
+
+def test_reference_errors_and_shutdown(reference_server):
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    try:
+        recorder.connect(sync_clock=True)
+        assert recorder.clock_estimate is not None
+
+        with pytest.raises(Exception, match="Not recording"):
+            recorder.stop_record()
+
+        recorder.shutdown(block=True)
+        assert reference_server.wait(timeout=1.0)
+    finally:
+        recorder.close()
+
+    types = [msg.type for msg in reference_server.received]
+    assert CommandType.PING in types
+    assert types[-1] == CommandType.SHUTDOWN
+
+
+def test_synthetic_source():
+    source = SyntheticSource(sample_rate=1000, num_channels=2, seed=1)
+    blocks = [source.read(n) for n in (1, 100, 1000)]
+    assert [b.shape for b in blocks] == [(1, 2), (100, 2), (1000, 2)]
+    assert all(b.dtype == np.int16 for b in blocks)
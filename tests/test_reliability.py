@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from spike_recorder.client import SpikeRecorder, SpikeRecorderUnavailable
+
+from conftest import EchoServer
+
+
+def marker_names(server):
+    names = []
+    for msg in server.received:
+        if 'markers' in msg.args:
+            names.extend(m['name'] for m in msg.args['markers'])
+        elif 'name' in msg.args:
+            names.append(msg.args['name'])
+    return names
+
+
+def test_reconnect_after_missed_reply():
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+
+        with pytest.raises(SpikeRecorderUnavailable):
+            recorder.push_event_marker("lost")
+        assert not recorder.alive
+
+        # The socket was rebuilt, so once the application is back commands go through again.
+        server = EchoServer()
+        server.start()
+        try:
+            recorder.push_event_marker("after")
+            assert recorder.alive
+            assert marker_names(server) == ["after"]
+        finally:
+            server.stop()
+    finally:
+        recorder.close()
+
+
+def test_non_blocking_then_blocking(echo_server):
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        recorder.push_event_marker("a", block=False)
+        recorder.push_event_marker("b")
+        assert recorder.alive
+        assert marker_names(echo_server) == ["a", "b"]
+        assert recorder.stats()['PUSH_EVENT_MARKER']['timeouts'] == 0
+    finally:
+        recorder.close()
+
+
+def test_outbox_replay():
+    server = EchoServer()
+    server.start()
+    recorder = SpikeRecorder(outbox_size=2)
+    try:
+        recorder.connect()
+        recorder.push_event_marker("m1")
+        server.stop()
+
+        # No reply, these wait in the outbox, the oldest is dropped when it overflows.
+        recorder.push_event_marker("m2")
+        recorder.push_event_marker("m3")
+        recorder.push_event_marker("m4")
+        assert [m['name'] for m in recorder.outbox] == ["m3", "m4"]
+        assert recorder.dropped_markers == 1
+
+        server = EchoServer()
+        server.start()
+        recorder.push_event_marker("m5")
+        assert marker_names(server) == ["m3", "m4", "m5"]
+        assert len(recorder.outbox) == 0
+
+        # The replayed markers keep the time they were pushed at.
+        timestamps = [msg.args['client_timestamp'] for msg in server.received]
+        assert timestamps == sorted(timestamps)
+    finally:
+        recorder.close()
+        server.stop()
+
+
+def test_heartbeat_replays_outbox():
+    recorder = SpikeRecorder(outbox_size=10, heartbeat_interval=0.05)
+    try:
+        recorder.connect()
+        recorder.push_event_marker("while down")
+        assert len(recorder.outbox) == 1
+
+        server = EchoServer()
+        server.start()
+        try:
+            deadline = time.monotonic() + 5.0
+            while recorder.outbox and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert recorder.alive
+            assert "while down" in marker_names(server)
+        finally:
+            recorder.stop_heartbeat()
+            server.stop()
+    finally:
+        recorder.close()
@@ -0,0 +1,71 @@
+import argparse
+import multiprocessing
+import os
+
+import pytest
+
+from spike_recorder.scheduling import (parse_cpus, set_scheduling, run_with_scheduling, add_scheduling_args,
+                                       measure_jitter)
+
+needs_affinity = pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'), reason="Needs CPU affinity")
+
+
+def test_parse_cpus():
+    assert parse_cpus("0") == [0]
+    assert parse_cpus("0-2,5") == [0, 1, 2, 5]
+    assert parse_cpus(" 3, 1-2 ,") == [1, 2, 3]
+    with pytest.raises(ValueError):
+        parse_cpus("")
+
+
+def test_scheduling_args():
+    parser = argparse.ArgumentParser()
+    add_scheduling_args(parser)
+    args = parser.parse_args(["--recorder-cpus", "2-3", "--ui-cpus", "0", "--recorder-nice", "5"])
+    assert args.recorder_cpus == [2, 3]
+    assert args.ui_cpus == [0]
+    assert args.recorder_nice == 5
+    assert args.ui_nice is None
+
+
+def _report(queue):
+    queue.put((sorted(os.sched_getaffinity(0)), os.getpriority(os.PRIO_PROCESS, 0)))
+
+
+@needs_affinity
+def test_run_with_scheduling_in_child():
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    nice = os.getpriority(os.PRIO_PROCESS, 0) + 1
+
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=run_with_scheduling,
+                                kwargs={'target': _report, 'cpus': [cpu], 'nice': nice, 'queue': queue})
+    p.start()
+    cpus, child_nice = queue.get(timeout=30)
+    p.join()
+
+    assert cpus == [cpu]
+    assert child_nice == nice
+
+    # Ours are untouched.
+    assert os.getpriority(os.PRIO_PROCESS, 0) == nice - 1
+
+
+def test_set_scheduling_without_privileges_only_warns(caplog):
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        pytest.skip("Running as root, lowering niceness would succeed.")
+    set_scheduling(nice=-20)
+    assert "niceness" in caplog.text
+
+
+def test_measure_jitter():
+    lateness = measure_jitter(duration=0.05, interval=0.001)
+    assert lateness.count == 50
+    assert lateness.min_ns >= 0
+
+
+def test_measure_jitter_qt(monkeypatch):
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    pytest.importorskip("PyQt5")
+    lateness = measure_jitter(duration=0.05, interval=0.005, qt=True)
+    assert lateness.count == 10
@@ -0,0 +1,161 @@
+import wave
+
+import numpy as np
+import pytest
+
+from spike_recorder.recording import Recording
+from spike_recorder.spikes import SpikeDetector, Spikes, detect_spikes, mad_noise
+
+SAMPLE_RATE = 10000
+WAVEFORM = np.array([-300, -900, -1500, -900, -300, 200, 300, 200, 100], dtype=np.float64)
+
+
+def synthetic(num_samples, spikes, num_channels=2, noise=50.0, seed=0):
+    samples = np.random.default_rng(seed).normal(0, noise, size=(num_samples, num_channels))
+    for index, channel in spikes:
+        samples[index:index + len(WAVEFORM), channel] += WAVEFORM
+    return samples.astype(np.int16)
+
+
+@pytest.fixture
+def truth():
+    rng = np.random.default_rng(1)
+    spikes = []
+    for channel in range(2):
+        # At least 5 ms apart, some right on 1000 sample block boundaries.
+        times = np.cumsum(rng.integers(50, 400, size=100)) + 20
+        times[[10, 20, 30]] = [(times[k] // 1000 + 1) * 1000 - 1 for k in (10, 20, 30)]
+        spikes.extend((int(t), channel) for t in np.unique(times) if t < 30000)
+    return sorted(spikes)
+
+
+def assert_found(indices, channels, truth):
+    # The crossing is on the first or second sample of the waveform, depending on the noise.
+    found = sorted(zip(indices.tolist(), channels.tolist()))
+    assert len(found) == len(truth)
+    for (index, channel), (true_index, true_channel) in zip(found, truth):
+        assert channel == true_channel and 0 <= index - true_index <= 1
+
+
+def test_mad_noise():
+    samples = np.random.default_rng(0).normal(0, 100, size=(100000, 2))
+    samples[::50, 0] = -5000
+    np.testing.assert_allclose(mad_noise(samples), [100, 100], rtol=0.05)
+
+
+def test_detect_blocks_independent(truth):
+    # Only with a fixed noise and baseline, estimated per block the thresholds depend on the blocks.
+    samples = synthetic(30000, truth)
+
+    results = []
+    for block_size in (30000, 1000, 777, 37):
+        detector = SpikeDetector(sample_rate=SAMPLE_RATE, num_channels=2, noise=[50, 50], baseline=[0, 0])
+        parts = [detector.process(samples[i:i + block_size]) for i in range(0, len(samples), block_size)]
+        parts.append(detector.flush())
+        results.append((np.concatenate([p.sample_indices for p in parts]), np.concatenate([p.channels for p in parts]),
+                        np.concatenate([p.waveforms for p in parts])))
+
+    indices, channels, waveforms = results[0]
+    assert_found(indices, channels, truth)
+    for other in results[1:]:
+        for a, b in zip(results[0], other):
+            np.testing.assert_array_equal(a, b)
+
+    # Snippets are 0.5 ms before to 1 ms after the crossing.
+    assert waveforms.shape == (len(indices), 15)
+    assert np.nanmin(waveforms[:, 5:], axis=1).max() < -1000
+
+
+def test_detect_refractory_and_edges():
+    samples = np.zeros((100, 1), dtype=np.float32)
+    samples[[0, 3, 6, 20, 98]] = -10
+
+    detector = SpikeDetector(sample_rate=1000, num_channels=1, threshold=1.0, noise=[1.0], refractory=0.007,
+                             snippet=(0.002, 0.003))
+    spikes = detector.process(samples)
+    spikes_end = detector.flush()
+
+    # The crossings at 3 and 6 are inside the refractory period of the one at 0. The one at 98 needs
+    # samples after the end of the data for its snippet, so it's held back until the flush.
+    np.testing.assert_array_equal(spikes.sample_indices, [0, 20])
+    np.testing.assert_array_equal(spikes_end.sample_indices, [98])
+
+    # Snippets past either end of the data are padded with NaN.
+    assert np.isnan(spikes.waveforms[0, :2]).all()
+    assert np.isnan(spikes_end.waveforms[0, 4:]).all()
+    np.testing.assert_array_equal(spikes_end.waveforms[0, :4], [0, 0, -10, 0])
+    assert detector.flush().sample_indices.size == 0
+
+
+def test_detect_sign_and_no_waveforms():
+    samples = np.zeros((50, 1))
+    samples[10] = 10
+    samples[30] = -10
+
+    def detect(sign):
+        detector = SpikeDetector(sample_rate=1000, num_channels=1, threshold=1.0, noise=[1.0], sign=sign,
+                                 snippet=None)
+        spikes = detector.process(samples)
+        assert spikes.waveforms is None
+        end = detector.flush()
+        return np.concatenate([spikes.sample_indices, end.sample_indices]).tolist(), spikes.amplitudes.tolist()
+
+    assert detect("negative") == ([30], [-10])
+    assert detect("positive") == ([10], [10])
+    assert detect("both") == ([10, 30], [10, -10])
+
+    with pytest.raises(ValueError):
+        SpikeDetector(sample_rate=1000, num_channels=1, sign="up")
+
+
+def test_detect_spikes_recording(tmp_path, truth):
+    path = str(tmp_path / "spikes.wav")
+    samples = synthetic(30000, truth)
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+    with Recording(path) as recording:
+        spikes = detect_spikes(recording, block_duration=0.5)
+        only_1 = detect_spikes(recording, channels=[1], start=10000, block_duration=0.5)
+
+    assert_found(spikes.sample_indices, spikes.channels, truth)
+    np.testing.assert_allclose(spikes.times, spikes.sample_indices / SAMPLE_RATE)
+    assert spikes.sample_indices.dtype == np.int64 and spikes.channels.dtype == np.int16
+
+    assert set(only_1.channels.tolist()) == {1}
+    np.testing.assert_array_equal(only_1.sample_indices, spikes.sample_indices[(spikes.channels == 1)
+                                                                              & (spikes.sample_indices >= 10000)])
+
+
+def test_detect_from_baseline(tmp_path, truth):
+    # A DC offset, on either channel, doesn't change the spikes found or their waveforms.
+    samples = synthetic(30000, truth)
+    detector = SpikeDetector(sample_rate=SAMPLE_RATE, num_channels=2)
+    centred = Spikes.concatenate([detector.process(samples[i:i + 1000]) for i in range(0, 30000, 1000)]
+                                 + [detector.flush()], SAMPLE_RATE, detector.pre, detector.snippet_length)
+    detector.reset()
+    offset = samples + np.array([3000, -2000], dtype=np.int16)
+    shifted = Spikes.concatenate([detector.process(offset[i:i + 1000]) for i in range(0, 30000, 1000)]
+                                 + [detector.flush()], SAMPLE_RATE, detector.pre, detector.snippet_length)
+
+    assert_found(shifted.sample_indices, shifted.channels, truth)
+    np.testing.assert_array_equal(shifted.sample_indices, centred.sample_indices)
+    np.testing.assert_allclose(shifted.amplitudes, centred.amplitudes, atol=1e-3)
+
+    # Unsigned 8 bit PCM is centred on 128.
+    path = str(tmp_path / "u1.wav")
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(1)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.clip(np.round(samples / 12.0) + 128, 0, 255).astype(np.uint8).tobytes())
+
+    with Recording(path) as recording:
+        assert recording.samples.dtype == np.uint8
+        spikes = detect_spikes(recording, block_duration=0.5)
+
+    assert_found(spikes.sample_indices, spikes.channels, truth)
+    assert spikes.amplitudes.max() < -50
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from spike_recorder.client import SpikeRecorder, SpikeRecorderUnavailable
+from spike_recorder.stats import LatencyHistogram
+
+
+def test_histogram_precision():
+    hist = LatencyHistogram(precision_bits=5)
+
+    rng = random.Random(0)
+    values = sorted(int(rng.lognormvariate(14, 1.5)) for i in range(10000))
+    for v in values:
+        hist.record(v)
+
+    assert hist.count == len(values)
+    assert hist.min_ns == values[0]
+    assert hist.max_ns == values[-1]
+    assert hist.mean_ns == pytest.approx(sum(values) / len(values))
+
+    for q in (50, 90, 99, 99.9):
+        exact = values[int(round(q / 100 * len(values))) - 1]
+        assert hist.percentile(q) == pytest.approx(exact, rel=2 ** -5)
+
+    assert hist.percentile(100) == values[-1]
+
+    hist.reset()
+    assert hist.count == 0
+    assert hist.percentile(50) is None
+
+
+def test_histogram_fixed_memory():
+    hist = LatencyHistogram(highest_ns=10**9)
+    size = len(hist._counts)
+
+    # Values past the highest trackable latency land in the top bucket, the exact max is kept.
+    hist.record(10**12)
+    hist.record(5)
+    assert len(hist._counts) == size
+    assert hist.max_ns == 10**12
+    assert hist.percentile(50) == 5
+
+
+def test_client_stats(echo_server):
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        for i in range(20):
+            recorder.push_event_marker(f"marker {i}")
+        recorder.start_record()
+        with pytest.raises(Exception):
+            recorder.push_event_marker("bad")
+
+        stats = recorder.stats()
+        markers = stats['PUSH_EVENT_MARKER']
+        assert markers['sent'] == 21
+        assert markers['replies'] == 21
+        assert markers['errors'] == 1
+        assert markers['timeouts'] == 0
+        assert 0 < markers['min_ms'] <= markers['p50_ms'] <= markers['p99_ms'] <= markers['max_ms']
+        assert stats['START_RECORD']['replies'] == 1
+
+        recorder.reset_stats()
+        assert recorder.stats()['PUSH_EVENT_MARKER']['sent'] == 0
+    finally:
+        recorder.close()
+
+
+def test_client_stats_timeout():
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect()
+        with pytest.raises(SpikeRecorderUnavailable):
+            recorder.stop_record()
+        assert recorder.stats()['STOP_RECORD']['timeouts'] == 1
+        assert recorder.stats()['STOP_RECORD']['p50_ms'] is None
+    finally:
+        recorder.close()
@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+import pytest
+
+from spike_recorder.client import SpikeRecorder
+from spike_recorder.stream import SampleStream, pack_block, unpack_block
+
+
+def block(start, n, channels=2):
+    return (np.arange(start, start + n, dtype=np.int16)[:, None] * np.ones(channels, dtype=np.int16))
+
+
+def test_pack_unpack():
+    samples = block(0, 10)
+    sequence, first_sample, sample_rate, unpacked = unpack_block(pack_block(7, 1000, 10000, samples))
+    assert (sequence, first_sample, sample_rate) == (7, 1000, 10000)
+    np.testing.assert_array_equal(unpacked, samples)
+
+    with pytest.raises(ValueError):
+        unpack_block([b"junk", b""])
+
+
+def test_ring_buffer_wraps():
+    stream = SampleStream("tcp://127.0.0.1:5596", seconds=1.0, sample_rate=100, num_channels=2)
+    assert stream.capacity == 100
+
+    for i in range(25):
+        stream.add_block(i, i * 7, 100, block(i * 7, 7))
+
+    assert stream.end_sample == 175
+    latest = stream.latest()
+    assert latest.shape == (100, 2)
+    np.testing.assert_array_equal(latest[:, 0], np.arange(75, 175))
+    np.testing.assert_array_equal(stream.latest(0.1)[:, 1], np.arange(165, 175))
+
+    # Views, not copies
+    assert np.shares_memory(latest, stream.latest(0.5))
+
+    # A block bigger than the whole buffer
+    stream.add_block(25, 175, 100, block(175, 250))
+    np.testing.assert_array_equal(stream.latest()[:, 0], np.arange(325, 425))
+
+
+def test_gaps_are_counted_and_zero_filled():
+    stream = SampleStream("tcp://127.0.0.1:5596", seconds=1.0)
+    stream.add_block(0, 0, 100, block(0, 10))
+    stream.add_block(3, 30, 100, block(30, 10))
+
+    assert stream.dropped_blocks == 2
+    assert stream.missing_samples == 20
+    assert stream.end_sample == 40
+    latest = stream.latest()[:, 0]
+    np.testing.assert_array_equal(latest[10:30], 0)
+    np.testing.assert_array_equal(latest[30:], np.arange(30, 40))
+
+
+def test_restart_starts_over():
+    stream = SampleStream("tcp://127.0.0.1:5596", seconds=1.0)
+    for i in range(5):
+        stream.add_block(i, i * 10, 100, block(i * 10, 10))
+
+    # A repeated block is dropped, its samples are already there.
+    stream.add_block(4, 40, 100, block(40, 10))
+    assert stream.end_sample == 50 and stream.restarts == 0
+
+    # The restarted recorder counts from 0 again, its blocks aren't discarded as old ones.
+    for i in range(3):
+        stream.add_block(i, i * 10, 100, block(100 + i * 10, 10))
+
+    assert stream.restarts == 1
+    assert stream.end_sample == 30
+    np.testing.assert_array_equal(stream.latest()[:, 0], np.arange(100, 130))
+    assert stream.dropped_blocks == 0 and stream.missing_samples == 0
+
+
+def test_reference_stream(reference_server):
+    recorder = SpikeRecorder(endpoint=reference_server.endpoint)
+    recorder.connect()
+    stream = recorder.sample_stream(seconds=2.0)
+    try:
+        deadline = time.monotonic() + 5.0
+        while stream.blocks < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert stream.sample_rate == reference_server.source.sample_rate
+        assert stream.num_channels == 1
+        assert stream.dropped_blocks == 0 and stream.missing_samples == 0
+        assert len(stream.latest(0.05)) == 500
+        assert stream.end_sample <= reference_server.sample_index
+    finally:
+        stream.close()
+        recorder.close()
@@ -0,0 +1,157 @@
+import json
+import os
+import signal
+import time
+
+import pytest
+import zmq
+
+from spike_recorder.protocol import CommandMsg, CommandType, bind_endpoint
+from spike_recorder.server.reference import run_server
+from spike_recorder import wire
+from spike_recorder.supervisor import RecorderSupervisor
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.05)
+
+
+def legacy_server(endpoint):
+    """
+    A recorder from before HEARTBEAT and STATUS, it never answers the first and rejects the second.
+    """
+    context = zmq.Context()
+    socket = context.socket(zmq.ROUTER)
+    socket.bind(bind_endpoint(endpoint))
+    try:
+        while True:
+            frames = socket.recv_multipart()
+            msg = wire.decode(frames[-1])
+            if msg.type == CommandType.HEARTBEAT:
+                continue
+            elif msg.type == CommandType.STATUS:
+                reply = CommandMsg(type=CommandType.REPLY_ERROR, args={'what': "Unknown command"})
+            else:
+                reply = CommandMsg(type=CommandType.REPLY_OK)
+            socket.send_multipart(frames[:-1] + [reply.to_json().encode() + b'\0'])
+
+            if msg.type == CommandType.SHUTDOWN:
+                return
+    finally:
+        socket.close(linger=1000)
+        context.term()
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    supervisor = RecorderSupervisor(session_dir=str(tmp_path), name="subject",
+                                    endpoint=f"ipc://{tmp_path}/recorder.ipc", target=run_server,
+                                    check_interval=0.05, max_missed_heartbeats=2, ready_timeout=30.0,
+                                    timeout_ms=200, outbox_size=100)
+    yield supervisor
+    supervisor.stop()
+
+
+def test_session_without_crashes(supervisor, tmp_path):
+    supervisor.start()
+    supervisor.client.push_event_marker("Trial 1: Start")
+    supervisor.stop()
+
+    with open(supervisor.manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest['restarts'] == 0
+    assert manifest['gaps'] == []
+    assert len(manifest['segments']) == 1
+
+    segment = manifest['segments'][0]
+    assert segment['wav_path'] == os.path.join(str(tmp_path), "subject-000.wav")
+    assert segment['finalized']
+    assert segment['ended'] >= segment['started']
+    assert os.path.exists(segment['wav_path'])
+    assert not supervisor.process.is_alive()
+
+
+def test_crash_continues_in_next_segment(supervisor, tmp_path):
+    gaps = []
+    supervisor.on_restart = gaps.append
+    supervisor.start()
+    first_pid = supervisor.process.pid
+
+    supervisor.process.kill()
+    # on_restart is called last, after the gap is recorded.
+    wait_for(lambda: len(gaps) == 1)
+
+    assert supervisor.process.pid != first_pid
+    assert supervisor.restarts == 1
+    assert len(gaps) == 1 and gaps[0].reason == "exited"
+
+    # Markers reach the continuation segment.
+    supervisor.client.push_event_marker("After crash")
+    supervisor.stop()
+
+    with open(supervisor.manifest_path) as f:
+        manifest = json.load(f)
+    first, second = manifest['segments']
+    assert not first['finalized']
+    assert second['finalized']
+    assert second['wav_path'] == os.path.join(str(tmp_path), "subject-001.wav")
+    assert second['restart'] == 1
+
+    gap, = manifest['gaps']
+    assert gap['start'] == first['ended']
+    assert gap['end'] == second['started']
+    assert gap['duration'] > 0
+
+    with open(second['events_path']) as f:
+        assert "After crash" in f.read()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGSTOP'), reason="Needs SIGSTOP")
+def test_hung_recorder_is_restarted(supervisor):
+    supervisor.start()
+    hung = supervisor.process
+
+    os.kill(hung.pid, signal.SIGSTOP)
+    wait_for(lambda: len(supervisor.gaps) == 1)
+
+    assert not hung.is_alive()
+    assert supervisor.gaps[0].reason == "unresponsive"
+
+
+def test_gives_up_after_max_restarts(supervisor):
+    supervisor.max_restarts = 0
+    supervisor.start()
+    supervisor.process.kill()
+    wait_for(lambda: supervisor.failed)
+
+    # The manifest is rewritten just after failed is set.
+    def manifest_failed():
+        with open(supervisor.manifest_path) as f:
+            return json.load(f)['failed']
+    wait_for(manifest_failed)
+    assert supervisor.segment is None
+
+
+def test_recorder_without_heartbeat(tmp_path):
+    supervisor = RecorderSupervisor(session_dir=str(tmp_path), name="subject",
+                                    endpoint=f"ipc://{tmp_path}/legacy.ipc", target=legacy_server,
+                                    check_interval=0.05, max_missed_heartbeats=2, heartbeat_grace=0.2,
+                                    timeout_ms=200)
+    try:
+        supervisor.start()
+        assert supervisor.client.answers_heartbeat is False
+
+        # Only the process is watched, unanswered heartbeats don't get it restarted.
+        time.sleep(1.0)
+        assert supervisor.restarts == 0
+    finally:
+        supervisor.stop()
+
+    # The recorder never said it finished the files.
+    with open(supervisor.manifest_path) as f:
+        segment, = json.load(f)['segments']
+    assert not segment['finalized']
+    assert not supervisor.process.is_alive()
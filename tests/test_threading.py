@@ -0,0 +1,77 @@
+import threading
+
+import zmq
+
+from spike_recorder.client import SpikeRecorder, shared_context
+
+
+def test_shared_context():
+    a = SpikeRecorder()
+    b = SpikeRecorder()
+    assert a.context is b.context is shared_context()
+
+    own = zmq.Context()
+    try:
+        assert SpikeRecorder(context=own).context is own
+    finally:
+        own.term()
+
+
+def test_concurrent_markers(echo_server):
+    echo_server.delay = 0.0
+    recorder = SpikeRecorder()
+    recorder.connect()
+
+    num_threads = 8
+    per_thread = 25
+    sockets = {}
+    errors = []
+    start = threading.Barrier(num_threads)
+
+    def push(t):
+        try:
+            start.wait()
+            for i in range(per_thread):
+                recorder.push_event_marker(f"thread{t}-{i}")
+            sockets[t] = recorder.socket
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=push, args=(t,)) for t in range(num_threads)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        recorder.close()
+
+    assert not errors
+
+    # Every thread got its own socket
+    assert len({id(s) for s in sockets.values()}) == num_threads
+
+    names = [msg.args['name'] for msg in echo_server.received]
+    assert sorted(names) == sorted(f"thread{t}-{i}" for t in range(num_threads) for i in range(per_thread))
+
+    # Each thread's markers arrive in the order it sent them
+    for t in range(num_threads):
+        mine = [n for n in names if n.startswith(f"thread{t}-")]
+        assert mine == [f"thread{t}-{i}" for i in range(per_thread)]
+
+    assert recorder.stats()['PUSH_EVENT_MARKER']['replies'] == num_threads * per_thread
+
+
+def test_close_closes_every_socket(echo_server):
+    recorder = SpikeRecorder()
+    recorder.connect()
+
+    sockets = []
+    thread = threading.Thread(target=lambda: sockets.append(recorder.socket))
+    thread.start()
+    thread.join()
+    sockets.append(recorder.socket)
+
+    recorder.close()
+    assert all(s.closed for s in sockets)
+    assert recorder.socket is None
@@ -0,0 +1,73 @@
+import pytest
+
+from spike_recorder.client import SpikeRecorder, CommandMsg, CommandType
+from spike_recorder import wire
+
+from conftest import EchoServer
+
+MESSAGES = [
+    CommandMsg(type=CommandType.SHUTDOWN),
+    CommandMsg(type=CommandType.START_RECORD),
+    CommandMsg(type=CommandType.START_RECORD, args={"filename": "/tmp/test µ.wav"}),
+    CommandMsg(type=CommandType.STOP_RECORD),
+    CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={"name": "test2"}),
+    CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={"name": "test2", "client_timestamp": 123456789}),
+    CommandMsg(type=CommandType.PUSH_EVENT_MARKERS,
+               args={"markers": [{"name": "a", "client_timestamp": 1}, {"name": "b", "client_timestamp": -2}]}),
+    CommandMsg(type=CommandType.NEGOTIATE, args={"encodings": ["binary", "json"]}),
+    CommandMsg(type=CommandType.REPLY_OK),
+    CommandMsg(type=CommandType.REPLY_OK, args={"encoding": "binary"}),
+    CommandMsg(type=CommandType.REPLY_ERROR, args={"what": "blah blah"}),
+]
+
+
+@pytest.mark.parametrize("codec", [wire.JSON, wire.BINARY], ids=lambda c: c.name)
+@pytest.mark.parametrize("msg", MESSAGES, ids=lambda m: m.type.value)
+def test_round_trip(codec, msg):
+    assert codec.decode(codec.encode(msg)) == msg
+
+
+def test_binary_is_compact():
+    msg = CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={"name": "Hunch!", "client_timestamp": 123456789})
+    assert len(wire.BINARY.encode(msg)) < len(wire.JSON.encode(msg)) / 2
+
+
+def test_binary_extra_args():
+    # Args outside the schema, or of the wrong type, ride along in the JSON tail.
+    msg = CommandMsg(type=CommandType.PUSH_EVENT_MARKER, args={"name": 5, "client_timestamp": 1, "other": [1, 2]})
+    assert wire.BINARY.decode(wire.BINARY.encode(msg)) == msg
+
+
+def test_decode_null_terminated_json():
+    msg = CommandMsg(type=CommandType.REPLY_OK)
+    assert wire.decode(msg.to_json().encode() + b'\0') == msg
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        wire.get_codec("xml")
+
+
+@pytest.mark.parametrize("server_encodings,expected", [(("json", "binary"), "binary"), (("json",), "json")])
+def test_negotiate(server_encodings, expected):
+    server = EchoServer(encodings=server_encodings)
+    server.start()
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect(encoding="binary")
+        assert recorder.codec.name == expected
+
+        recorder.push_event_marker("after negotiation")
+        assert server.received[-1].args['name'] == "after negotiation"
+    finally:
+        recorder.close()
+        server.stop()
+
+
+def test_negotiate_no_server():
+    recorder = SpikeRecorder()
+    try:
+        recorder.connect(encoding="binary")
+        assert recorder.codec.name == "json"
+    finally:
+        recorder.close()